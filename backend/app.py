@@ -1,28 +1,72 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
-from datetime import datetime, timedelta
+from flask import Flask, Response, abort, request, jsonify, render_template, redirect, url_for, flash, stream_with_context
+from datetime import date, datetime, timedelta
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy.exc import IntegrityError
 from config import Config
 from models import db, User, Customer, Campaign, Touchpoint, Interaction, SalesMetric, FinancialMetric
 from forms import RegistrationForm, LoginForm
-from email_utils import send_verification_email, send_admin_notification, send_approval_notification
+from email_utils import (EmailOutbox, queue_email, verification_email, admin_notification, send_approval_notification,
+                         approval_notification)
+from pagination import InvalidCursor, encode_cursor, decode_cursor, keyset_paginate, cached_count
+from search import filter_customers
+from rollups import (DASHBOARD_STATS_TABLES, TIMESERIES_DIMENSIONS, TIMESERIES_TABLES, read_dashboard_stats,
+                     read_dashboard_stats_async, read_activity_timeseries, ensure_campaign_stats_seeded,
+                     ensure_reconcile_job)
+from queries import TIMELINE_SOURCES, rows_per_customer, campaign_performance, customer_timeline
+from passwords import PasswordPool, PasswordPoolFull, hash_password, check_password
+from user_cache import UserCache
+from schema import upgrade_database
+from exports import EXPORT_FORMATS, stream_export
+from attribution import DEFAULT_HALF_LIFE_DAYS, AttributionCache, campaign_attribution
+from metrics_cache import MetricsCache, parse_filters
+from table_versions import TableVersions
+from engines import EngineRouter
+from request_metrics import RequestMetrics
+from rate_limit import RateLimiter
+from async_db import AsyncDatabase
+from verification_tokens import is_signed_token, signed_verification_token, user_for_signed_token
+from serializers import (FastJSONProvider, compress_response, CUSTOMER, CAMPAIGN, TOUCHPOINT,
+                         SALES_METRIC, FINANCIAL_METRIC, USER, CURRENT_USER, LOGIN_USER)
 import os
+import re
 
 # Initialize Flask extensions
 login_manager = LoginManager()
 mail = Mail()
+outbox = EmailOutbox()
 csrf = CSRFProtect()
+password_pool = PasswordPool()
+user_cache = UserCache()
+metrics_cache = MetricsCache()
+table_versions = TableVersions()
+engine_router = EngineRouter()
+request_metrics = RequestMetrics()
+rate_limiter = RateLimiter()
+async_db = AsyncDatabase()
+attribution_cache = AttributionCache()
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
     
     # Initialize extensions
     db.init_app(app)
+    engine_router.init_app(app)
+    async_db.init_app(app)
+    request_metrics.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    outbox.init_app(app)
     csrf.init_app(app)
+    password_pool.init_app(app)
+    rate_limiter.init_app(app)
+    user_cache.init_app(app)
+    metrics_cache.init_app(app)
+    table_versions.init_app(app)
+    attribution_cache.init_app(app)
     
     # Configure login manager
     login_manager.login_view = 'login'
@@ -30,7 +74,13 @@ def create_app():
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Served from the identity cache; see user_cache.UserCache
+        return user_cache.get(int(user_id))
+    
+    # Deliver any mail left in the outbox by a previous run
+    @app.before_request
+    def start_email_outbox():
+        outbox.start()
     
     # CORS configuration
     @app.after_request
@@ -40,12 +90,27 @@ def create_app():
         response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
         return response
     
+    @app.after_request
+    def compress(response):
+        return compress_response(response, app.config['RESPONSE_COMPRESSION_MIN_SIZE'],
+                                 app.config['RESPONSE_COMPRESSION_LEVEL'])
+    
     # API Routes
     @app.route('/api/ping')
     def ping():
         return {'message': 'pong'}
     
+    def _duplicate_user_message(error):
+        """The registration error for a unique constraint violation on ``user``, if it is one we report"""
+        detail = str(error.orig)
+        if re.search(r'\busername\b', detail):
+            return 'Username already taken'
+        if re.search(r'\bemail\b', detail):
+            return 'Email already registered'
+        return None
+    
     @app.route('/api/register', methods=['POST'])
+    @rate_limiter.limit('register')
     def api_register():
         """API endpoint for user registration"""
         data = request.get_json()
@@ -56,42 +121,51 @@ def create_app():
             if not data.get(field):
                 return jsonify({'error': f'{field} is required'}), 400
         
-        # Check if user already exists
-        if User.query.filter_by(username=data['username']).first():
-            return jsonify({'error': 'Username already taken'}), 400
-        
-        if User.query.filter_by(email=data['email']).first():
-            return jsonify({'error': 'Email already registered'}), 400
-        
-        # Create new user
+        # Create new user; the unique constraints reject duplicates below
         user = User(
             username=data['username'],
             email=data['email'],
             first_name=data['first_name'],
             last_name=data['last_name']
         )
-        user.set_password(data['password'])
+        # A stored token goes in with the insert; a signed one needs the id
+        signed_tokens = app.config['EMAIL_VERIFICATION_SIGNED_TOKENS']
+        token = None if signed_tokens else user.generate_email_verification_token()
+        
+        try:
+            user.password_hash = password_pool.run(hash_password, data['password'], app.config['BCRYPT_LOG_ROUNDS'])
+        except PasswordPoolFull:
+            return jsonify({'error': 'Server is busy. Please try again shortly.'}), 503
         
+        # The user, their token and both emails go in one transaction; the
+        # outbox workers are only woken once it commits
         try:
             db.session.add(user)
+            db.session.flush()
+            user_id = user.id
+            if signed_tokens:
+                token = signed_verification_token(user)
+            queue_email(*verification_email(user, token))
+            queue_email(*admin_notification(user))
             db.session.commit()
-            
-            # Send verification email
-            send_verification_email(user)
-            
-            # Send admin notification
-            send_admin_notification(user)
-            
-            return jsonify({
-                'message': 'Registration successful! Please check your email to verify your account.',
-                'user_id': user.id
-            }), 201
-            
-        except Exception as e:
+        except IntegrityError as e:
             db.session.rollback()
+            message = _duplicate_user_message(e)
+            if message is None:
+                return jsonify({'error': 'Registration failed. Please try again.'}), 500
+            return jsonify({'error': message}), 400
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Registration failed')
             return jsonify({'error': 'Registration failed. Please try again.'}), 500
+        
+        return jsonify({
+            'message': 'Registration successful! Please check your email to verify your account.',
+            'user_id': user_id
+        }), 201
     
     @app.route('/api/login', methods=['POST'])
+    @rate_limiter.limit('login')
     def api_login():
         """API endpoint for user login"""
         data = request.get_json()
@@ -101,13 +175,27 @@ def create_app():
         
         user = User.query.filter_by(username=data['username']).first()
         
-        if user and user.check_password(data['password']):
+        # bcrypt runs on the bounded password pool, not the request thread
+        try:
+            valid = user is not None and password_pool.run(check_password, data['password'], user.password_hash)
+        except PasswordPoolFull:
+            return jsonify({'error': 'Too many login attempts in progress. Please try again shortly.'}), 503
+        
+        if valid:
             if not user.is_verified:
                 return jsonify({'error': 'Please verify your email before logging in'}), 401
             
             if not user.is_approved:
                 return jsonify({'error': 'Your account is pending approval'}), 401
             
+            # Move the hash to the configured work factor while we have the password
+            rounds = app.config['BCRYPT_LOG_ROUNDS']
+            if user.password_needs_rehash(rounds):
+                try:
+                    user.password_hash = password_pool.run(hash_password, data['password'], rounds)
+                except PasswordPoolFull:
+                    pass  # keep the old hash; it is upgraded on a later login
+            
             # Update last login
             user.last_login = db.func.now()
             db.session.commit()
@@ -116,14 +204,7 @@ def create_app():
             
             return jsonify({
                 'message': 'Login successful',
-                'user': {
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'is_admin': user.is_admin
-                }
+                'user': LOGIN_USER(user)
             }), 200
         else:
             return jsonify({'error': 'Invalid username or password'}), 401
@@ -139,27 +220,28 @@ def create_app():
     @login_required
     def api_get_user():
         """API endpoint to get current user info"""
-        return jsonify({
-            'id': current_user.id,
-            'username': current_user.username,
-            'email': current_user.email,
-            'first_name': current_user.first_name,
-            'last_name': current_user.last_name,
-            'is_admin': current_user.is_admin,
-            'is_verified': current_user.is_verified,
-            'is_approved': current_user.is_approved
-        }), 200
+        return jsonify(CURRENT_USER(current_user)), 200
     
     # Web Routes (for email verification)
     @app.route('/verify-email/<token>')
     def verify_email(token):
         """Email verification endpoint"""
+        if is_signed_token(token):
+            try:
+                user = user_for_signed_token(token, app.config['EMAIL_VERIFICATION_MAX_AGE'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            user.mark_email_verified()
+            db.session.commit()
+            return jsonify({'message': 'Email verified successfully! You can now log in.'}), 200
+        
+        # Tokens stored on the user, from before signed tokens or with them turned off
         user = User.query.filter_by(email_verification_token=token).first()
         
         if not user:
             return jsonify({'error': 'Invalid verification token'}), 400
         
-        if user.email_verification_expires < db.func.now():
+        if user.email_verification_expires < datetime.utcnow():
             return jsonify({'error': 'Verification token has expired'}), 400
         
         if user.verify_email_token(token):
@@ -169,29 +251,105 @@ def create_app():
             return jsonify({'error': 'Verification failed'}), 400
     
     # Admin routes
+    def _flag_arg(name):
+        """Parse an optional true/false query argument, or None when it is absent"""
+        value = request.args.get(name)
+        if value is None or value == '':
+            return None
+        if value.lower() in ['true', '1']:
+            return True
+        if value.lower() in ['false', '0']:
+            return False
+        raise ValueError(f'{name} must be true or false')
+    
     @app.route('/api/admin/users', methods=['GET'])
     @login_required
     def api_get_users():
-        """API endpoint to get all users (admin only)"""
+        """API endpoint to page through users (admin only)
+
+        Users come oldest first, ``per_page`` at a time; pass the returned
+        ``next_cursor`` back as ``cursor`` for the next page. ``is_verified``
+        and ``is_approved`` filter the queue, e.g. ``is_verified=true&is_approved=false``
+        for accounts waiting on a decision.
+        """
+        if not current_user.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), app.config['ADMIN_USERS_MAX_PER_PAGE'])
+        query = User.query.with_entities(*USER.columns)
+        try:
+            for name in ['is_verified', 'is_approved']:
+                flag = _flag_arg(name)
+                if flag is not None:
+                    query = query.filter(getattr(User, name) == flag)
+            
+            cursor_values = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            if cursor_values is not None and not (len(cursor_values) == 1 and isinstance(cursor_values[0], int)):
+                raise InvalidCursor('Invalid cursor')
+            users, next_cursor = keyset_paginate(query, [User.id], cursor_values, per_page=per_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'users': USER.rows(users),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'per_page': per_page
+        }), 200
+    
+    @app.route('/api/admin/users/bulk', methods=['POST'])
+    @login_required
+    def api_bulk_update_users():
+        """API endpoint to approve or reject many users in one transaction (admin only)
+
+        Takes ``{"action": "approve" | "reject", "ids": [...]}``. Every
+        notification is queued in the outbox by the same commit, and the
+        delivery workers are woken once for the whole batch.
+        """
         if not current_user.is_admin:
             return jsonify({'error': 'Admin access required'}), 403
         
-        users = User.query.all()
+        data = request.get_json(silent=True) or {}
+        action = data.get('action')
+        if action not in ['approve', 'reject']:
+            return jsonify({'error': 'action must be one of: approve, reject'}), 400
+        
+        user_ids = data.get('ids')
+        if not isinstance(user_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in user_ids):
+            return jsonify({'error': 'ids must be a list of user ids'}), 400
+        
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return jsonify({'error': 'ids is required'}), 400
+        
+        max_ids = app.config['ADMIN_BULK_MAX_IDS']
+        if len(user_ids) > max_ids:
+            return jsonify({'error': f'At most {max_ids} users can be updated at once'}), 400
+        
+        approved = action == 'approve'
+        users = User.query.filter(User.id.in_(user_ids)).all()
+        for user in users:
+            user.is_approved = approved
+        outbox.enqueue_many([approval_notification(user, approved) for user in users])
+        found = {user.id for user in users}
+        db.session.commit()
+        outbox.notify()
+        
         return jsonify({
-            'users': [{
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'is_verified': user.is_verified,
-                'is_approved': user.is_approved,
-                'is_admin': user.is_admin,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'last_login': user.last_login.isoformat() if user.last_login else None
-            } for user in users]
+            'message': f"{len(users)} user(s) {'approved' if approved else 'rejected'}",
+            'updated': [i for i in user_ids if i in found],
+            'missing': [i for i in user_ids if i not in found]
         }), 200
     
+    @app.route('/api/admin/metrics', methods=['GET'])
+    @login_required
+    def api_get_request_metrics():
+        """Per-endpoint latency, database time and query count histograms (admin only)"""
+        if not current_user.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        return jsonify(request_metrics.snapshot()), 200
+    
     @app.route('/api/admin/users/<int:user_id>/approve', methods=['POST'])
     @login_required
     def api_approve_user(user_id):
@@ -227,8 +385,15 @@ def create_app():
     # Customer Data API Routes
     @app.route('/api/customers', methods=['GET'])
     @login_required
+    @table_versions.conditional('customers')
     def api_get_customers():
-        """API endpoint to get all customers with pagination"""
+        """API endpoint to get all customers with pagination
+
+        ``search`` matches name and email tokens by prefix, best matches first.
+        Passing ``after`` (a customer id) or ``cursor`` switches to keyset
+        pagination, which never counts or offsets. ``order=created_at`` pages
+        newest first; ``include_total=true`` adds a cached total.
+        """
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         search = request.args.get('search', '')
@@ -236,116 +401,363 @@ def create_app():
         query = Customer.query
         
         if search:
-            query = query.filter(
-                db.or_(
-                    Customer.first_name.ilike(f'%{search}%'),
-                    Customer.last_name.ilike(f'%{search}%'),
-                    Customer.email.ilike(f'%{search}%')
-                )
-            )
+            query = filter_customers(query, search)
+        
+        # Plain rows for the serializer; no ORM objects to build
+        query = query.with_entities(*CUSTOMER.columns)
+        
+        if 'after' in request.args or 'cursor' in request.args:
+            return _customers_keyset_page(query, search, per_page)
         
         customers = query.paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            'customers': [{
-                'customer_id': c.customer_id,
-                'first_name': c.first_name,
-                'last_name': c.last_name,
-                'email': c.email,
-                'device_type': c.device_type,
-                'created_at': c.created_at.isoformat() if c.created_at else None
-            } for c in customers.items],
+            'customers': CUSTOMER.rows(customers.items),
             'total': customers.total,
             'pages': customers.pages,
             'current_page': customers.page,
             'per_page': per_page
         }), 200
     
+    def _customers_keyset_page(query, search, per_page):
+        """Build a cursor-paginated customers response"""
+        per_page = min(max(per_page, 1), app.config['CUSTOMERS_MAX_PER_PAGE'])
+        order = request.args.get('order', 'id')
+        if order == 'created_at':
+            columns = [Customer.created_at, Customer.customer_id]
+            query = query.filter(Customer.created_at.isnot(None))
+        elif order == 'id':
+            columns = [Customer.customer_id]
+        else:
+            return jsonify({'error': 'order must be one of: id, created_at'}), 400
+        
+        try:
+            cursor_values = None
+            if request.args.get('cursor'):
+                cursor_values = decode_cursor(request.args['cursor'])
+                if order == 'created_at' and len(cursor_values) == 2:
+                    cursor_values[0] = datetime.fromisoformat(cursor_values[0])
+            elif request.args.get('after'):
+                if order != 'id':
+                    raise InvalidCursor('after can only be used with order=id')
+                cursor_values = [int(request.args['after'])]
+            
+            customers, next_cursor = keyset_paginate(
+                query, columns, cursor_values,
+                per_page=per_page,
+                descending=(order == 'created_at')
+            )
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        response = {
+            'customers': CUSTOMER.rows(customers),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'per_page': per_page
+        }
+        
+        if request.args.get('include_total', '').lower() in ['true', '1']:
+            response['total'] = cached_count(
+                query, ('customers', search, order),
+                app.config['CUSTOMER_COUNT_CACHE_TTL']
+            )
+        
+        return jsonify(response), 200
+    
+    def _customer_detail(customer, touchpoints, sales_metrics, financial_metrics):
+        """Build the detail payload for one customer and its related rows"""
+        return {
+            'customer': CUSTOMER(customer),
+            'touchpoints': TOUCHPOINT.many(touchpoints),
+            'sales_metrics': SALES_METRIC.many(sales_metrics),
+            'financial_metrics': FINANCIAL_METRIC.many(financial_metrics)
+        }
+    
+    async def _customer_detail_async(customer_id):
+        """Run the detail queries concurrently on the async engine"""
+        customer, touchpoints, sales_metrics, financial_metrics = await async_db.gather(
+            db.select(*CUSTOMER.columns).where(Customer.customer_id == customer_id),
+            db.select(*TOUCHPOINT.columns).where(Touchpoint.customer_id == customer_id)
+                .order_by(Touchpoint.touchpoint_id).limit(10),
+            db.select(*SALES_METRIC.columns).where(SalesMetric.customer_id == customer_id)
+                .order_by(SalesMetric.sale_id).limit(10),
+            db.select(*FINANCIAL_METRIC.columns).where(FinancialMetric.customer_id == customer_id)
+                .order_by(FinancialMetric.financial_id).limit(10)
+        )
+        if not customer:
+            return None
+        return {
+            'customer': CUSTOMER.rows(customer)[0],
+            'touchpoints': TOUCHPOINT.rows(touchpoints),
+            'sales_metrics': SALES_METRIC.rows(sales_metrics),
+            'financial_metrics': FINANCIAL_METRIC.rows(financial_metrics)
+        }
+    
     @app.route('/api/customers/<int:customer_id>', methods=['GET'])
     @login_required
     def api_get_customer_details(customer_id):
         """API endpoint to get detailed customer information"""
+        if async_db.enabled:
+            detail = app.ensure_sync(_customer_detail_async)(customer_id)
+            if detail is None:
+                abort(404)
+            return jsonify(detail), 200
+        
         customer = Customer.query.get_or_404(customer_id)
         
         # Get related data
-        touchpoints = Touchpoint.query.filter_by(customer_id=customer_id).limit(10).all()
-        sales_metrics = SalesMetric.query.filter_by(customer_id=customer_id).limit(10).all()
-        financial_metrics = FinancialMetric.query.filter_by(customer_id=customer_id).limit(10).all()
+        touchpoints = Touchpoint.query.filter_by(customer_id=customer_id).order_by(Touchpoint.touchpoint_id).limit(10).all()
+        sales_metrics = SalesMetric.query.filter_by(customer_id=customer_id).order_by(SalesMetric.sale_id).limit(10).all()
+        financial_metrics = FinancialMetric.query.filter_by(customer_id=customer_id).order_by(FinancialMetric.financial_id).limit(10).all()
+        
+        return jsonify(_customer_detail(customer, touchpoints, sales_metrics, financial_metrics)), 200
+    
+    def _timeline_cursor(value):
+        """Parse a timeline cursor into its ``(timestamp, source, id)``"""
+        values = decode_cursor(value)
+        if (len(values) != 3 or not isinstance(values[0], str) or values[1] not in TIMELINE_SOURCES
+                or type(values[2]) is not int):
+            raise InvalidCursor('Invalid cursor')
+        try:
+            return datetime.fromisoformat(values[0]), values[1], values[2]
+        except ValueError:
+            raise InvalidCursor('Invalid cursor')
+    
+    @app.route('/api/customers/<int:customer_id>/timeline', methods=['GET'])
+    @login_required
+    def api_get_customer_timeline(customer_id):
+        """API endpoint to page through a customer's touchpoints, interactions and sales in time order
+
+        Events come newest first (``order=asc`` for oldest first), ``per_page``
+        at a time; pass the returned ``next_cursor`` back as ``cursor`` for
+        the next page.
+        """
+        if db.session.get(Customer, customer_id) is None:
+            return jsonify({'error': 'Customer not found'}), 404
+        
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), app.config['TIMELINE_MAX_PER_PAGE'])
+        order = request.args.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': 'order must be one of: asc, desc'}), 400
         
+        try:
+            cursor = _timeline_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        
+        events, next_cursor = customer_timeline(customer_id, cursor, per_page, descending=(order == 'desc'))
         return jsonify({
-            'customer': {
-                'customer_id': customer.customer_id,
-                'first_name': customer.first_name,
-                'last_name': customer.last_name,
-                'email': customer.email,
-                'device_type': customer.device_type,
-                'created_at': customer.created_at.isoformat() if customer.created_at else None
-            },
-            'touchpoints': [{
-                'touchpoint_id': t.touchpoint_id,
-                'touchpoint_type': t.touchpoint_type,
-                'touchpoint_detail': t.touchpoint_detail,
-                'interaction_date': t.interaction_date.isoformat() if t.interaction_date else None,
-                'device_type': t.device_type
-            } for t in touchpoints],
-            'sales_metrics': [{
-                'sale_id': s.sale_id,
-                'conversion_stage': s.conversion_stage,
-                'deal_size': s.deal_size,
-                'sale_date': s.sale_date.isoformat() if s.sale_date else None,
-                'won': bool(s.won)
-            } for s in sales_metrics],
-            'financial_metrics': [{
-                'financial_id': f.financial_id,
-                'revenue': f.revenue,
-                'cac': f.cac,
-                'cltv': f.cltv,
-                'cpc': f.cpc,
-                'cpcv': f.cpcv,
-                'acv': f.acv
-            } for f in financial_metrics]
+            'customer_id': customer_id,
+            'events': events,
+            'next_cursor': encode_cursor(next_cursor) if next_cursor else None,
+            'has_more': next_cursor is not None,
+            'per_page': per_page
         }), 200
     
+    @app.route('/api/customers/details', methods=['GET'])
+    @login_required
+    def api_get_customers_details():
+        """API endpoint to get detailed information for several customers at once"""
+        try:
+            customer_ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of customer ids'}), 400
+        
+        customer_ids = list(dict.fromkeys(customer_ids))
+        if not customer_ids:
+            return jsonify({'error': 'ids is required'}), 400
+        
+        max_ids = app.config['CUSTOMER_DETAILS_MAX_IDS']
+        if len(customer_ids) > max_ids:
+            return jsonify({'error': f'At most {max_ids} ids can be requested at once'}), 400
+        
+        # One query per table, each windowed to 10 rows per customer
+        customers = {c.customer_id: c for c in Customer.query.filter(Customer.customer_id.in_(customer_ids))}
+        touchpoints = rows_per_customer(Touchpoint, customer_ids)
+        sales_metrics = rows_per_customer(SalesMetric, customer_ids)
+        financial_metrics = rows_per_customer(FinancialMetric, customer_ids)
+        
+        return jsonify({
+            'customers': [
+                _customer_detail(customers[i], touchpoints[i], sales_metrics[i], financial_metrics[i])
+                for i in customer_ids if i in customers
+            ],
+            'missing': [i for i in customer_ids if i not in customers]
+        }), 200
+    
+    # Export Routes
+    def _export_response(query, columns, name):
+        """Stream a query as an NDJSON or CSV download without materializing it"""
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': 'format must be one of: ndjson, csv'}), 400
+        
+        batch_size = app.config['EXPORT_BATCH_SIZE']
+        rows = query.yield_per(batch_size)
+        return Response(
+            stream_with_context(stream_export(rows, columns, fmt, batch_size)),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+        )
+    
+    def _date_range(column):
+        """Turn ?from=&to= ISO dates into filters on ``column``; ``to`` is inclusive"""
+        filters = []
+        if request.args.get('from'):
+            filters.append(column >= datetime.fromisoformat(request.args['from']))
+        if request.args.get('to'):
+            end = datetime.fromisoformat(request.args['to'])
+            if len(request.args['to']) == 10:
+                end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
+            filters.append(column <= end)
+        return filters
+    
+    @app.route('/api/export/customers', methods=['GET'])
+    @login_required
+    def api_export_customers():
+        """API endpoint to stream all matching customers as NDJSON or CSV"""
+        columns = ['customer_id', 'first_name', 'last_name', 'email', 'device_type', 'created_at']
+        query = Customer.query
+        
+        search = request.args.get('search', '')
+        if search:
+            query = filter_customers(query, search).order_by(None)
+        
+        try:
+            query = query.filter(*_date_range(Customer.created_at))
+        except ValueError:
+            return jsonify({'error': 'from and to must be ISO dates'}), 400
+        
+        query = query.with_entities(*[getattr(Customer, c) for c in columns]).order_by(Customer.customer_id)
+        return _export_response(query, columns, 'customers')
+    
+    @app.route('/api/export/interactions', methods=['GET'])
+    @login_required
+    def api_export_interactions():
+        """API endpoint to stream all matching interactions as NDJSON or CSV"""
+        columns = ['interaction_id', 'customer_id', 'campaign_id', 'touchpoint_id',
+                   'interaction_type', 'interaction_value', 'interaction_date']
+        query = Interaction.query
+        
+        for name in ['customer_id', 'campaign_id']:
+            if request.args.get(name):
+                value = request.args.get(name, type=int)
+                if value is None:
+                    return jsonify({'error': f'{name} must be an integer'}), 400
+                query = query.filter(getattr(Interaction, name) == value)
+        
+        try:
+            query = query.filter(*_date_range(Interaction.interaction_date))
+        except ValueError:
+            return jsonify({'error': 'from and to must be ISO dates'}), 400
+        
+        query = query.with_entities(*[getattr(Interaction, c) for c in columns]).order_by(Interaction.interaction_id)
+        return _export_response(query, columns, 'interactions')
+    
     @app.route('/api/campaigns', methods=['GET'])
     @login_required
+    @table_versions.conditional('campaigns')
     def api_get_campaigns():
         """API endpoint to get all campaigns"""
-        campaigns = Campaign.query.all()
+        campaigns = Campaign.query.with_entities(*CAMPAIGN.columns).all()
+        return jsonify({'campaigns': CAMPAIGN.rows(campaigns)}), 200
+    
+    @app.route('/api/campaigns/performance', methods=['GET'])
+    @login_required
+    def api_get_campaign_performance():
+        """API endpoint to rank campaigns by revenue, ROAS, win rate and more"""
+        sort = request.args.get('sort', 'revenue')
+        descending = request.args.get('order', 'desc') != 'asc'
+        limit = request.args.get('limit')
+        if limit is not None:
+            if not limit.isdigit():
+                return jsonify({'error': 'limit must be a positive integer'}), 400
+            limit = int(limit)
         
-        return jsonify({
-            'campaigns': [{
-                'campaign_id': c.campaign_id,
-                'campaign_name': c.campaign_name,
-                'utm_source': c.utm_source,
-                'utm_medium': c.utm_medium,
-                'utm_campaign': c.utm_campaign,
-                'ad_keyword': c.ad_keyword,
-                'creative_asset': c.creative_asset,
-                'start_date': c.start_date.isoformat() if c.start_date else None,
-                'ad_spend': c.ad_spend
-            } for c in campaigns]
-        }), 200
+        ensure_reconcile_job(app)
+        ensure_campaign_stats_seeded()
+        try:
+            campaigns = campaign_performance(sort, descending, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'campaigns': campaigns, 'sort': sort, 'order': 'desc' if descending else 'asc'}), 200
+    
+    @app.route('/api/analytics/attribution', methods=['GET'])
+    @login_required
+    def api_get_attribution():
+        """API endpoint to attribute won revenue to campaigns with a multi-touch model"""
+        model = request.args.get('model', 'linear')
+        half_life = request.args.get('half_life', DEFAULT_HALF_LIFE_DAYS, type=float)
+        
+        try:
+            attribution = campaign_attribution(model, half_life, attribution_cache)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(attribution), 200
+    
+    @app.route('/api/analytics/metrics', methods=['GET'])
+    @login_required
+    def api_get_metrics():
+        """API endpoint to aggregate financial or sales metrics, optionally filtered and grouped"""
+        table = request.args.get('table', 'financial_metrics')
+        metric = request.args.get('metric') or None
+        agg = request.args.get('agg', 'sum')
+        group_by = request.args.get('group_by') or None
+        
+        try:
+            if table not in metrics_cache.tables:
+                raise ValueError(f"Unknown table '{table}'")
+            filters = parse_filters(metrics_cache.tables[table], request.args)
+            since = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+            until = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+            groups = metrics_cache.aggregate(table, metric, agg, group_by, filters, since, until)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'table': table, 'metric': metric, 'agg': agg, 'group_by': group_by, 'groups': groups}), 200
+    
+    @app.route('/api/analytics/timeseries', methods=['GET'])
+    @login_required
+    @table_versions.conditional(*TIMESERIES_TABLES, extra=lambda: [date.today()])
+    def api_get_timeseries():
+        """API endpoint to chart touchpoints or interactions over time from the activity rollups"""
+        metric = request.args.get('metric', 'touchpoints')
+        bucket = request.args.get('bucket', 'day')
+        group_by = request.args.get('group_by') or None
+        
+        try:
+            until = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+            since = (date.fromisoformat(request.args['from']) if request.args.get('from')
+                     else until - timedelta(days=app.config['TIMESERIES_DEFAULT_DAYS'] - 1))
+            filters = {name: request.args[name] for name in TIMESERIES_DIMENSIONS if request.args.get(name)}
+            if 'campaign_id' in filters:
+                if not filters['campaign_id'].isdigit():
+                    raise ValueError('campaign_id must be an integer')
+                filters['campaign_id'] = int(filters['campaign_id'])
+            points = read_activity_timeseries(metric, bucket, since, until, filters, group_by,
+                                              app.config['TIMESERIES_MAX_BUCKETS'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'metric': metric, 'bucket': bucket, 'from': since.isoformat(), 'to': until.isoformat(),
+                        'group_by': group_by, 'points': points}), 200
     
     @app.route('/api/dashboard/stats', methods=['GET'])
     @login_required
+    @table_versions.conditional(*DASHBOARD_STATS_TABLES, extra=lambda: [date.today()])
     def api_get_dashboard_stats():
         """API endpoint to get dashboard statistics"""
-        total_customers = Customer.query.count()
-        total_campaigns = Campaign.query.count()
-        total_revenue = db.session.query(db.func.sum(FinancialMetric.revenue)).scalar() or 0
-        total_interactions = Interaction.query.count()
-        
-        # Recent customers (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_customers = Customer.query.filter(Customer.created_at >= thirty_days_ago).count()
-        
-        return jsonify({
-            'total_customers': total_customers,
-            'total_campaigns': total_campaigns,
-            'total_revenue': float(total_revenue),
-            'total_interactions': total_interactions,
-            'recent_customers': recent_customers
-        }), 200
+        ensure_reconcile_job(app)
+        if async_db.enabled:
+            stats = app.ensure_sync(read_dashboard_stats_async)(async_db)
+            if stats is not None:
+                return jsonify(stats), 200
+        return jsonify(read_dashboard_stats()), 200
     
     return app
 
@@ -354,5 +766,5 @@ app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade_database(db.engine)
     app.run(debug=True, host='0.0.0.0', port=5000)
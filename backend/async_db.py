@@ -0,0 +1,81 @@
+"""
+An async engine beside the app's sync one, for views whose queries do not
+depend on each other.
+
+With ``ASYNC_VIEWS_ENABLED`` on, the customer detail and dashboard stats
+endpoints run their queries through ``AsyncDatabase.gather``, each on its
+own connection, so a request waits for the slowest query rather than for
+the sum of them. It is off by default: on a local SQLite file each of
+those queries is an index lookup well under a millisecond, and starting an
+event loop per request costs more than the overlap saves. It pays off when
+queries wait on a database server. Compare the two paths with
+``benchmark_endpoints.py --async-views``.
+
+Flask runs async views on a fresh event loop per request, so the pool is
+shared by many loops. aiosqlite completes each call on the loop that made
+it, and the pool is allowed to overflow instead of waiting for a
+connection, so nothing in it is ever bound to one loop. The connections
+get the same SQLite pragmas as the sync engines, plus ``query_only``: the
+async path only reads.
+
+An in-memory database cannot be shared between engines, so it needs a
+file database.
+"""
+
+import asyncio
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from engines import apply_pragmas, is_memory_database, sqlite_pragmas
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+def async_url(url):
+    """The async driver's equivalent of the sync database ``url``"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver configured for {backend!r} databases')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+class AsyncDatabase:
+    """Owns the async engine and runs independent reads concurrently"""
+    
+    def __init__(self, app=None):
+        self.enabled = False
+        self.engine = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        if self.engine is not None:
+            self.engine.sync_engine.dispose()
+        self.engine = None
+        self.enabled = app.config.get('ASYNC_VIEWS_ENABLED', False)
+        
+        if self.enabled:
+            with app.app_context():
+                url = app.extensions['sqlalchemy'].engine.url
+            if url.get_backend_name() == 'sqlite' and is_memory_database(url):
+                raise ValueError('ASYNC_VIEWS_ENABLED needs a file database; '
+                                 'an in-memory one is not shared between engines')
+            
+            pool_size = app.config.get('ASYNC_DB_POOL_SIZE', 8)
+            self.engine = create_async_engine(async_url(url), pool_size=pool_size, max_overflow=-1)
+            if url.get_backend_name() == 'sqlite':
+                apply_pragmas(self.engine.sync_engine, sqlite_pragmas(app.config) + [('query_only', 'ON')])
+        
+        app.extensions['async_db'] = self
+    
+    async def fetch(self, statement):
+        """Run one statement on its own connection and return all its rows"""
+        async with self.engine.connect() as connection:
+            result = await connection.execute(statement)
+            return result.all()
+    
+    async def gather(self, *statements):
+        """Run ``statements`` concurrently; return each one's rows, in order"""
+        return await asyncio.gather(*(self.fetch(statement) for statement in statements))
@@ -0,0 +1,216 @@
+"""
+Multi-touch attribution of won revenue to campaigns.
+
+Each customer's interactions, ordered by date, form their path, and the
+value of the customer's won deals is shared among the campaigns on that
+path according to the chosen model. Paths are held as flat NumPy arrays
+sorted by (customer_id, interaction_date), so every model is a handful of
+segment operations over all customers at once instead of a Python loop
+per customer.
+
+``AttributionCache`` keeps the loaded arrays between requests and loads
+them again only once the ``table_versions`` counter of the table they
+come from has moved, or after ``ATTRIBUTION_CACHE_MAX_AGE`` seconds,
+which picks up writes made by other processes.
+"""
+
+import threading
+import time
+import numpy as np
+from models import db, Campaign, Interaction, SalesMetric
+
+MODELS = ('first_touch', 'last_touch', 'linear', 'time_decay', 'position_based')
+POSITION_WEIGHTS = (0.4, 0.2, 0.4)  # first touch, all middle touches, last touch
+DEFAULT_HALF_LIFE_DAYS = 7.0
+
+PATH_DTYPE = np.dtype([('customer_id', np.int64), ('campaign_id', np.int64), ('day', np.float64)])
+REVENUE_DTYPE = np.dtype([('customer_id', np.int64), ('revenue', np.float64)])
+
+def _fetch_array(statement, dtype):
+    """Run ``statement`` and read its rows straight into a structured array"""
+    result = db.session.connection().execute(statement)
+    try:
+        return np.fromiter(result.cursor, dtype=dtype)
+    finally:
+        result.close()
+
+def load_paths():
+    """Load every dated interaction as (customer_ids, campaign_ids, days) arrays.
+
+    ``days`` are Julian day numbers. The rows are read in table order and
+    sorted by customer, then date, with NumPy, which is quicker than having
+    SQLite walk the (customer_id, interaction_date) index and look up each row.
+    """
+    rows = _fetch_array(
+        db.select(Interaction.customer_id, Interaction.campaign_id,
+                  db.func.julianday(Interaction.interaction_date))
+        .where(Interaction.interaction_date.isnot(None)),
+        PATH_DTYPE
+    )
+    customer_ids, campaign_ids, days = rows['customer_id'], rows['campaign_id'], rows['day']
+    
+    step = np.diff(customer_ids)
+    if not np.all((step > 0) | ((step == 0) & (np.diff(days) >= 0))):
+        order = np.lexsort((days, customer_ids))
+        customer_ids, campaign_ids, days = customer_ids[order], campaign_ids[order], days[order]
+    return np.ascontiguousarray(customer_ids), np.ascontiguousarray(campaign_ids), np.ascontiguousarray(days)
+
+def load_revenue():
+    """Load the won deal value per customer as (customer_ids, revenue) arrays sorted by customer"""
+    rows = _fetch_array(
+        db.select(SalesMetric.customer_id, db.func.sum(SalesMetric.deal_size))
+        .where(SalesMetric.won == 1)
+        .group_by(SalesMetric.customer_id)
+        .having(db.func.sum(SalesMetric.deal_size) > 0)
+        .order_by(SalesMetric.customer_id),
+        REVENUE_DTYPE
+    )
+    return np.ascontiguousarray(rows['customer_id']), np.ascontiguousarray(rows['revenue'])
+
+class AttributionCache:
+    """The interaction paths and won revenue arrays, reused until their table changes"""
+    
+    def __init__(self, app=None):
+        self.versions = None
+        self.max_age = 300
+        self._entries = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.versions = app.extensions['table_versions']
+        self.max_age = app.config.get('ATTRIBUTION_CACHE_MAX_AGE', 300)
+        self.clear()
+        app.extensions['attribution_cache'] = self
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def _get(self, table, load):
+        # Taken before loading, so a write that lands mid-load triggers another load next time
+        version = self.versions.version(table)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(table)
+        if entry and entry[0] == version and now - entry[1] < self.max_age:
+            return entry[2]
+        arrays = load()
+        with self._lock:
+            self._entries[table] = (version, now, arrays)
+        return arrays
+    
+    def paths(self):
+        return self._get(Interaction.__tablename__, load_paths)
+    
+    def revenue(self):
+        return self._get(SalesMetric.__tablename__, load_revenue)
+
+def _segments(customer_ids):
+    """Return where each customer's run of touches starts and how long it is"""
+    starts = np.flatnonzero(np.r_[True, customer_ids[1:] != customer_ids[:-1]])
+    return starts, np.diff(np.r_[starts, len(customer_ids)])
+
+def credit_weights(model, customer_ids, days, half_life_days=DEFAULT_HALF_LIFE_DAYS):
+    """Return the share of its customer's revenue each touch earns.
+
+    ``customer_ids`` and ``days`` must be sorted by customer, then date. The
+    shares of each customer's touches add up to 1.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown attribution model '{model}'; expected one of: {', '.join(MODELS)}")
+    if model == 'time_decay' and not half_life_days > 0:
+        raise ValueError('half_life must be a positive number of days')
+    
+    count = len(customer_ids)
+    if count == 0:
+        return np.zeros(0)
+    
+    # Per touch: which customer's segment it is in and its position within it
+    starts, lengths = _segments(customer_ids)
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    position = np.arange(count) - starts[segment]
+    length = lengths[segment]
+    
+    if model == 'first_touch':
+        return (position == 0).astype(np.float64)
+    if model == 'last_touch':
+        return (position == length - 1).astype(np.float64)
+    if model == 'linear':
+        return 1.0 / length
+    if model == 'time_decay':
+        # A touch's weight halves for every half-life it came before the last touch
+        last_days = days[starts + lengths - 1]
+        weights = np.exp2((days - last_days[segment]) / half_life_days)
+        return weights / np.add.reduceat(weights, starts)[segment]
+    
+    first, middle, last = POSITION_WEIGHTS
+    weights = np.where(position == 0, first,
+                       np.where(position == length - 1, last, middle / np.maximum(length - 2, 1)))
+    # Paths of one or two touches have no middle, so their ends share everything
+    short = length <= 2
+    weights[short] = 1.0 / length[short]
+    return weights
+
+def attribute(paths, revenue, model, half_life_days=DEFAULT_HALF_LIFE_DAYS):
+    """Share each customer's revenue along their path.
+
+    ``paths`` is ``load_paths()`` and ``revenue`` is ``load_revenue()``.
+    Returns (campaign_ids, credit, converted_customers) for every campaign
+    that earned credit.
+    """
+    customer_ids, campaign_ids, days = paths
+    revenue_customers, revenue_values = revenue
+    if len(revenue_customers) == 0 or len(customer_ids) == 0:
+        return np.zeros(0, np.int64), np.zeros(0), 0
+    
+    # Only the paths of customers with won revenue earn anything; matching
+    # once per path rather than once per touch keeps the lookup small
+    starts, lengths = _segments(customer_ids)
+    path_customers = customer_ids[starts]
+    index = np.minimum(np.searchsorted(revenue_customers, path_customers), len(revenue_customers) - 1)
+    converted = revenue_customers[index] == path_customers
+    touches = np.repeat(converted, lengths)
+    customer_ids, campaign_ids, days = customer_ids[touches], campaign_ids[touches], days[touches]
+    values = np.repeat(revenue_values[index[converted]], lengths[converted])
+    
+    weights = credit_weights(model, customer_ids, days, half_life_days)
+    credit = np.bincount(campaign_ids, weights=weights * values)
+    earned = np.flatnonzero(credit)
+    return earned, credit[earned], int(np.count_nonzero(converted))
+
+def campaign_attribution(model='linear', half_life_days=DEFAULT_HALF_LIFE_DAYS, cache=None):
+    """Attribute all won revenue to campaigns with ``model``, highest credit first.
+
+    Paths and revenue come from ``cache`` when given, and are loaded from
+    the database otherwise. Raises ``ValueError`` for an unknown model or
+    a non-positive half-life.
+    """
+    credit_weights(model, np.zeros(0), np.zeros(0), half_life_days)  # validate before loading anything
+    
+    paths = cache.paths() if cache is not None else load_paths()
+    revenue = cache.revenue() if cache is not None else load_revenue()
+    campaign_ids, credit, conversions = attribute(paths, revenue, model, half_life_days)
+    total_revenue = float(revenue[1].sum())
+    attributed = float(credit.sum())
+    
+    names = dict(db.session.query(Campaign.campaign_id, Campaign.campaign_name).all())
+    order = np.argsort(-credit, kind='stable')
+    campaigns = [{
+        'campaign_id': int(campaign_ids[i]),
+        'campaign_name': names.get(int(campaign_ids[i])),
+        'revenue': float(credit[i]),
+        'share': float(credit[i] / attributed)
+    } for i in order]
+    
+    result = {
+        'model': model,
+        'conversions': conversions,
+        'attributed_revenue': attributed,
+        'unattributed_revenue': max(total_revenue - attributed, 0.0),
+        'campaigns': campaigns
+    }
+    if model == 'time_decay':
+        result['half_life_days'] = half_life_days
+    return result
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-touch attribution: vectorized segment operations vs a per-customer Python loop.
+
+Paths are generated in memory, so the numbers are the attribution itself;
+pass --database to also time loading the paths from a populated database.
+
+Usage:
+  python benchmark_attribution.py                        # 10,000,000 interactions
+  python benchmark_attribution.py --interactions 1000000 --database sqlite:////tmp/app.db
+"""
+
+import argparse
+import time
+from collections import defaultdict
+import numpy as np
+from attribution import MODELS, attribute, load_paths, load_revenue
+
+def generate_paths(interactions, customers, campaigns, seed):
+    """Random paths sorted by customer then day, and won revenue for a third of the customers"""
+    rng = np.random.default_rng(seed)
+    customer_ids = rng.integers(1, customers + 1, interactions)
+    days = rng.uniform(0, 365, interactions)
+    order = np.lexsort((days, customer_ids))
+    paths = (customer_ids[order], rng.integers(1, campaigns + 1, interactions), days[order])
+    
+    converted = np.flatnonzero(rng.random(customers) < 1 / 3) + 1
+    revenue = (converted, rng.uniform(1000, 51000, len(converted)))
+    return paths, revenue
+
+def loop_linear(paths, revenue):
+    """The per-customer loop the vectorized engine replaces, for the linear model"""
+    values = dict(zip(revenue[0].tolist(), revenue[1].tolist()))
+    credit = defaultdict(float)
+    path = []
+    previous = None
+    for customer_id, campaign_id in zip(paths[0].tolist(), paths[1].tolist()):
+        if customer_id != previous:
+            if path and previous in values:
+                for touched in path:
+                    credit[touched] += values[previous] / len(path)
+            path, previous = [], customer_id
+        path.append(campaign_id)
+    if path and previous in values:
+        for touched in path:
+            credit[touched] += values[previous] / len(path)
+    return credit
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--interactions', type=int, default=10000000)
+    parser.add_argument('--customers', type=int, help='default: one per five interactions')
+    parser.add_argument('--campaigns', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-loop', action='store_true', help='skip the slow Python loop baseline')
+    parser.add_argument('--database', help='also time loading paths from this database URL')
+    args = parser.parse_args()
+    customers = args.customers or max(args.interactions // 5, 1)
+    
+    (paths, revenue), elapsed = timed(generate_paths, args.interactions, customers, args.campaigns, args.seed)
+    print(f"Generated {args.interactions:,} interactions for {customers:,} customers in {elapsed:.1f}s")
+    
+    print(f"{'model':<16} {'seconds':>8} {'M touches/s':>12}")
+    for model in MODELS:
+        (_, credit, _), elapsed = timed(attribute, paths, revenue, model)
+        print(f"{model:<16} {elapsed:>8.2f} {args.interactions / elapsed / 1e6:>12.1f}")
+        if model == 'linear':
+            linear_credit, linear_elapsed = credit, elapsed
+    
+    if not args.skip_loop:
+        loop_credit, elapsed = timed(loop_linear, paths, revenue)
+        assert np.isclose(sum(loop_credit.values()), linear_credit.sum())
+        print(f"{'python loop':<16} {elapsed:>8.2f} {args.interactions / elapsed / 1e6:>12.1f}"
+              f"   ({elapsed / linear_elapsed:.0f}x slower than linear)")
+    
+    if args.database:
+        from app import create_app
+        from config import Config
+        
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = args.database
+        
+        with create_app(BenchmarkConfig).app_context():
+            paths, elapsed = timed(load_paths)
+            print(f"Loaded {len(paths[0]):,} interactions from the database in {elapsed:.2f}s")
+            revenue, elapsed = timed(load_revenue)
+            print(f"Loaded won revenue for {len(revenue[0]):,} customers in {elapsed:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark customer search: substring ILIKE scan vs the FTS5 search index.
+
+Usage:
+  python benchmark_customer_search.py                 # 1,000,000 customers
+  python benchmark_customer_search.py --customers 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from app import create_app
+from config import Config
+from models import db, Customer
+from search import filter_customers
+
+TERMS = ['First123', 'Last99999', 'user4242@example', 'smith', 'nomatch']
+
+def build_database(count, chunk_size=50000):
+    """Insert ``count`` synthetic customers in chunks (the FTS triggers index them)"""
+    rng = random.Random(42)
+    surnames = ['Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Johnson', 'Davies']
+    for start in range(1, count + 1, chunk_size):
+        rows = [{
+            'customer_id': i,
+            'first_name': f'First{i}',
+            'last_name': f'Last{i}' if i % 10 else rng.choice(surnames),
+            'email': f'user{i}@example.com',
+            'device_type': rng.choice(['Mobile', 'Desktop', 'Tablet'])
+        } for i in range(start, min(start + chunk_size, count + 1))]
+        db.session.execute(Customer.__table__.insert(), rows)
+        db.session.commit()
+
+def ilike_query(term):
+    return Customer.query.filter(
+        db.or_(
+            Customer.first_name.ilike(f'%{term}%'),
+            Customer.last_name.ilike(f'%{term}%'),
+            Customer.email.ilike(f'%{term}%')
+        )
+    )
+
+def time_first_page(make_query, term, repeats):
+    """Median milliseconds to fetch the first page of 50 plus the total, as the endpoint does"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        make_query(term).paginate(page=1, per_page=50, error_out=False).items
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=1000000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    path = os.path.join(tempfile.mkdtemp(), 'search_benchmark.db')
+    
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        build_database(args.customers)
+        print(f"Loaded {args.customers:,} customers in {time.perf_counter() - start:.1f}s ({path})")
+        
+        print(f"{'term':<20} {'ILIKE ms':>10} {'FTS5 ms':>10} {'speedup':>8}")
+        for term in TERMS:
+            scan = time_first_page(ilike_query, term, args.repeats)
+            indexed = time_first_page(lambda t: filter_customers(Customer.query, t), term, args.repeats)
+            print(f"{term:<20} {scan:>10.1f} {indexed:>10.1f} {scan / indexed:>7.0f}x")
+
+if __name__ == '__main__':
+    main()
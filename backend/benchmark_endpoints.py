@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark the API endpoints in-process and check them against a stored baseline.
+
+Builds a seeded database at the requested scale with populate_customer_data,
+then drives each scenario below through the Flask test client from
+concurrent logged-in clients, and reports p50, p95, p99 and throughput.
+
+Results are compared with the baseline file. The run exits non-zero if any
+scenario's p95 exceeds its baseline by more than ``--threshold``, if its
+throughput falls by the same factor, or if any request fails. p99 is
+reported but not checked: a few hundred requests put it at the mercy of a
+single slow one.
+Record a new baseline with ``--update-baseline``. Baselines only compare
+like with like: rerun them after changing the scale, the client count or
+the machine.
+
+Usage:
+  python benchmark_endpoints.py                                # compare with benchmark_baseline.json
+  python benchmark_endpoints.py --update-baseline
+  python benchmark_endpoints.py --customers 20000 --clients 8 --baseline /tmp/big.json --update-baseline
+  python benchmark_endpoints.py --only customers_search,login
+  python benchmark_endpoints.py --only customer_details,dashboard_stats --async-views --baseline /tmp/async.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from app import create_app
+from config import Config
+from models import db, User
+from populate_customer_data import populate_customer_data
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+def scenarios(customer_count):
+    """Each scenario's name and a function from a random generator to one request's (method, url, json)"""
+    pages = max(1, customer_count // 50)
+    customer_id = lambda rng: rng.randint(1, customer_count)
+    return {
+        'customers_page': lambda rng: ('GET', f'/api/customers?page={rng.randint(1, pages)}&per_page=50', None),
+        'customers_keyset': lambda rng: ('GET', f'/api/customers?after={customer_id(rng)}&per_page=50', None),
+        'customers_search': lambda rng: ('GET', f'/api/customers?search=First{customer_id(rng) // 10}&per_page=50', None),
+        'customer_details': lambda rng: ('GET', f'/api/customers/{customer_id(rng)}', None),
+        'customer_details_batch': lambda rng: (
+            'GET', '/api/customers/details?ids=' + ','.join(str(customer_id(rng)) for _ in range(20)), None
+        ),
+        'campaigns': lambda rng: ('GET', '/api/campaigns', None),
+        'campaign_performance': lambda rng: ('GET', '/api/campaigns/performance?limit=10', None),
+        'dashboard_stats': lambda rng: ('GET', '/api/dashboard/stats', None),
+        'login': lambda rng: ('POST', '/api/login', {'username': 'benchmark', 'password': 'benchmark-password'}),
+    }
+
+def build_app(path, args):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        BCRYPT_LOG_ROUNDS = args.bcrypt_rounds
+        MAIL_OUTBOX_WORKERS = 0
+        RATE_LIMIT_ENABLED = False
+        MAIL_SUPPRESS_SEND = True
+        DASHBOARD_STATS_RECONCILE_INTERVAL = 0
+        PASSWORD_POOL_WORKERS = args.clients
+        ASYNC_VIEWS_ENABLED = args.async_views
+    
+    app = create_app(BenchmarkConfig)
+    app.logger.disabled = True  # failed requests are counted, not logged
+    populate_customer_data(args.customers, args.campaigns, args.seed, app=app)
+    with app.app_context():
+        user = User(username='benchmark', email='benchmark@example.com', first_name='Bench', last_name='Mark',
+                    is_verified=True, is_approved=True, is_admin=True)
+        user.set_password('benchmark-password')
+        db.session.add(user)
+        db.session.commit()
+        db.session.remove()
+    return app
+
+def logged_in_client(app):
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': 'benchmark', 'password': 'benchmark-password'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return client
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted ``values``"""
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+def run_scenario(clients, make_request, count, warmup, seed):
+    """Send ``count`` requests split across ``clients``; return sorted latencies, wall time and failures"""
+    for i in range(warmup):
+        method, url, body = make_request(random.Random(seed - i - 1))
+        clients[i % len(clients)].open(url, method=method, json=body)
+    
+    remaining = iter(range(count))
+    lock = threading.Lock()
+    latencies, failures = [], []
+    
+    def worker(client):
+        own = []
+        while True:
+            with lock:
+                i = next(remaining, None)
+            if i is None:
+                break
+            method, url, body = make_request(random.Random(seed + i))
+            start = time.perf_counter()
+            response = client.open(url, method=method, json=body)
+            own.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                failures.append(f'{method} {url} -> HTTP {response.status_code}')
+        with lock:
+            latencies.extend(own)
+    
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), time.perf_counter() - start, failures
+
+def summarize(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1)
+    }
+
+def regressions(result, baseline, threshold):
+    """How ``result`` is worse than ``baseline`` by more than ``threshold`` (a ratio such as 1.5)"""
+    problems = []
+    if result['p95_ms'] > baseline['p95_ms'] * threshold:
+        problems.append(f"p95 {result['p95_ms']:.1f} ms > {baseline['p95_ms']:.1f} ms x {threshold:g}")
+    if result['throughput_rps'] * threshold < baseline['throughput_rps']:
+        problems.append(f"throughput {result['throughput_rps']:.1f}/s < {baseline['throughput_rps']:.1f}/s / {threshold:g}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--campaigns', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--clients', type=int, default=4, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=400, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='unmeasured requests per scenario')
+    parser.add_argument('--bcrypt-rounds', type=int, default=8, help='work factor for the login scenario')
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--async-views', action='store_true', help='serve the views that have one from the async path')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=1.5, help='allowed slowdown ratio before failing')
+    parser.add_argument('--update-baseline', action='store_true', help='write these results as the new baseline')
+    args = parser.parse_args()
+    
+    all_scenarios = scenarios(args.customers)
+    names = args.only.split(',') if args.only else list(all_scenarios)
+    unknown = set(names) - set(all_scenarios)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    
+    scale = {'customers': args.customers, 'campaigns': args.campaigns, 'seed': args.seed,
+             'clients': args.clients, 'bcrypt_rounds': args.bcrypt_rounds, 'async_views': args.async_views}
+    baseline = None
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['scale'] != scale:
+            print(f"Baseline was recorded at {baseline['scale']}, not {scale}; not comparing")
+            baseline = None
+    
+    directory = tempfile.mkdtemp()
+    try:
+        started = time.perf_counter()
+        app = build_app(os.path.join(directory, 'endpoint_benchmark.db'), args)
+        print(f"Seeded {args.customers:,} customers in {time.perf_counter() - started:.1f}s\n")
+        clients = [logged_in_client(app) for _ in range(args.clients)]
+        
+        print(f"{'scenario':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}   vs baseline")
+        results, failed = {}, []
+        for name in names:
+            latencies, elapsed, failures = run_scenario(clients, all_scenarios[name], args.requests,
+                                                        args.warmup, args.seed)
+            result = results[name] = summarize(latencies, elapsed)
+            problems = [f'{len(failures)} failed requests, e.g. {failures[0]}'] if failures else []
+            comparison = ''
+            if baseline is not None and name in baseline['scenarios']:
+                before = baseline['scenarios'][name]
+                problems += regressions(result, before, args.threshold)
+                comparison = f"p95 {result['p95_ms'] / before['p95_ms']:.2f}x"
+            print(f"{name:<24} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                  f"{result['throughput_rps']:>8.1f}   {comparison}")
+            for problem in problems:
+                print(f"  REGRESSION: {problem}")
+            if problems:
+                failed.append(name)
+        
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+    
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'scale': scale, 'scenarios': results}, f, indent=2)
+            f.write('\n')
+        print(f"\nWrote the baseline to {args.baseline}")
+    elif failed:
+        print(f"\n{len(failed)} scenario(s) regressed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
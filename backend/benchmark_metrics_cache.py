@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark the columnar metrics cache against the same aggregations in SQL.
+
+Runs against an existing database, e.g. one filled by populate_customer_data.py.
+
+Usage:
+  python benchmark_metrics_cache.py --database sqlite:////tmp/app.db
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+from app import create_app, metrics_cache
+from config import Config
+
+QUERIES = [
+    ('financial_metrics', 'revenue', 'sum', None, {}),
+    ('financial_metrics', 'revenue', 'sum', 'campaign_id', {}),
+    ('financial_metrics', 'cac', 'mean', 'device_type', {}),
+    ('financial_metrics', 'cltv', 'max', 'campaign_id', {'device_type': ['Mobile']}),
+    ('sales_metrics', 'deal_size', 'sum', 'campaign_id', {'won': [1]}),
+    ('sales_metrics', 'won', 'mean', 'device_type', {'campaign_id': [1, 2, 3]}),
+    ('sales_metrics', 'deal_size', 'sum', 'sale_date', {}),
+]
+
+def median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', required=True, help='database URL to read')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database
+        METRICS_CACHE_ENABLED = True
+        METRICS_CACHE_REFRESH_INTERVAL = 3600
+    
+    with create_app(BenchmarkConfig).app_context():
+        start = time.perf_counter()
+        metrics_cache.refresh(force=True)
+        print(f"Loaded the cache in {time.perf_counter() - start:.1f}s")
+        for name, usage in metrics_cache.memory_usage().items():
+            print(f"  {name:<18} {usage['rows']:>10,} rows {usage['bytes'] / 2**20:>8.1f} MiB "
+                  f"({usage['bytes_per_million_rows'] / 2**20:.1f} MiB per million rows)")
+        
+        start = time.perf_counter()
+        metrics_cache.refresh(force=True)
+        print(f"Incremental refresh with nothing new: {(time.perf_counter() - start) * 1000:.1f} ms")
+        
+        print(f"{'query':<58} {'SQL ms':>9} {'cache ms':>9} {'speedup':>8}")
+        since = date.today() - timedelta(days=90)
+        for table, metric, agg, group_by, filters in QUERIES:
+            query = (table, metric, agg, group_by, filters, since if table == 'sales_metrics' else None)
+            metrics_cache.enabled = False
+            in_sql = median_ms(lambda: metrics_cache.aggregate(*query), args.repeats)
+            metrics_cache.enabled = True
+            cached = median_ms(lambda: metrics_cache.aggregate(*query), args.repeats)
+            label = f"{agg}({table}.{metric}) by {group_by} {filters or ''}"
+            print(f"{label:<58} {in_sql:>9.1f} {cached:>9.1f} {in_sql / cached:>7.0f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark analytics reads running alongside login commits, with and without the SQLite engine profile.
+
+Works on copies of an existing database, e.g. one filled by
+populate_customer_data.py, so the original is left untouched. Reader
+threads request the GET endpoints below while writer threads log in over
+and over, each login committing ``last_login``. The same load runs twice:
+once with SQLite's defaults (rollback journal, synchronous=FULL, every
+request on the one pool) and once with the engine profile from config.py
+(WAL, synchronous=NORMAL, mmap, a bigger cache and GETs on the read-only
+pool).
+
+Usage:
+  python benchmark_read_routing.py --database /tmp/app.db
+  python benchmark_read_routing.py --database /tmp/app.db --readers 8 --writers 4 --seconds 20
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from app import create_app
+from config import Config
+from models import db, User
+from schema import upgrade_database
+
+READ_URLS = [
+    '/api/customers?page=3&per_page=50',
+    '/api/campaigns/performance?limit=10',
+    '/api/dashboard/stats',
+    '/api/customers/details?ids=11,12,13,14,15',
+]
+
+# A long analytics query one more reader keeps running; under a rollback
+# journal, a login waiting to commit behind it locks out every other reader
+REPORT_URL = '/api/analytics/metrics?table=sales_metrics&metric=deal_size&agg=sum&group_by=campaign_id'
+
+DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'delete',
+    'SQLITE_SYNCHRONOUS': 'full',
+    'SQLITE_MMAP_SIZE': 0,
+    'SQLITE_CACHE_SIZE': -2000,
+    'SQLITE_READ_POOL_SIZE': 0,
+}
+
+def copy_database(source, directory, name):
+    path = os.path.join(directory, name)
+    with sqlite3.connect(source) as connection:
+        # Leave the copy in rollback-journal mode; the profiled run switches it to WAL
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    shutil.copyfile(source, path)
+    with sqlite3.connect(path) as connection:
+        connection.execute('PRAGMA journal_mode = delete')
+    return path
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run(path, settings, args):
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        LOGIN_DISABLED = True
+        BCRYPT_LOG_ROUNDS = 4
+        MAIL_OUTBOX_WORKERS = 0
+        RATE_LIMIT_ENABLED = False
+        DASHBOARD_STATS_RECONCILE_INTERVAL = 0
+        PASSWORD_POOL_WORKERS = args.writers
+    for name, value in settings.items():
+        setattr(BenchmarkConfig, name, value)
+    
+    app = create_app(BenchmarkConfig)
+    app.logger.disabled = True  # failed requests are counted, not logged
+    with app.app_context():
+        upgrade_database(db.engine)
+        for i in range(args.writers):
+            user = User(username=f'bench{i}', email=f'bench{i}@example.com', first_name='Bench', last_name='User',
+                        is_verified=True, is_approved=True)
+            user.set_password('benchmark')
+            db.session.add(user)
+        db.session.commit()
+        db.session.remove()
+    
+    # Warm every endpoint once, so one-off seeding is not measured
+    warm = app.test_client()
+    for url in READ_URLS + [REPORT_URL]:
+        assert warm.get(url).status_code == 200, url
+    
+    stop = threading.Event()
+    reads, reports, logins, errors = [], [], [], []
+    
+    def reader(urls, offset, results):
+        client = app.test_client()
+        latencies = []
+        i = offset
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.get(urls[i % len(urls)])
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+            i += 1
+        results.extend(latencies)
+    
+    def writer(number):
+        client = app.test_client()
+        latencies = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.post('/api/login', json={'username': f'bench{number}', 'password': 'benchmark'})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        logins.extend(latencies)
+    
+    threads = [threading.Thread(target=reader, args=(READ_URLS, i, reads)) for i in range(args.readers)]
+    threads.append(threading.Thread(target=reader, args=([REPORT_URL], 0, reports)))
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    
+    with app.app_context():
+        db.session.remove()
+        for engine in [app.extensions['engine_router'].read_engine, db.engine]:
+            if engine is not None:
+                engine.dispose()
+    return sorted(reads), sorted(reports), sorted(logins), errors
+
+def report(label, latencies, seconds):
+    print(f"  {label:<8} {len(latencies) / seconds:>8.1f}/s  p50 {statistics.median(latencies):>7.1f} ms  "
+          f"p95 {percentile(latencies, 0.95):>7.1f} ms  p99 {percentile(latencies, 0.99):>7.1f} ms  "
+          f"max {latencies[-1]:>7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', required=True, help='path of the SQLite database to copy')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    
+    directory = tempfile.mkdtemp()
+    try:
+        for label, settings in [('SQLite defaults', DEFAULTS), ('engine profile', {})]:
+            path = copy_database(args.database, directory, 'read_routing_benchmark.db')
+            reads, reports, logins, errors = run(path, settings, args)
+            print(f"{label} ({args.readers} readers, 1 report, {args.writers} writers, {args.seconds:.0f}s)")
+            report('reads', reads, args.seconds)
+            report('report', reports, args.seconds)
+            report('logins', logins, args.seconds)
+            if errors:
+                print(f"  {len(errors)} failed requests, e.g. HTTP {errors[0]}")
+            os.remove(path)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
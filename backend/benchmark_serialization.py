@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark list serialization: hand-built dicts through stdlib json vs compiled serializers on orjson.
+
+Usage:
+  python benchmark_serialization.py                  # 10,000 rows
+  python benchmark_serialization.py --rows 50000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+import serializers
+from app import create_app
+from config import Config
+from models import db, Customer
+from serializers import CUSTOMER
+
+def build_database(count):
+    now = datetime.utcnow()
+    db.session.execute(Customer.__table__.insert(), [{
+        'customer_id': i,
+        'first_name': f'First{i}',
+        'last_name': f'Last{i}',
+        'email': f'user{i}@example.com',
+        'device_type': ['Mobile', 'Desktop', 'Tablet'][i % 3],
+        'created_at': now - timedelta(minutes=i)
+    } for i in range(1, count + 1)])
+    db.session.commit()
+
+def hand_built(count):
+    """The list endpoints before: ORM objects, a dict comprehension and jsonify's stdlib json"""
+    customers = Customer.query.limit(count).all()
+    payload = {'customers': [{
+        'customer_id': c.customer_id,
+        'first_name': c.first_name,
+        'last_name': c.last_name,
+        'email': c.email,
+        'device_type': c.device_type,
+        'created_at': c.created_at.isoformat() if c.created_at else None
+    } for c in customers]}
+    return json.dumps(payload, sort_keys=True).encode('utf-8')
+
+def compiled(count):
+    """The list endpoints now: plain rows, the compiled serializer and the app's JSON provider"""
+    rows = Customer.query.with_entities(*CUSTOMER.columns).limit(count).all()
+    return current_app.json.response({'customers': CUSTOMER.rows(rows)}).get_data()
+
+def median_ms(fn, *args, repeats=7):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=7)
+    args = parser.parse_args()
+    
+    path = os.path.join(tempfile.mkdtemp(), 'serialization_benchmark.db')
+    
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+    
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        build_database(args.rows)
+        db.session.remove()
+        
+        before, body = median_ms(hand_built, args.rows, repeats=args.repeats)
+        after, fast_body = median_ms(compiled, args.rows, repeats=args.repeats)
+        assert json.loads(body) == json.loads(fast_body)
+        print(f"{args.rows:,} customers, {len(body) / 1024:.0f} KiB of JSON")
+        encoder = 'orjson' if serializers.orjson else 'stdlib json'
+        print(f"  {'hand-built dicts + stdlib json':<40} {before:>8.1f} ms")
+        print(f"  {'compiled serializer + ' + encoder:<40} {after:>8.1f} ms  ({before / after:.1f}x)")
+        
+        print("Compression of that body:")
+        for name, compress in [('gzip -6', lambda: gzip.compress(fast_body, 6))] + (
+                [('brotli q4', lambda: serializers.brotli.compress(fast_body, quality=serializers.BROTLI_QUALITY))]
+                if serializers.brotli else []):
+            elapsed, compressed = median_ms(compress, repeats=args.repeats)
+            print(f"  {name:<10} {elapsed:>6.1f} ms  {len(fast_body) / 1024:.0f} KiB -> {len(compressed) / 1024:.0f} KiB")
+
+if __name__ == '__main__':
+    main()
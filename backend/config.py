@@ -8,6 +8,18 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite engine profile, applied to every connection
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'wal'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'normal'
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)  # bytes
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE') or -64 * 1024)  # negative means KiB
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)  # milliseconds
+    # Read-only connections for GET requests on a file database (0 sends everything to the writer)
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE') or 4)
+    # Run the customer detail and dashboard stats queries concurrently on an async engine (file databases)
+    ASYNC_VIEWS_ENABLED = os.environ.get('ASYNC_VIEWS_ENABLED', 'false').lower() in ['true', 'on', '1']
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE') or 8)
+    
     # Disable CSRF protection for API routes
     WTF_CSRF_ENABLED = False
     
@@ -19,5 +31,63 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
     
+    # Email outbox delivery
+    MAIL_OUTBOX_WORKERS = int(os.environ.get('MAIL_OUTBOX_WORKERS') or 2)
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE') or 50)
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS') or 5)
+    MAIL_OUTBOX_RETRY_DELAY = int(os.environ.get('MAIL_OUTBOX_RETRY_DELAY') or 30)
+    MAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get('MAIL_OUTBOX_RETENTION_DAYS') or 7)
+    
+    # Password hashing
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12)
+    PASSWORD_POOL_WORKERS = int(os.environ.get('PASSWORD_POOL_WORKERS') or 2)
+    PASSWORD_POOL_QUEUE_DEPTH = int(os.environ.get('PASSWORD_POOL_QUEUE_DEPTH') or 32)
+    
+    # Rate limiting for login and registration (token buckets; memory:// or sqlite:///path shared by workers)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL') or 'memory://'
+    RATE_LIMIT_LOGIN_PER_IP = os.environ.get('RATE_LIMIT_LOGIN_PER_IP') or '30/minute'
+    RATE_LIMIT_LOGIN_PER_USERNAME = os.environ.get('RATE_LIMIT_LOGIN_PER_USERNAME') or '10/minute'
+    RATE_LIMIT_REGISTER_PER_IP = os.environ.get('RATE_LIMIT_REGISTER_PER_IP') or '10/hour'
+    
+    # Logged-in user identity cache
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+    
     # Application settings
-    ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@example.com' 
\ No newline at end of file
+    ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@example.com'
+    # Signed verification links carry the user id and need no stored token (stored ones still verify)
+    EMAIL_VERIFICATION_SIGNED_TOKENS = os.environ.get('EMAIL_VERIFICATION_SIGNED_TOKENS', 'true').lower() in ['true', 'on', '1']
+    EMAIL_VERIFICATION_MAX_AGE = int(os.environ.get('EMAIL_VERIFICATION_MAX_AGE') or 24 * 3600)  # seconds
+    
+    # Pagination settings
+    CUSTOMERS_MAX_PER_PAGE = int(os.environ.get('CUSTOMERS_MAX_PER_PAGE') or 500)
+    CUSTOMER_COUNT_CACHE_TTL = int(os.environ.get('CUSTOMER_COUNT_CACHE_TTL') or 60)
+    CUSTOMER_DETAILS_MAX_IDS = int(os.environ.get('CUSTOMER_DETAILS_MAX_IDS') or 100)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    ADMIN_USERS_MAX_PER_PAGE = int(os.environ.get('ADMIN_USERS_MAX_PER_PAGE') or 500)
+    ADMIN_BULK_MAX_IDS = int(os.environ.get('ADMIN_BULK_MAX_IDS') or 1000)
+    TIMELINE_MAX_PER_PAGE = int(os.environ.get('TIMELINE_MAX_PER_PAGE') or 200)
+    
+    # Per-request SQL and latency instrumentation
+    REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    REQUEST_METRICS_REPEAT_THRESHOLD = int(os.environ.get('REQUEST_METRICS_REPEAT_THRESHOLD') or 5)
+    
+    # Response compression (gzip, or brotli when installed)
+    RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE') or 1024)
+    RESPONSE_COMPRESSION_LEVEL = int(os.environ.get('RESPONSE_COMPRESSION_LEVEL') or 6)
+    
+    # Dashboard statistics rollup
+    DASHBOARD_STATS_RECONCILE_INTERVAL = int(os.environ.get('DASHBOARD_STATS_RECONCILE_INTERVAL') or 300)
+    
+    # Activity time series (/api/analytics/timeseries)
+    TIMESERIES_DEFAULT_DAYS = int(os.environ.get('TIMESERIES_DEFAULT_DAYS') or 30)
+    TIMESERIES_MAX_BUCKETS = int(os.environ.get('TIMESERIES_MAX_BUCKETS') or 2000)
+    
+    # In-memory columnar cache of the metrics tables (opt-in)
+    METRICS_CACHE_ENABLED = os.environ.get('METRICS_CACHE_ENABLED', 'false').lower() in ['true', 'on', '1']
+    METRICS_CACHE_REFRESH_INTERVAL = int(os.environ.get('METRICS_CACHE_REFRESH_INTERVAL') or 5)
+    METRICS_CACHE_MAX_AGE = int(os.environ.get('METRICS_CACHE_MAX_AGE') or 3600)
+    
+    # Attribution reuses its loaded interaction and sales arrays until those tables change
+    ATTRIBUTION_CACHE_MAX_AGE = int(os.environ.get('ATTRIBUTION_CACHE_MAX_AGE') or 300)
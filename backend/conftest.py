@@ -0,0 +1,74 @@
+import pytest
+from flask import g
+from datetime import datetime, timedelta
+from app import create_app
+from config import Config
+from models import db, User, Customer
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    MAIL_SUPPRESS_SEND = True
+    MAIL_DEFAULT_SENDER = 'noreply@example.com'
+    SERVER_NAME = 'localhost'
+    DASHBOARD_STATS_RECONCILE_INTERVAL = 0
+    BCRYPT_LOG_ROUNDS = 4
+    MAIL_OUTBOX_WORKERS = 0
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    
+    # Requests share the fixture's app context, so drop the user Flask-Login
+    # caches on g after each one, as a real request boundary would
+    @app.teardown_request
+    def forget_login_user(exc):
+        g.pop('_login_user', None)
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def admin_client(app, client):
+    """A test client logged in as a verified, approved admin"""
+    admin = User(
+        username='admin',
+        email='admin@example.com',
+        first_name='Admin',
+        last_name='User',
+        is_verified=True,
+        is_approved=True,
+        is_admin=True
+    )
+    admin.set_password('admin123')
+    db.session.add(admin)
+    db.session.commit()
+    
+    response = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 200
+    return client
+
+@pytest.fixture
+def customers(app):
+    """Seed a handful of customers with distinct creation dates"""
+    now = datetime.utcnow()
+    rows = [
+        Customer(
+            first_name=f'First{i}',
+            last_name=f'Last{i}',
+            email=f'user{i}@example.com',
+            device_type=['Mobile', 'Desktop', 'Tablet'][i % 3],
+            created_at=now - timedelta(days=i)
+        )
+        for i in range(1, 26)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
@@ -1,28 +1,230 @@
+import atexit
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
 from flask import current_app, url_for
 from flask_mail import Message
-from threading import Thread
-from models import db
+from models import db, OutboxEmail
+from transactions import after_commit
 
-def send_async_email(app, msg):
-    """Send email asynchronously"""
-    with app.app_context():
+class EmailOutbox:
+    """Persistent email outbox drained by a fixed pool of delivery workers.
+
+    Messages are stored in the email_outbox table, so nothing is lost on
+    restart. Each worker claims a batch of due messages and sends the whole
+    batch over one SMTP connection (``mail.connect()``). Failed messages
+    are retried with exponential backoff until ``MAIL_OUTBOX_MAX_ATTEMPTS``,
+    and ``shutdown()`` drains what is due before the process exits. If the
+    server can't be reached the whole batch backs off. Sent messages are
+    deleted after ``MAIL_OUTBOX_RETENTION_DAYS``.
+    """
+    
+    PRUNE_INTERVAL = 3600  # seconds between sweeps for expired sent messages
+    
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._pruned_at = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('MAIL_OUTBOX_WORKERS', 2)
+        self.batch_size = app.config.get('MAIL_OUTBOX_BATCH_SIZE', 50)
+        self.max_attempts = app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5)
+        self.retry_delay = app.config.get('MAIL_OUTBOX_RETRY_DELAY', 30)
+        self.claim_timeout = app.config.get('MAIL_OUTBOX_CLAIM_TIMEOUT', 300)
+        self.poll_interval = app.config.get('MAIL_OUTBOX_POLL_INTERVAL', 10)
+        self.retention_days = app.config.get('MAIL_OUTBOX_RETENTION_DAYS', 7)
+        app.extensions['email_outbox'] = self
+    
+    def enqueue(self, subject, recipients, body, html=None):
+        """Add a message to the outbox in the current session"""
+        email = OutboxEmail(subject=subject, recipients=json.dumps(list(recipients)), body=body, html=html)
+        db.session.add(email)
+        return email
+    
+    def enqueue_many(self, messages):
+        """Add ``(subject, recipients, body)`` messages to the outbox in the current session, in one statement"""
+        rows = [
+            {'subject': subject, 'recipients': json.dumps(list(recipients)), 'body': body}
+            for subject, recipients, body in messages
+        ]
+        if rows:
+            db.session.execute(OutboxEmail.__table__.insert(), rows)
+    
+    def notify(self):
+        """Wake the delivery workers, starting them on first use"""
+        self.start()
+        self._wakeup.set()
+    
+    def start(self):
+        """Start the delivery workers once; no-op when MAIL_OUTBOX_WORKERS is 0"""
+        if self._threads or not self.workers:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'email-outbox-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.shutdown)
+    
+    def shutdown(self, timeout=30):
+        """Stop the workers after they have sent everything currently due"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping.clear()
+    
+    def _run(self):
+        while True:
+            stopping = self._stopping.is_set()
+            try:
+                with self.app.app_context():
+                    sent = self.deliver_batch()
+            except Exception as e:
+                self.app.logger.warning(f'Email outbox worker failed: {e}')
+                sent = 0
+            if stopping and not sent:
+                return
+            if not sent:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+    
+    def _claim_batch(self):
+        """Atomically claim up to batch_size due messages for this worker"""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        due = db.select(OutboxEmail.id).where(
+            db.or_(
+                db.and_(OutboxEmail.status == 'pending', OutboxEmail.next_attempt_at <= now),
+                # Messages whose worker died mid-send
+                db.and_(OutboxEmail.status == 'sending',
+                        OutboxEmail.claimed_at < now - timedelta(seconds=self.claim_timeout))
+            )
+        ).order_by(OutboxEmail.id).limit(self.batch_size)
+        db.session.execute(
+            db.update(OutboxEmail)
+            .where(OutboxEmail.id.in_(due))
+            .values(status='sending', claim_token=token, claimed_at=now),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return OutboxEmail.query.filter_by(claim_token=token, status='sending').order_by(OutboxEmail.id).all()
+    
+    def _record_failure(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)[:1000]
+        if email.attempts >= self.max_attempts:
+            email.status = 'failed'
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = datetime.utcnow() + timedelta(
+                seconds=self.retry_delay * 2 ** (email.attempts - 1))
+    
+    def prune_sent(self):
+        """Delete messages sent more than ``retention_days`` ago; returns the number deleted"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        result = db.session.execute(
+            db.delete(OutboxEmail).where(OutboxEmail.status == 'sent', OutboxEmail.sent_at < cutoff),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        self._pruned_at = time.monotonic()
+        return result.rowcount
+    
+    def deliver_batch(self):
+        """Claim and send one batch over a single SMTP connection.
+
+        Returns the number of messages handled, or 0 when the server could
+        not be reached so callers wait before trying again.
+        """
         from app import mail
-        mail.send(msg)
+        batch = self._claim_batch()
+        if not batch:
+            if self._pruned_at is None or time.monotonic() - self._pruned_at > self.PRUNE_INTERVAL:
+                self.prune_sent()
+            return 0
+        
+        pending = list(batch)
+        connected = delivered = False
+        try:
+            with mail.connect() as connection:
+                connected = True
+                while pending:
+                    email = pending[0]
+                    message = Message(email.subject, recipients=json.loads(email.recipients))
+                    message.body = email.body
+                    if email.html:
+                        message.html = email.html
+                    connection.send(message)
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.attempts += 1
+                    pending.pop(0)
+                # Record the deliveries before QUIT, which can fail on its own
+                for email in batch:
+                    email.claim_token = None
+                db.session.commit()
+                delivered = True
+        except Exception as e:
+            if delivered:
+                self.app.logger.warning(f'Email outbox connection failed to close cleanly: {e}')
+                return len(batch)
+            if not pending:
+                raise
+            if not connected:
+                # Nothing could be tried, so the whole batch backs off
+                for email in pending:
+                    self._record_failure(email, e)
+                for email in batch:
+                    email.claim_token = None
+                db.session.commit()
+                return 0
+            # The first unsent message takes the failure; the rest go back
+            # to the queue untouched since the connection is now suspect
+            failed, pending = pending[0], pending[1:]
+            self._record_failure(failed, e)
+            for email in pending:
+                email.status = 'pending'
+        
+        for email in batch:
+            email.claim_token = None
+        db.session.commit()
+        return len(batch)
+    
+    def deliver_pending(self):
+        """Send everything currently due on the calling thread"""
+        total = 0
+        while True:
+            handled = self.deliver_batch()
+            if not handled:
+                return total
+            total += handled
 
-def send_email(subject, recipients, body, html=None):
-    """Send email with optional HTML content"""
-    from app import mail
-    msg = Message(subject, recipients=recipients)
-    msg.body = body
-    if html:
-        msg.html = html
-    Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
+def queue_email(subject, recipients, body, html=None):
+    """Add an email to the outbox in the current transaction; the workers wake once it commits"""
+    from app import outbox
+    outbox.enqueue(subject, recipients, body, html)
+    after_commit(outbox.notify)
 
-def send_verification_email(user):
-    """Send email verification link to user"""
-    token = user.generate_email_verification_token()
+def send_email(subject, recipients, body, html=None):
+    """Queue an email for delivery by the outbox workers"""
+    queue_email(subject, recipients, body, html)
     db.session.commit()
-    
+
+def verification_email(user, token):
+    """The ``(subject, recipients, body, html)`` of the verification email for ``user``"""
     verification_url = url_for('verify_email', token=token, _external=True)
     
     subject = "Verify Your Email - PSS III Personal Website"
@@ -57,10 +259,10 @@ def send_verification_email(user):
     </html>
     """
     
-    send_email(subject, [user.email], body, html)
+    return subject, [user.email], body, html
 
-def send_admin_notification(user):
-    """Send notification to admin about new user registration"""
+def admin_notification(user):
+    """The ``(subject, recipients, body)`` of the admin's new-registration email for ``user``"""
     subject = "New User Registration - PSS III Personal Website"
     body = f"""
     A new user has registered:
@@ -74,10 +276,14 @@ def send_admin_notification(user):
     """
     
     admin_email = current_app.config.get('ADMIN_EMAIL', 'admin@example.com')
-    send_email(subject, [admin_email], body)
+    return subject, [admin_email], body
 
 def send_approval_notification(user, approved=True):
     """Send notification to user about account approval/rejection"""
+    send_email(*approval_notification(user, approved))
+
+def approval_notification(user, approved=True):
+    """The ``(subject, recipients, body)`` of the approval/rejection email for ``user``"""
     if approved:
         subject = "Account Approved - PSS III Personal Website"
         body = f"""
@@ -99,4 +305,4 @@ def send_approval_notification(user, approved=True):
         PSS III Team
         """
     
-    send_email(subject, [user.email], body) 
\ No newline at end of file
+    return subject, [user.email], body 
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+SQLite engine tuning and read/write connection routing.
+
+Every connection gets the pragma profile from the config: WAL, so readers
+never wait for a writer's commit, ``synchronous=NORMAL``, a memory map,
+a bigger page cache and a busy timeout.
+
+On a file database, GET and HEAD requests also read through a separate
+pool of ``query_only`` connections, so analytics reads never queue behind
+a login or registration holding the write connection. The session sends
+everything else to the write engine: flushes, INSERT/UPDATE/DELETE, and
+every later statement in the same transaction once one of those has run.
+Requests that are not GETs, and code running outside a request, always
+use the write engine.
+"""
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.elements import TextClause
+from table_versions import WRITE_RE
+
+READ_METHODS = {'GET', 'HEAD'}
+
+def sqlite_pragmas(config):
+    """The pragmas every SQLite connection is opened with, in order"""
+    return [
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'wal')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'normal')),
+        ('mmap_size', config.get('SQLITE_MMAP_SIZE', 268435456)),
+        ('cache_size', config.get('SQLITE_CACHE_SIZE', -65536)),
+        ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    ]
+
+def apply_pragmas(engine, pragmas):
+    """Run ``pragmas`` on every new connection of ``engine``"""
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+def is_memory_database(url):
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    if getattr(clause, 'is_dml', False) or getattr(clause, 'is_ddl', False):
+        return True
+    return isinstance(clause, TextClause) and WRITE_RE.match(clause.text) is not None
+
+class RoutingSession(Session):
+    """A session that reads through the read-only pool during GET requests"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self.info.get('writing') or not has_request_context():
+            return engine
+        
+        router = current_app.extensions.get('engine_router')
+        reader = router.read_engine if router is not None and engine is router.write_engine else None
+        if reader is None or request.method not in READ_METHODS:
+            return engine
+        
+        if self._flushing or _is_write(clause):
+            # Stay on the writer until the transaction ends, so the rest of
+            # it reads what it wrote
+            self.info['writing'] = True
+            return engine
+        return reader
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _stop_writing(session):
+    session.info.pop('writing', None)
+
+class EngineRouter:
+    """Applies the SQLite profile and owns the read-only connection pool"""
+    
+    def __init__(self, app=None):
+        self.write_engine = None
+        self.read_engine = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        if self.read_engine is not None:
+            self.read_engine.dispose()
+        
+        with app.app_context():
+            self.write_engine = app.extensions['sqlalchemy'].engine
+        self.read_engine = None
+        
+        if self.write_engine.dialect.name == 'sqlite':
+            pragmas = sqlite_pragmas(app.config)
+            apply_pragmas(self.write_engine, pragmas)
+            
+            pool_size = app.config.get('SQLITE_READ_POOL_SIZE', 4)
+            if pool_size and not is_memory_database(self.write_engine.url):
+                self.read_engine = create_engine(self.write_engine.url, pool_size=pool_size, max_overflow=pool_size)
+                apply_pragmas(self.read_engine, pragmas + [('query_only', 'ON')])
+        
+        app.extensions['engine_router'] = self
+
@@ -0,0 +1,39 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def stream_export(rows, columns, fmt, batch_size=1000):
+    """Yield an export of ``rows`` as NDJSON or CSV, one batch of lines at a time.
+
+    ``rows`` should be a lazily fetched result (``yield_per``) so only one
+    batch is ever held in memory, however large the export.
+    """
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for i, row in enumerate(rows, 1):
+            writer.writerow([_plain(value) for value in row])
+            if i % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(dict(zip(columns, map(_plain, row)))))
+            if len(lines) == batch_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
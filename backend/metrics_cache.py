@@ -0,0 +1,405 @@
+"""
+Opt-in in-memory columnar cache of the metrics tables.
+
+``financial_metrics`` and ``sales_metrics`` are held as typed NumPy
+columns, together with each row's customer ``device_type``, and filtered
+group-by aggregations over them are answered with vectorized masks and
+bincounts instead of a pass through SQLite. Rows are appended by primary
+key watermark; tables that had rows updated or deleted are reloaded.
+With ``METRICS_CACHE_ENABLED`` off, the same aggregations run in SQL.
+"""
+
+import threading
+import time
+from datetime import date
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, Customer, SalesMetric, FinancialMetric
+
+AGGREGATES = ('sum', 'mean', 'min', 'max', 'count')
+
+# Column kinds and the NumPy types they are held as. Ids are int32, and
+# strings are int16 codes into a per-column list of categories.
+DTYPES = {
+    'id': np.int32,
+    'flag': np.int8,
+    'float': np.float64,
+    'category': np.int16,
+    'date': 'datetime64[D]'
+}
+
+FINANCIAL_COLUMNS = [
+    ('customer_id', 'id'), ('campaign_id', 'id'), ('revenue', 'float'), ('cac', 'float'),
+    ('cltv', 'float'), ('cpc', 'float'), ('cpcv', 'float'), ('acv', 'float')
+]
+SALES_COLUMNS = [
+    ('customer_id', 'id'), ('campaign_id', 'id'), ('conversion_stage', 'category'),
+    ('deal_size', 'float'), ('sale_date', 'date'), ('won', 'flag')
+]
+
+class MetricsTable:
+    """One metrics table held as NumPy columns, in primary key order"""
+    
+    def __init__(self, model, columns):
+        self.model = model
+        self.name = model.__tablename__
+        self.spec = columns
+        self.kinds = dict(columns, device_type='category')
+        self.primary_key = model.__mapper__.primary_key[0]
+        self.date_column = next((name for name, kind in columns if kind == 'date'), None)
+        self.watermark = 0
+        self.rows = 0
+        self.columns = {name: np.empty(0, DTYPES[kind]) for name, kind in self.kinds.items()}
+        self.codes = {name: {} for name, kind in self.kinds.items() if kind == 'category'}
+        self.categories = {name: [] for name in self.codes}
+    
+    def _expression(self, name):
+        """The SQL expression a cached column is loaded from"""
+        if name == 'device_type':
+            return Customer.device_type
+        column = getattr(self.model, name)
+        if self.kinds[name] == 'date':
+            return db.func.date(column)
+        if self.kinds[name] == 'flag':
+            return db.func.coalesce(column, 0)
+        return column
+    
+    def _convert(self, name, values):
+        kind = self.kinds[name]
+        if kind == 'category':
+            codes, categories = self.codes[name], self.categories[name]
+            for value in set(values) - codes.keys():
+                codes[value] = len(categories)
+                categories.append(value)
+            return np.fromiter((codes[value] for value in values), DTYPES[kind], len(values))
+        return np.array(values, dtype=DTYPES[kind])
+    
+    def load(self, batch_size=50000):
+        """Append the rows added since the watermark; returns how many were loaded"""
+        statement = (
+            db.select(self.primary_key, *(self._expression(name) for name in self.kinds))
+            # Outer, so rows whose customer is gone are kept (with no device_type) as sql_aggregate counts them
+            .outerjoin(Customer, Customer.customer_id == self.model.customer_id)
+            .where(self.primary_key > self.watermark)
+            .order_by(self.primary_key)
+        )
+        # Rows are plain tuples, so read them off the DBAPI cursor without building Row objects
+        result = db.session.connection().execute(statement)
+        chunks = {name: [] for name in self.kinds}
+        watermark, loaded = self.watermark, 0
+        while True:
+            rows = result.cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            values = list(zip(*rows))
+            watermark = values[0][-1]
+            for name, column in zip(self.kinds, values[1:]):
+                chunks[name].append(self._convert(name, column))
+            loaded += len(rows)
+        result.close()
+        
+        if loaded:
+            # Swap the columns in whole so concurrent readers see a consistent snapshot
+            self.columns = {name: np.concatenate([self.columns[name], *chunks[name]]) for name in self.kinds}
+            self.watermark = watermark
+            self.rows += loaded
+        return loaded
+    
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+    
+    def validate(self, metric, agg, group_by, filters, since, until):
+        """Raise ``ValueError`` unless this table can answer the aggregation"""
+        if agg not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{agg}'; expected one of: {', '.join(AGGREGATES)}")
+        if metric is None and agg != 'count':
+            raise ValueError(f"A metric is required for '{agg}'")
+        if metric is not None and self.kinds.get(metric) not in ('float', 'flag'):
+            raise ValueError(f"Unknown metric '{metric}' for {self.name}")
+        for name in [group_by, *filters]:
+            if name is not None and (name not in self.kinds or self.kinds[name] == 'float'):
+                raise ValueError(f"Cannot group or filter {self.name} by '{name}'")
+        if (since or until) and not self.date_column:
+            raise ValueError(f"{self.name} has no date to filter by")
+    
+    def _mask(self, columns, filters, since, until):
+        """Return which rows pass the filters, or None when nothing filters"""
+        if not filters and not since and not until:
+            return None
+        mask = np.ones(len(columns['customer_id']), dtype=bool)
+        for name, values in filters.items():
+            if self.kinds[name] == 'category':
+                values = [self.codes[name][v] for v in values if v in self.codes[name]]
+            elif self.kinds[name] == 'date':
+                values = np.array(values, dtype=DTYPES['date'])
+            mask &= np.isin(columns[name], values)
+        if since:
+            mask &= columns[self.date_column] >= np.datetime64(since, 'D')
+        if until:
+            mask &= columns[self.date_column] <= np.datetime64(until, 'D')
+        return mask
+    
+    def _groups(self, name, keys):
+        """Return (labels, inverse) for the group each row falls in"""
+        if self.kinds[name] == 'date':
+            keys = keys.view(np.int64)
+        if len(keys) and keys.min() >= 0 and keys.max() <= max(4 * len(keys), 1 << 16):
+            # Small non-negative keys (ids, codes) group with a bincount instead of a sort
+            present = np.flatnonzero(np.bincount(keys))
+            lookup = np.zeros(present[-1] + 1, dtype=np.intp)
+            lookup[present] = np.arange(len(present))
+            unique, inverse = present, lookup[keys]
+        else:
+            unique, inverse = np.unique(keys, return_inverse=True)
+        
+        kind = self.kinds[name]
+        if kind == 'category':
+            labels = [self.categories[name][code] for code in unique]
+        elif kind == 'date':
+            labels = [None if np.isnat(d) else str(d) for d in unique.astype(DTYPES['date'])]
+        else:
+            labels = unique.tolist()
+        return labels, inverse
+    
+    def aggregate(self, metric, agg, group_by, filters, since, until):
+        columns = self.columns
+        mask = self._mask(columns, filters, since, until)
+        select = (lambda column: column) if mask is None else (lambda column: column[mask])
+        if group_by:
+            labels, inverse = self._groups(group_by, select(columns[group_by]))
+        else:
+            labels, inverse = [None], np.zeros(len(select(columns['customer_id'])), dtype=np.intp)
+        size = len(labels)
+        rows = np.bincount(inverse, minlength=size)
+        
+        if metric is None:
+            values = rows.astype(np.float64)
+        else:
+            data = select(columns[metric]).astype(np.float64, copy=False)
+            valid = ~np.isnan(data)
+            if valid.all():
+                counts = rows
+            else:
+                counts = np.bincount(inverse, weights=valid, minlength=size)
+                inverse, data = inverse[valid], data[valid]
+            if agg == 'count':
+                values = counts.astype(np.float64)
+            elif agg in ('sum', 'mean'):
+                values = np.bincount(inverse, weights=data, minlength=size)
+                if agg == 'mean':
+                    values = values / np.maximum(counts, 1)
+            else:
+                values = np.full(size, np.inf if agg == 'min' else -np.inf)
+                (np.minimum if agg == 'min' else np.maximum).at(values, inverse, data)
+            if agg != 'count':
+                values = np.where(counts > 0, values, np.nan)
+        
+        results = [{
+            group_by or 'group': label,
+            'rows': int(count),
+            metric or 'count': None if np.isnan(value) else float(value)
+        } for label, count, value in zip(labels, rows, values) if count]
+        return _sorted(results, group_by)
+    
+    def sql_aggregate(self, metric, agg, group_by, filters, since, until):
+        """Answer the same aggregation with a GROUP BY query"""
+        function = {'sum': db.func.sum, 'mean': db.func.avg, 'min': db.func.min,
+                    'max': db.func.max, 'count': db.func.count}[agg]
+        group = self._expression(group_by).label(group_by) if group_by else None
+        statement = db.select(
+            *([group] if group is not None else []),
+            db.func.count().label('rows'),
+            function(self._expression(metric)) if metric else db.func.count()
+        ).select_from(self.model)
+        
+        if 'device_type' in [group_by, metric, *filters]:
+            statement = statement.outerjoin(Customer, Customer.customer_id == self.model.customer_id)
+        for name, values in filters.items():
+            statement = statement.where(self._expression(name).in_(values))
+        if since:
+            statement = statement.where(self._expression(self.date_column) >= since.isoformat())
+        if until:
+            statement = statement.where(self._expression(self.date_column) <= until.isoformat())
+        if group is not None:
+            statement = statement.group_by(group)
+        
+        results = [{
+            group_by or 'group': row[0] if group is not None else None,
+            'rows': row[-2],
+            metric or 'count': None if row[-1] is None else float(row[-1])
+        } for row in db.session.execute(statement)]
+        return _sorted([r for r in results if r['rows']], group_by)
+
+def _sorted(results, group_by):
+    """Order groups by label, missing labels first, as SQLite does"""
+    key = group_by or 'group'
+    return sorted(results, key=lambda r: (r[key] is not None, r[key] if r[key] is not None else 0))
+
+class MetricsCache:
+    """Filtered group-by aggregations over the metrics tables.
+
+    When ``METRICS_CACHE_ENABLED`` is set the tables are loaded into memory
+    on first use. Rows added since then are appended at most every
+    ``METRICS_CACHE_REFRESH_INTERVAL`` seconds. A table is reloaded in full
+    when this process updates or deletes its rows, when its highest key
+    drops (it was cleared), and every ``METRICS_CACHE_MAX_AGE`` seconds,
+    which picks up updates made by other processes. Only the first load
+    happens on the request thread: later full reloads are built on a
+    background thread and swapped in, and requests are answered from the
+    previous snapshot meanwhile.
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.refresh_interval = 5
+        self.max_age = 3600
+        self._lock = threading.Lock()
+        self._reloader = None
+        self._generation = 0
+        self._reset()
+        event.listen(Session, 'after_flush', self._collect_changes)
+        event.listen(Session, 'after_commit', self._mark_stale)
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('METRICS_CACHE_ENABLED', False)
+        self.refresh_interval = app.config.get('METRICS_CACHE_REFRESH_INTERVAL', 5)
+        self.max_age = app.config.get('METRICS_CACHE_MAX_AGE', 3600)
+        self.clear()
+        app.extensions['metrics_cache'] = self
+    
+    def _reset(self):
+        self.tables = {table.name: table for table in (
+            MetricsTable(FinancialMetric, FINANCIAL_COLUMNS),
+            MetricsTable(SalesMetric, SALES_COLUMNS)
+        )}
+        self._stale = set()
+        self._refreshed_at = None
+        self._loaded_at = None
+        self._generation += 1  # a reload started before this must not swap its tables in
+    
+    def clear(self):
+        with self._lock:
+            self._reset()
+    
+    def refresh(self, force=False):
+        """Bring the cached tables up to date with the database"""
+        now = time.monotonic()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        
+        with self._lock:
+            if self._loaded_at is None:
+                # Nothing to answer from yet, so the first load happens here
+                for table in self.tables.values():
+                    table.load()
+                self._loaded_at = self._refreshed_at = now
+                self._stale = set()
+                return
+            
+            full = now - self._loaded_at > self.max_age
+            reloading = self._reloader is not None and self._reloader.is_alive()
+            stale, self._stale = self._stale, set()
+            reload = []
+            for name, table in self.tables.items():
+                highest = db.session.query(db.func.max(table.primary_key)).scalar() or 0
+                if full or name in stale or highest < table.watermark:
+                    reload.append(name)
+                elif highest > table.watermark:
+                    table.load()
+            if reload and reloading:
+                self._stale.update(reload)  # picked up once the running reload is done
+            elif reload:
+                self._reloader = threading.Thread(target=self._reload, args=(reload, self._generation),
+                                                  name='metrics-cache-reload', daemon=True)
+                self._reloader.start()
+            if full:
+                self._loaded_at = now
+            self._refreshed_at = now
+    
+    def _reload(self, names, generation):
+        """Rebuild ``names`` off to the side, then swap each one in"""
+        with self.app.app_context():
+            try:
+                for name in names:
+                    old = self.tables[name]
+                    table = MetricsTable(old.model, old.spec)
+                    table.load()
+                    with self._lock:
+                        if generation == self._generation:
+                            self.tables[name] = table
+            except Exception as e:
+                self.app.logger.warning(f'Metrics cache reload failed: {e}')
+                with self._lock:
+                    if generation == self._generation:
+                        self._stale.update(names)
+            finally:
+                db.session.remove()
+    
+    def wait(self, timeout=None):
+        """Block until a background reload in progress has been swapped in"""
+        reloader = self._reloader
+        if reloader is not None:
+            reloader.join(timeout)
+    
+    def aggregate(self, table, metric=None, agg='sum', group_by=None, filters=None, since=None, until=None):
+        """Aggregate ``metric`` over the rows of ``table`` matching ``filters``, per ``group_by`` value.
+
+        ``filters`` maps column names to lists of accepted values and
+        ``since``/``until`` are inclusive dates. Returns one dict per group,
+        ordered by group. Raises ``ValueError`` for anything that cannot be
+        aggregated.
+        """
+        if table not in self.tables:
+            raise ValueError(f"Unknown table '{table}'; expected one of: {', '.join(self.tables)}")
+        filters = filters or {}
+        self.tables[table].validate(metric, agg, group_by, filters, since, until)
+        
+        if not self.enabled:
+            return self.tables[table].sql_aggregate(metric, agg, group_by, filters, since, until)
+        self.refresh()
+        return self.tables[table].aggregate(metric, agg, group_by, filters, since, until)
+    
+    def memory_usage(self):
+        """Bytes held per table, in total and per million rows"""
+        return {name: {
+            'rows': table.rows,
+            'bytes': table.nbytes(),
+            'bytes_per_million_rows': round(table.nbytes() / table.rows * 1e6) if table.rows else None
+        } for name, table in self.tables.items()}
+    
+    def _collect_changes(self, session, flush_context):
+        changed = session.info.setdefault('changed_metrics_tables', set())
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, (FinancialMetric, SalesMetric)):
+                changed.add(obj.__tablename__)
+            elif isinstance(obj, Customer):
+                changed.update(self.tables)  # device_type is cached on every row
+    
+    def _mark_stale(self, session):
+        changed = session.info.pop('changed_metrics_tables', None)
+        if changed:
+            with self._lock:
+                self._stale |= changed
+                self._refreshed_at = None
+
+def parse_filters(table, args):
+    """Read ?<column>=a,b filters for ``table`` from request args"""
+    filters = {}
+    for name, kind in table.kinds.items():
+        if name not in args or kind == 'float':
+            continue
+        values = [v.strip() for v in args[name].split(',') if v.strip()]
+        if kind in ('id', 'flag'):
+            try:
+                values = [int(v) for v in values]
+            except ValueError:
+                raise ValueError(f'{name} must be a comma-separated list of integers')
+        elif kind == 'date':
+            values = [date.fromisoformat(v).isoformat() for v in values]
+        filters[name] = values
+    return filters
@@ -1,10 +1,12 @@
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
+from flask import current_app, has_app_context
 from flask_login import UserMixin
-import bcrypt
+from passwords import hash_password, check_password, hash_rounds
+from engines import RoutingSession
 import secrets
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -23,13 +25,25 @@ class User(UserMixin, db.Model):
     email_verification_token = db.Column(db.String(100), unique=True)
     email_verification_expires = db.Column(db.DateTime)
     
-    def set_password(self, password):
+    # The admin queue filters on these flags and pages by id
+    __table_args__ = (
+        db.Index('ix_user_approved_verified_id', 'is_approved', 'is_verified', 'id'),
+        db.Index('ix_user_verified_id', 'is_verified', 'id'),
+    )
+    
+    def set_password(self, password, rounds=None):
         """Hash and set the password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        if rounds is None:
+            rounds = current_app.config.get('BCRYPT_LOG_ROUNDS', 12) if has_app_context() else 12
+        self.password_hash = hash_password(password, rounds)
     
     def check_password(self, password):
         """Check if the provided password matches the hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return check_password(password, self.password_hash)
+    
+    def password_needs_rehash(self, rounds):
+        """Check if the stored hash was made with a different work factor"""
+        return hash_rounds(self.password_hash) != rounds
     
     def generate_email_verification_token(self):
         """Generate a token for email verification"""
@@ -41,16 +55,45 @@ class User(UserMixin, db.Model):
         """Verify the email verification token"""
         if (self.email_verification_token == token and 
             self.email_verification_expires > datetime.utcnow()):
-            self.is_verified = True
-            self.email_verification_token = None
-            self.email_verification_expires = None
+            self.mark_email_verified()
             return True
         return False
     
+    def mark_email_verified(self):
+        """Mark the email verified and drop any stored token"""
+        self.is_verified = True
+        self.email_verification_token = None
+        self.email_verification_expires = None
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
 
+class OutboxEmail(db.Model):
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list of addresses
+    body = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.status}>'
+
+
 # Customer Data Models
 class Customer(db.Model):
     __tablename__ = 'customers'
@@ -62,6 +105,10 @@ class Customer(db.Model):
     device_type = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_customers_created_at', 'created_at'),
+    )
+    
     # Relationships
     touchpoints = db.relationship('Touchpoint', backref='customer', lazy=True)
     interactions = db.relationship('Interaction', backref='customer', lazy=True)
@@ -104,6 +151,10 @@ class Touchpoint(db.Model):
     interaction_date = db.Column(db.DateTime)
     device_type = db.Column(db.String(50))
     
+    __table_args__ = (
+        db.Index('ix_touchpoints_customer_date', 'customer_id', 'interaction_date'),
+    )
+    
     # Relationships
     interactions = db.relationship('Interaction', backref='touchpoint', lazy=True)
     
@@ -122,6 +173,12 @@ class Interaction(db.Model):
     interaction_value = db.Column(db.Integer)
     interaction_date = db.Column(db.DateTime)
     
+    __table_args__ = (
+        db.Index('ix_interactions_customer_date', 'customer_id', 'interaction_date'),
+        db.Index('ix_interactions_campaign_date', 'campaign_id', 'interaction_date'),
+        db.Index('ix_interactions_touchpoint', 'touchpoint_id'),
+    )
+    
     def __repr__(self):
         return f'<Interaction {self.interaction_type}>'
 
@@ -137,6 +194,11 @@ class SalesMetric(db.Model):
     sale_date = db.Column(db.DateTime)
     won = db.Column(db.Integer)  # 1 for won, 0 for lost
     
+    __table_args__ = (
+        db.Index('ix_sales_metrics_customer_date', 'customer_id', 'sale_date'),
+        db.Index('ix_sales_metrics_campaign_date', 'campaign_id', 'sale_date'),
+    )
+    
     def __repr__(self):
         return f'<SalesMetric {self.conversion_stage}>'
 
@@ -154,5 +216,85 @@ class FinancialMetric(db.Model):
     cpcv = db.Column(db.Float)  # Cost Per Conversion
     acv = db.Column(db.Float)   # Average Contract Value
     
+    # (campaign_id, revenue) covers per-campaign revenue sums
+    __table_args__ = (
+        db.Index('ix_financial_metrics_customer', 'customer_id'),
+        db.Index('ix_financial_metrics_campaign_revenue', 'campaign_id', 'revenue'),
+    )
+    
+    def __repr__(self):
+        return f'<FinancialMetric {self.revenue}>'
+
+
+# Rollup Models
+class DashboardStats(db.Model):
+    __tablename__ = 'dashboard_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)  # single row, id 1
+    total_customers = db.Column(db.Integer, nullable=False, default=0)
+    total_campaigns = db.Column(db.Integer, nullable=False, default=0)
+    total_interactions = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Float, nullable=False, default=0.0)
+    reconciled_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<DashboardStats {self.total_customers} customers>'
+
+
+class CustomerDailyCount(db.Model):
+    __tablename__ = 'customer_daily_counts'
+    
+    day = db.Column(db.Date, primary_key=True)
+    customer_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CustomerDailyCount {self.day} {self.customer_count}>'
+
+
+class CampaignStats(db.Model):
+    __tablename__ = 'campaign_stats'
+    
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.campaign_id'), primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    deals = db.Column(db.Integer, nullable=False, default=0)
+    won_deals = db.Column(db.Integer, nullable=False, default=0)
+    won_deal_size = db.Column(db.Float, nullable=False, default=0.0)  # sum over won deals
+    interactions = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CampaignStats {self.campaign_id}>'
+
+
+class ActivityHourly(db.Model):
+    __tablename__ = 'activity_hourly'
+    
+    # Touchpoint and interaction counts, maintained by the flush hooks in
+    # rollups.py. Unknown types and devices are stored as '' and touchpoints
+    # (which have no campaign) as campaign 0, so every key column can be in
+    # the primary key
+    source = db.Column(db.String(20), primary_key=True)  # 'touchpoints' or 'interactions'
+    hour = db.Column(db.DateTime, primary_key=True)
+    activity_type = db.Column(db.String(100), primary_key=True)
+    device_type = db.Column(db.String(50), primary_key=True)
+    campaign_id = db.Column(db.Integer, primary_key=True)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    value = db.Column(db.Integer, nullable=False, default=0)  # sum of interaction_value
+    
+    def __repr__(self):
+        return f'<ActivityHourly {self.hour} {self.source} {self.events}>'
+
+
+class ActivityDaily(db.Model):
+    __tablename__ = 'activity_daily'
+    
+    # ActivityHourly summed per day
+    source = db.Column(db.String(20), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    activity_type = db.Column(db.String(100), primary_key=True)
+    device_type = db.Column(db.String(50), primary_key=True)
+    campaign_id = db.Column(db.Integer, primary_key=True)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
     def __repr__(self):
-        return f'<FinancialMetric {self.revenue}>' 
\ No newline at end of file
+        return f'<ActivityDaily {self.day} {self.source} {self.events}>'
@@ -0,0 +1,82 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from models import db
+
+# Cached result counts, keyed by (cache key) -> (expires_at, count), least recently used first.
+# Keys carry client-supplied search text, so the cache is bounded.
+COUNT_CACHE_SIZE = 256
+_count_cache = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode an opaque cursor back into its list of sort key values"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or not values:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+def keyset_paginate(query, columns, cursor_values=None, per_page=50, descending=False):
+    """Seek past the cursor on an indexed sort key instead of counting and offsetting.
+
+    ``columns`` is the ordered sort key and must end with a unique column
+    (normally the primary key). Returns ``(items, next_cursor)`` where
+    ``next_cursor`` is ``None`` on the last page. Any ordering already on
+    the query (such as search relevance) is replaced by the sort key.
+    """
+    if per_page < 1:
+        raise ValueError('per_page must be at least 1')
+    if cursor_values is not None:
+        if len(cursor_values) != len(columns):
+            raise InvalidCursor('Invalid cursor')
+        key = db.tuple_(*columns) if len(columns) > 1 else columns[0]
+        bound = tuple(cursor_values) if len(columns) > 1 else cursor_values[0]
+        query = query.filter(key < bound if descending else key > bound)
+    
+    ordering = [c.desc() if descending else c.asc() for c in columns]
+    rows = query.order_by(None).order_by(*ordering).limit(per_page + 1).all()
+    
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return items, next_cursor
+
+def cached_count(query, cache_key, ttl):
+    """Return ``query.count()``, reusing a recent result for ``ttl`` seconds"""
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and cached[0] > now:
+            _count_cache.move_to_end(cache_key)
+            return cached[1]
+    
+    total = query.order_by(None).count()
+    with _count_cache_lock:
+        _count_cache[cache_key] = (now + ttl, total)
+        _count_cache.move_to_end(cache_key)
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return total
+
+def clear_count_cache():
+    """Drop all cached counts"""
+    with _count_cache_lock:
+        _count_cache.clear()
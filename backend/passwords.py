@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+def hash_password(password, rounds=12):
+    """Hash a password with bcrypt at the given work factor"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def check_password(password, password_hash):
+    """Check a password against a bcrypt hash"""
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def hash_rounds(password_hash):
+    """Read the work factor out of a bcrypt hash ($2b$<rounds>$...)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordPoolFull(Exception):
+    """Raised when too many password hashes are already queued"""
+
+class PasswordPool:
+    """A bounded worker pool for bcrypt work.
+
+    At most ``PASSWORD_POOL_WORKERS`` hashes run at once, so login storms
+    cannot take every CPU away from cheap read endpoints, and at most
+    ``PASSWORD_POOL_QUEUE_DEPTH`` more may wait; beyond that, ``run`` fails
+    fast with ``PasswordPoolFull`` instead of queueing without limit.
+    """
+    
+    def __init__(self, app=None):
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        workers = app.config.get('PASSWORD_POOL_WORKERS', 2)
+        queue_depth = app.config.get('PASSWORD_POOL_QUEUE_DEPTH', 32)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-pool')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        app.extensions['password_pool'] = self
+    
+    def run(self, fn, *args):
+        """Run ``fn(*args)`` on the pool and wait for its result"""
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolFull('Too many password checks in progress')
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
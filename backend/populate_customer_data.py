@@ -1,164 +1,175 @@
 #!/usr/bin/env python3
 """
 Script to populate the database with customer data
+
+Rows are generated a chunk of customers at a time and written with Core
+executemany inserts. Primary keys are assigned up front, so nothing has
+to be flushed to learn an id and memory stays flat at any scale.
+
+Usage:
+  python populate_customer_data.py                          # 1,000 customers
+  python populate_customer_data.py --customers 1000000 --seed 7
 """
 
+import argparse
 import random
+import time
 from datetime import datetime, timedelta
+from sqlalchemy import text
 from app import create_app, db
 from models import Customer, Campaign, Touchpoint, Interaction, SalesMetric, FinancialMetric
+from rollups import reconcile_rollups, rebuild_activity_rollups
+from schema import upgrade_database
+
+DEVICE_TYPES = ['Mobile', 'Desktop', 'Tablet']
+UTM_SOURCES = ['Google', 'Meta', 'LinkedIn']
+UTM_MEDIUMS = ['CPC', 'Display', 'Email']
+TOUCHPOINT_TYPES = ['Website Visit', 'Ad Click', 'Email Open', 'Social Media', 'Content Download', 'Webinar', 'Form Submission']
+TOUCHPOINT_DETAILS = ['Page', 'Ad', 'Email', 'Post', 'Whitepaper', 'Webinar', 'Demo Request']
+INTERACTION_TYPES = ['Click', 'Impression', 'Like', 'Share']
+CONVERSION_STAGES = ['Lead', 'Opportunity', 'Negotiation', 'Closed']
+
+TOUCHPOINTS_PER_CUSTOMER = 5
+SALES_PROBABILITY = 0.3  # chance of sales data per customer and campaign
 
-def populate_customer_data():
-    app = create_app()
+def generate_campaigns(rng, now, count):
+    return [{
+        'campaign_id': i,
+        'campaign_name': f"Campaign{i}",
+        'utm_source': rng.choice(UTM_SOURCES),
+        'utm_medium': rng.choice(UTM_MEDIUMS),
+        'utm_campaign': f"Camp{i}",
+        'ad_keyword': f"keyword{rng.randint(1, 50)}",
+        'creative_asset': f"Creative{rng.randint(1, 50)}",
+        'start_date': now - timedelta(days=rng.randint(0, 180)),
+        'ad_spend': 1000 + rng.randint(0, 10000)
+    } for i in range(1, count + 1)]
+
+def generate_chunk(rng, dates, first_id, last_id, campaign_ids, next_ids):
+    """Generate every row belonging to customers first_id..last_id.
+    
+    Rows are tuples in table column order, ready for executemany. ``dates``
+    are pre-formatted timestamps for 0..365 days ago. ``next_ids`` holds the
+    next free primary key per table and is advanced in place, so ids are
+    known without a round-trip to the database.
+    """
+    random = rng.random
+    pick = lambda values: values[int(random() * len(values))]
+    between = lambda low, high: low + int(random() * (high - low + 1))
+    
+    customers, touchpoints, interactions, sales, financials = [], [], [], [], []
+    for customer_id in range(first_id, last_id + 1):
+        customers.append((
+            customer_id, f"First{customer_id}", f"Last{customer_id}",
+            f"user{customer_id}@example.com", pick(DEVICE_TYPES), pick(dates)
+        ))
+        
+        touchpoint_id = next_ids['touchpoint']
+        for touchpoint_id in range(touchpoint_id, touchpoint_id + TOUCHPOINTS_PER_CUSTOMER):
+            interaction_date = pick(dates)
+            touchpoints.append((
+                touchpoint_id, customer_id, pick(TOUCHPOINT_TYPES),
+                f"{pick(TOUCHPOINT_DETAILS)}{between(1, 10)}", interaction_date, pick(DEVICE_TYPES)
+            ))
+            # One interaction per touchpoint, sharing its id
+            interactions.append((
+                touchpoint_id, customer_id, pick(campaign_ids), touchpoint_id,
+                pick(INTERACTION_TYPES), between(0, 100), interaction_date
+            ))
+        next_ids['touchpoint'] = touchpoint_id + 1
+        
+        for campaign_id in campaign_ids:
+            if random() < SALES_PROBABILITY:
+                sale_id = next_ids['sale']
+                next_ids['sale'] += 1
+                sales.append((
+                    sale_id, customer_id, campaign_id, pick(CONVERSION_STAGES),
+                    1000 + between(0, 50000), pick(dates), 1 if random() < 0.3 else 0
+                ))
+                financials.append((
+                    sale_id, customer_id, campaign_id,
+                    5000 + between(0, 100000),        # revenue
+                    100 + between(0, 1000),           # cac
+                    10000 + between(0, 50000),        # cltv
+                    0.5 + (random() * 10) / 2.0,      # cpc
+                    10 + between(0, 100),             # cpcv
+                    5000 + between(0, 20000)          # acv
+                ))
+    
+    return [
+        (Customer, customers),
+        (Touchpoint, touchpoints),
+        (Interaction, interactions),
+        (SalesMetric, sales),
+        (FinancialMetric, financials)
+    ]
+
+def insert_rows(connection, model, rows):
+    """executemany a chunk of column-ordered tuples into the model's table"""
+    statement = str(model.__table__.insert().compile(dialect=connection.dialect))
+    connection.exec_driver_sql(statement, rows)
+
+def populate_customer_data(customer_count=1000, campaign_count=50, seed=42, chunk_size=10000, app=None):
+    app = app or create_app()
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    # Timestamps 0..365 days ago, in SQLAlchemy's SQLite DateTime format
+    dates = [(now - timedelta(days=d)).strftime('%Y-%m-%d %H:%M:%S.%f') for d in range(366)]
     
     with app.app_context():
         print("Starting to populate customer data...")
-        
-        # Clear existing data
-        print("Clearing existing data...")
-        FinancialMetric.query.delete()
-        SalesMetric.query.delete()
-        Interaction.query.delete()
-        Touchpoint.query.delete()
-        Campaign.query.delete()
-        Customer.query.delete()
-        db.session.commit()
-        
-        # Create customers
-        print("Creating customers...")
-        customers = []
-        for i in range(1, 1001):
-            customer = Customer(
-                first_name=f"First{i}",
-                last_name=f"Last{i}",
-                email=f"user{i}@example.com",
-                device_type=random.choice(['Mobile', 'Desktop', 'Tablet']),
-                created_at=datetime.utcnow() - timedelta(days=random.randint(0, 365))
-            )
-            customers.append(customer)
-        
-        db.session.add_all(customers)
-        db.session.commit()
-        print(f"Created {len(customers)} customers")
-        
-        # Create campaigns
-        print("Creating campaigns...")
-        campaigns = []
-        utm_sources = ['Google', 'Meta', 'LinkedIn']
-        utm_mediums = ['CPC', 'Display', 'Email']
-        
-        for i in range(1, 51):
-            campaign = Campaign(
-                campaign_name=f"Campaign{i}",
-                utm_source=random.choice(utm_sources),
-                utm_medium=random.choice(utm_mediums),
-                utm_campaign=f"Camp{i}",
-                ad_keyword=f"keyword{random.randint(1, 50)}",
-                creative_asset=f"Creative{random.randint(1, 50)}",
-                start_date=datetime.utcnow() - timedelta(days=random.randint(0, 180)),
-                ad_spend=1000 + random.randint(0, 10000)
-            )
-            campaigns.append(campaign)
-        
-        db.session.add_all(campaigns)
-        db.session.commit()
-        print(f"Created {len(campaigns)} campaigns")
-        
-        # Create touchpoints
-        print("Creating touchpoints...")
-        touchpoint_types = ['Website Visit', 'Ad Click', 'Email Open', 'Social Media', 'Content Download', 'Webinar', 'Form Submission']
-        touchpoint_details = ['Page', 'Ad', 'Email', 'Post', 'Whitepaper', 'Webinar', 'Demo Request']
-        
-        touchpoints = []
-        for customer in customers:
-            for _ in range(5):  # 5 touchpoints per customer
-                touchpoint_type = random.choice(touchpoint_types)
-                detail_type = random.choice(touchpoint_details)
-                touchpoint = Touchpoint(
-                    customer_id=customer.customer_id,
-                    touchpoint_type=touchpoint_type,
-                    touchpoint_detail=f"{detail_type}{random.randint(1, 10)}",
-                    interaction_date=datetime.utcnow() - timedelta(days=random.randint(0, 365)),
-                    device_type=random.choice(['Mobile', 'Desktop', 'Tablet'])
-                )
-                touchpoints.append(touchpoint)
-        
-        db.session.add_all(touchpoints)
-        db.session.commit()
-        print(f"Created {len(touchpoints)} touchpoints")
-        
-        # Create interactions
-        print("Creating interactions...")
-        interaction_types = ['Click', 'Impression', 'Like', 'Share']
-        interactions = []
-        
-        for touchpoint in touchpoints:
-            campaign = random.choice(campaigns)
-            interaction = Interaction(
-                customer_id=touchpoint.customer_id,
-                campaign_id=campaign.campaign_id,
-                touchpoint_id=touchpoint.touchpoint_id,
-                interaction_type=random.choice(interaction_types),
-                interaction_value=random.randint(0, 100),
-                interaction_date=touchpoint.interaction_date
-            )
-            interactions.append(interaction)
-        
-        db.session.add_all(interactions)
-        db.session.commit()
-        print(f"Created {len(interactions)} interactions")
-        
-        # Create sales metrics
-        print("Creating sales metrics...")
-        conversion_stages = ['Lead', 'Opportunity', 'Negotiation', 'Closed']
-        sales_metrics = []
-        
-        for customer in customers:
-            for campaign in campaigns:
-                if random.random() < 0.3:  # 30% chance of having sales data
-                    sales_metric = SalesMetric(
-                        customer_id=customer.customer_id,
-                        campaign_id=campaign.campaign_id,
-                        conversion_stage=random.choice(conversion_stages),
-                        deal_size=1000 + random.randint(0, 50000),
-                        sale_date=datetime.utcnow() - timedelta(days=random.randint(0, 365)),
-                        won=1 if random.randint(1, 100) <= 30 else 0
-                    )
-                    sales_metrics.append(sales_metric)
-        
-        db.session.add_all(sales_metrics)
-        db.session.commit()
-        print(f"Created {len(sales_metrics)} sales metrics")
-        
-        # Create financial metrics
-        print("Creating financial metrics...")
-        financial_metrics = []
-        
-        for sales_metric in sales_metrics:
-            financial_metric = FinancialMetric(
-                customer_id=sales_metric.customer_id,
-                campaign_id=sales_metric.campaign_id,
-                revenue=5000 + random.randint(0, 100000),
-                cac=100 + random.randint(0, 1000),
-                cltv=10000 + random.randint(0, 50000),
-                cpc=0.5 + (random.random() * 10) / 2.0,
-                cpcv=10 + random.randint(0, 100),
-                acv=5000 + random.randint(0, 20000)
-            )
-            financial_metrics.append(financial_metric)
-        
-        db.session.add_all(financial_metrics)
-        db.session.commit()
-        print(f"Created {len(financial_metrics)} financial metrics")
+        started = time.perf_counter()
+        upgrade_database(db.engine)
+        
+        with db.engine.begin() as connection:
+            if connection.dialect.name == 'sqlite':
+                # Bulk load settings for this connection only
+                connection.execute(text('PRAGMA synchronous = OFF'))
+                connection.execute(text('PRAGMA cache_size = -200000'))
+            
+            # Clear existing data
+            print("Clearing existing data...")
+            for model in [FinancialMetric, SalesMetric, Interaction, Touchpoint, Campaign, Customer]:
+                connection.execute(model.__table__.delete())
+            
+            # Create campaigns
+            print("Creating campaigns...")
+            campaigns = generate_campaigns(rng, now, campaign_count)
+            connection.execute(Campaign.__table__.insert(), campaigns)
+            campaign_ids = [c['campaign_id'] for c in campaigns]
+            print(f"Created {len(campaigns)} campaigns")
+            
+            # Create customers and everything that hangs off them, chunk by chunk
+            print("Creating customers, touchpoints, interactions, sales and financial metrics...")
+            totals = {model: 0 for model in [Customer, Touchpoint, Interaction, SalesMetric, FinancialMetric]}
+            next_ids = {'touchpoint': 1, 'sale': 1}
+            for first_id in range(1, customer_count + 1, chunk_size):
+                last_id = min(first_id + chunk_size - 1, customer_count)
+                for model, rows in generate_chunk(rng, dates, first_id, last_id, campaign_ids, next_ids):
+                    if rows:
+                        insert_rows(connection, model, rows)
+                    totals[model] += len(rows)
+                print(f"  {last_id:,} / {customer_count:,} customers ({time.perf_counter() - started:.0f}s)")
+        
+        # Core inserts bypass the ORM hooks that maintain the rollups
+        reconcile_rollups()
+        rebuild_activity_rollups()
         
         print("Customer data population completed successfully!")
-        print(f"Summary:")
-        print(f"- Customers: {len(customers)}")
-        print(f"- Campaigns: {len(campaigns)}")
-        print(f"- Touchpoints: {len(touchpoints)}")
-        print(f"- Interactions: {len(interactions)}")
-        print(f"- Sales Metrics: {len(sales_metrics)}")
-        print(f"- Financial Metrics: {len(financial_metrics)}")
+        print(f"Summary ({time.perf_counter() - started:.1f}s):")
+        print(f"- Customers: {totals[Customer]:,}")
+        print(f"- Campaigns: {len(campaigns):,}")
+        print(f"- Touchpoints: {totals[Touchpoint]:,}")
+        print(f"- Interactions: {totals[Interaction]:,}")
+        print(f"- Sales Metrics: {totals[SalesMetric]:,}")
+        print(f"- Financial Metrics: {totals[FinancialMetric]:,}")
 
 if __name__ == '__main__':
-    populate_customer_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Populate the database with customer data')
+    parser.add_argument('--customers', type=int, default=1000, help='number of customers to generate')
+    parser.add_argument('--campaigns', type=int, default=50, help='number of campaigns to generate')
+    parser.add_argument('--seed', type=int, default=42, help='random seed, for reproducible data')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='customers generated and inserted per batch')
+    args = parser.parse_args()
+    
+    populate_customer_data(args.customers, args.campaigns, args.seed, args.chunk_size)
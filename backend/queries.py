@@ -0,0 +1,117 @@
+import heapq
+from collections import defaultdict
+from itertools import islice
+from models import db, Campaign, CampaignStats, Touchpoint, Interaction, SalesMetric
+from serializers import TOUCHPOINT, INTERACTION, SALES_METRIC
+
+# Event sources merged by customer_timeline: name -> (model, timestamp, id, serializer).
+# Each is read through its (customer_id, timestamp) index, whose tail is the id.
+TIMELINE_SOURCES = {
+    'interaction': (Interaction, Interaction.interaction_date, Interaction.interaction_id, INTERACTION),
+    'sale': (SalesMetric, SalesMetric.sale_date, SalesMetric.sale_id, SALES_METRIC),
+    'touchpoint': (Touchpoint, Touchpoint.interaction_date, Touchpoint.touchpoint_id, TOUCHPOINT),
+}
+
+def rows_per_customer(model, customer_ids, limit=10):
+    """Fetch up to ``limit`` rows of ``model`` for each customer in one query.
+
+    A ``ROW_NUMBER()`` window partitioned by customer keeps the per-customer
+    limit that a single ``IN (...)`` query would otherwise lose. Rows come
+    back grouped by customer id, in primary key order.
+    """
+    primary_key = model.__mapper__.primary_key[0]
+    row_number = db.func.row_number().over(
+        partition_by=model.customer_id, order_by=primary_key
+    ).label('row_number')
+    ranked = db.select(model, row_number).where(model.customer_id.in_(customer_ids)).subquery()
+    ranked_model = db.aliased(model, ranked)
+    
+    rows = db.session.execute(
+        db.select(ranked_model)
+        .where(ranked.c.row_number <= limit)
+        .order_by(ranked.c.customer_id, ranked.c.row_number)
+    ).scalars()
+    
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.customer_id].append(row)
+    return grouped
+
+def campaign_performance(sort='revenue', descending=True, limit=None):
+    """Rank campaigns by performance in one grouped pass over the campaign rollup.
+    
+    ROAS is revenue over ad spend, win rate is won deals over all deals and
+    the average deal size is taken over won deals. Ratios with a zero
+    denominator are NULL and sort last. ``limit``, when given, must be a
+    positive int.
+    """
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        raise ValueError('limit must be a positive integer')
+    revenue = db.func.coalesce(CampaignStats.revenue, 0.0)
+    deals = db.func.coalesce(CampaignStats.deals, 0)
+    won_deals = db.func.coalesce(CampaignStats.won_deals, 0)
+    metrics = {
+        'revenue': revenue,
+        'ad_spend': Campaign.ad_spend,
+        'roas': revenue / db.func.nullif(Campaign.ad_spend, 0),
+        'win_rate': won_deals * 1.0 / db.func.nullif(deals, 0),
+        'avg_deal_size': CampaignStats.won_deal_size / db.func.nullif(won_deals, 0),
+        'deals': deals,
+        'won_deals': won_deals,
+        'interactions': db.func.coalesce(CampaignStats.interactions, 0),
+    }
+    if sort not in metrics:
+        raise ValueError(f'sort must be one of: {", ".join(metrics)}')
+    
+    order = metrics[sort].desc() if descending else metrics[sort].asc()
+    query = (
+        db.select(Campaign.campaign_id, Campaign.campaign_name,
+                  *[expression.label(name) for name, expression in metrics.items()])
+        .outerjoin(CampaignStats, CampaignStats.campaign_id == Campaign.campaign_id)
+        .order_by(order.nulls_last(), Campaign.campaign_id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return [row._asdict() for row in db.session.execute(query)]
+
+def _timeline_source(source, customer_id, cursor, limit, descending):
+    """Up to ``limit`` events of one source past ``cursor``, in timeline order"""
+    model, timestamp, key, serializer = TIMELINE_SOURCES[source]
+    query = db.select(timestamp, key, *serializer.columns).where(model.customer_id == customer_id,
+                                                                  timestamp.isnot(None))
+    if cursor is not None:
+        after = (lambda column, value: column < value) if descending else (lambda column, value: column > value)
+        cursor_timestamp, cursor_source, cursor_id = cursor
+        if source == cursor_source:
+            query = query.where(after(db.tuple_(timestamp, key), (cursor_timestamp, cursor_id)))
+        elif (source < cursor_source) == descending:
+            # At the cursor's timestamp this source sorts after the cursor
+            query = query.where(db.or_(after(timestamp, cursor_timestamp), timestamp == cursor_timestamp))
+        else:
+            query = query.where(after(timestamp, cursor_timestamp))
+    
+    ordering = [timestamp.desc(), key.desc()] if descending else [timestamp.asc(), key.asc()]
+    rows = db.session.execute(query.order_by(*ordering).limit(limit)).all()
+    return [(row[0], source, row[1], data) for row, data in zip(rows, serializer.rows(row[2:] for row in rows))]
+
+def customer_timeline(customer_id, cursor=None, per_page=50, descending=True):
+    """One page of a customer's touchpoints, interactions and sales as a single stream.
+
+    Events are ordered by ``(timestamp, source, id)``, newest first unless
+    ``descending`` is false; events without a timestamp are left out. Each
+    source is read in index order, ``per_page + 1`` rows at most, and the
+    sources are heap-merged, so a page costs the same however deep it is.
+    ``cursor`` is the ``(timestamp, source, id)`` of the last event on the
+    previous page. Returns ``(events, next_cursor)``, where
+    ``next_cursor`` is None on the last page.
+    """
+    streams = [_timeline_source(source, customer_id, cursor, per_page + 1, descending)
+               for source in TIMELINE_SOURCES]
+    merged = list(islice(heapq.merge(*streams, key=lambda event: event[:3], reverse=descending), per_page + 1))
+    
+    events = [
+        {'timestamp': timestamp, 'source': source, 'id': event_id, 'data': data}
+        for timestamp, source, event_id, data in merged[:per_page]
+    ]
+    next_cursor = merged[per_page - 1][:3] if len(merged) > per_page else None
+    return events, next_cursor
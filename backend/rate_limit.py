@@ -0,0 +1,206 @@
+"""
+Token bucket rate limiting for the authentication endpoints.
+
+Each limit is a bucket of ``N`` tokens that refills at ``N`` per period;
+a request spends one token and is refused with a 429 when none is left.
+So ``5/minute`` allows a burst of 5 and then one more every 12 seconds.
+Buckets are kept per client IP and, where the request names one, per
+username, so neither spreading guesses over many accounts nor over many
+addresses gets around the limit.
+
+The check runs before the view, so a refused request never reaches
+bcrypt or the mail queue. Buckets live in a storage backend chosen by
+``RATE_LIMIT_STORAGE_URL``:
+
+* ``memory://`` keeps them in this process (the default);
+* ``sqlite:///path/to/file.db`` keeps them in a local SQLite file, so every
+  worker process on the host shares the same buckets.
+
+Any object with ``take(key, capacity, period, now)`` and ``clear()`` can be
+passed to ``RateLimiter.init_app`` as the storage instead.
+
+Behind a reverse proxy, wrap the app in werkzeug's ``ProxyFix`` so
+``request.remote_addr`` is the client and not the proxy.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import jsonify, request
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Forget buckets that have been full for a while every this many takes
+PRUNE_EVERY = 1000
+
+def parse_rate(rate):
+    """Parse ``'5/minute'`` into ``(5, 60)``; an empty rate means no limit (``None``)"""
+    if not rate:
+        return None
+    try:
+        count, period = rate.split('/')
+        count, seconds = int(count), PERIODS[period.strip().rstrip('s')]
+    except (ValueError, KeyError):
+        raise ValueError(f'Invalid rate limit {rate!r}; expected e.g. 5/minute')
+    if count < 1:
+        raise ValueError(f'Invalid rate limit {rate!r}; the count must be at least 1')
+    return count, seconds
+
+def refill(tokens, updated, capacity, period, now):
+    """The bucket's tokens at ``now``, after refilling since ``updated``"""
+    return min(capacity, tokens + (now - updated) * capacity / period)
+
+def spend(tokens, capacity, period):
+    """Spend one token; return ``(allowed, tokens left, seconds until the next token)``"""
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) * period / capacity
+
+class MemoryStorage:
+    """Buckets in a dict, for a single process"""
+    
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+    
+    def take(self, key, capacity, period, now):
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            allowed, tokens, retry_after = spend(refill(tokens, updated, capacity, period, now), capacity, period)
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) * period / capacity)
+            
+            self._takes += 1
+            if self._takes % PRUNE_EVERY == 0:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+        return allowed, retry_after
+    
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+
+class SQLiteStorage:
+    """Buckets in a SQLite file shared by every process on the host.
+
+    Each take is one ``BEGIN IMMEDIATE`` transaction, so concurrent workers
+    never both spend the last token. The file holds nothing worth keeping
+    across a crash, so it skips fsync entirely.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)'
+        )
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = OFF')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+    
+    def take(self, key, capacity, period, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row is not None else (capacity, now)
+            allowed, tokens, retry_after = spend(refill(tokens, updated, capacity, period, now), capacity, period)
+            connection.execute(
+                'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                (key, tokens, now, now + (capacity - tokens) * period / capacity)
+            )
+            
+            self._takes += 1
+            if self._takes % PRUNE_EVERY == 0:
+                connection.execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+    
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_limit_buckets')
+
+def storage_from_url(url):
+    """Build the storage backend named by ``RATE_LIMIT_STORAGE_URL``"""
+    if url in (None, '', 'memory://'):
+        return MemoryStorage()
+    if url.startswith('sqlite:///'):
+        return SQLiteStorage(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported rate limit storage {url!r}; use memory:// or sqlite:///path')
+
+class RateLimiter:
+    """Per-IP and per-username token buckets in front of selected views"""
+    
+    def __init__(self, app=None, storage=None):
+        self.enabled = True
+        self.storage = None
+        self.config = {}
+        self._limits = {}
+        if app is not None:
+            self.init_app(app, storage)
+    
+    def init_app(self, app, storage=None):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.storage = storage or storage_from_url(app.config.get('RATE_LIMIT_STORAGE_URL'))
+        self.config = app.config
+        self._limits = {}
+        app.extensions['rate_limiter'] = self
+    
+    def limits(self, scope):
+        """The ``(kind, (capacity, period))`` limits configured for ``scope``"""
+        if scope not in self._limits:
+            prefix = f'RATE_LIMIT_{scope.upper()}_PER_'
+            self._limits[scope] = [(kind, parse_rate(self.config.get(prefix + kind.upper())))
+                                   for kind in ('ip', 'username')]
+        return self._limits[scope]
+    
+    def check(self, scope, ip, username=None, now=None):
+        """Spend a token from each of the scope's buckets; return seconds to wait, or None if allowed"""
+        if not self.enabled:
+            return None
+        now = time.time() if now is None else now
+        identities = {'ip': ip, 'username': username.strip().lower() if isinstance(username, str) else None}
+        for kind, rate in self.limits(scope):
+            if rate is None or not identities[kind]:
+                continue
+            allowed, retry_after = self.storage.take(f'{scope}:{kind}:{identities[kind]}', *rate, now)
+            if not allowed:
+                return retry_after
+        return None
+    
+    def limit(self, scope):
+        """Decorate a view so requests over the ``scope`` limits get a 429 before it runs.
+
+        Limits come from ``RATE_LIMIT_<SCOPE>_PER_IP`` and, for requests
+        whose JSON body has a ``username``, ``RATE_LIMIT_<SCOPE>_PER_USERNAME``.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                data = request.get_json(silent=True)
+                username = data.get('username') if isinstance(data, dict) else None
+                retry_after = self.check(scope, request.remote_addr, username)
+                if retry_after is not None:
+                    seconds = max(1, math.ceil(retry_after))
+                    response = jsonify({'error': f'Too many attempts. Please try again in {seconds} seconds.'})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(seconds)
+                    return response
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,221 @@
+"""
+Per-request SQL and latency instrumentation.
+
+Every statement SQLAlchemy runs during a request is timed and counted
+against that request. When the request finishes its totals go out in a
+``Server-Timing`` header (``db`` and ``app`` durations, which browser dev
+tools show next to the request) and into per-endpoint histograms of
+latency, database time and query count, which admins can read at
+``/api/admin/metrics``.
+
+The same statement text running ``REQUEST_METRICS_REPEAT_THRESHOLD`` or
+more times in one request is the signature of an N+1 query, usually a
+lazy relationship loaded in a loop. It is logged as a warning and counted
+against the endpoint.
+
+Work a streamed response does after its view returns is not included.
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+STATEMENT_PREVIEW_LENGTH = 500
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+class Histogram:
+    """Counts of observations at or under each bucket bound, plus an overflow bucket"""
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q):
+        """The upper bound of the bucket holding the ``q`` quantile (the max for the overflow bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+    
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'max': round(self.max, 3),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': [{'le': bound, 'count': count}
+                        for bound, count in zip(list(self.bounds) + [None], self.counts)]
+        }
+
+class RequestStats:
+    """What one request did in the database"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = (0.0, None)
+        self.statements = Counter()
+    
+    def record(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        self.statements[statement] += 1
+        if elapsed > self.slowest[0]:
+            self.slowest = (elapsed, statement)
+    
+    def repeated(self, threshold):
+        """Statements run at least ``threshold`` times, most repeated first"""
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold]
+
+class EndpointMetrics:
+    """Histograms and worst cases for one endpoint"""
+    
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.db_time = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.errors = 0
+        self.slowest = None
+        self.n_plus_one = 0
+        self.last_n_plus_one = None
+    
+    def to_dict(self):
+        return {
+            'requests': self.latency.count,
+            'errors': self.errors,
+            'latency_ms': self.latency.to_dict(),
+            'db_time_ms': self.db_time.to_dict(),
+            'queries': self.queries.to_dict(),
+            'slowest_statement': self.slowest,
+            'n_plus_one_requests': self.n_plus_one,
+            'last_n_plus_one': self.last_n_plus_one
+        }
+
+def _preview(statement):
+    return _WHITESPACE_RE.sub(' ', statement).strip()[:STATEMENT_PREVIEW_LENGTH]
+
+class RequestMetrics:
+    """Times every request and the SQL it runs, and aggregates them per endpoint"""
+    
+    def __init__(self, app=None):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self.enabled = True
+        self.repeat_threshold = 5
+        self.started_at = datetime.utcnow()
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        # A statement that raises never reaches after_cursor_execute
+        event.listen(Engine, 'handle_error', self._execute_failed)
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.enabled = app.config.get('REQUEST_METRICS_ENABLED', True)
+        self.repeat_threshold = app.config.get('REQUEST_METRICS_REPEAT_THRESHOLD', 5)
+        self.clear()
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.extensions['request_metrics'] = self
+    
+    def clear(self):
+        with self._lock:
+            self._endpoints = {}
+            self.started_at = datetime.utcnow()
+    
+    def snapshot(self):
+        """Every endpoint's metrics, for the admin endpoint"""
+        with self._lock:
+            endpoints = {name: metrics.to_dict() for name, metrics in sorted(self._endpoints.items())}
+        return {'since': self.started_at, 'endpoints': endpoints}
+    
+    def _start_request(self):
+        if self.enabled:
+            # g can outlive a request (tests share an app context), so always start afresh
+            g.request_stats = RequestStats()
+    
+    def _finish_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        
+        total = (time.perf_counter() - stats.started) * 1000
+        db_time = stats.db_time * 1000
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_time:.1f};desc="{stats.queries} queries", app;dur={total - db_time:.1f}'
+        )
+        
+        rule = request.url_rule.rule if request.url_rule is not None else '(unmatched)'
+        endpoint = f'{request.method} {rule}'
+        repeated = stats.repeated(self.repeat_threshold)
+        for statement, count in repeated:
+            current_app.logger.warning('Possible N+1 query in %s: ran %d times: %s',
+                                       endpoint, count, _preview(statement))
+        
+        with self._lock:
+            metrics = self._endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self._endpoints[endpoint] = EndpointMetrics()
+            metrics.latency.observe(total)
+            metrics.db_time.observe(db_time)
+            metrics.queries.observe(stats.queries)
+            if response.status_code >= 500:
+                metrics.errors += 1
+            elapsed, statement = stats.slowest
+            if statement is not None and (metrics.slowest is None or elapsed * 1000 > metrics.slowest['ms']):
+                metrics.slowest = {'sql': _preview(statement), 'ms': round(elapsed * 1000, 3)}
+            if repeated:
+                metrics.n_plus_one += 1
+                statement, count = repeated[0]
+                metrics.last_n_plus_one = {'sql': _preview(statement), 'count': count}
+        return response
+    
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'request_stats' in g:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+    
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._finish(conn, statement)
+    
+    def _execute_failed(self, exception_context):
+        if exception_context.connection is not None and exception_context.statement is not None:
+            self._finish(exception_context.connection, exception_context.statement)
+    
+    def _finish(self, conn, statement):
+        started = conn.info.get('query_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if has_request_context():
+            stats = g.get('request_stats')
+            if stats is not None:
+                stats.record(statement, elapsed)
@@ -0,0 +1,540 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from models import (db, Customer, Campaign, Touchpoint, Interaction, SalesMetric, FinancialMetric,
+                    DashboardStats, CustomerDailyCount, CampaignStats, ActivityHourly, ActivityDaily)
+
+STATS_ROW_ID = 1
+CAMPAIGN_COUNTERS = ('revenue', 'deals', 'won_deals', 'won_deal_size', 'interactions')
+# Everything read_dashboard_stats() depends on: the rollup and the tables it sums
+DASHBOARD_STATS_TABLES = ('dashboard_stats', 'customer_daily_counts', 'customers', 'campaigns',
+                          'interactions', 'financial_metrics')
+
+# What /api/analytics/timeseries can chart: (source, counter column)
+TIMESERIES_METRICS = {
+    'touchpoints': ('touchpoints', 'events'),
+    'interactions': ('interactions', 'events'),
+    'interaction_value': ('interactions', 'value'),
+}
+TIMESERIES_BUCKETS = ('hour', 'day', 'week', 'month')
+# Query argument -> rollup column
+TIMESERIES_DIMENSIONS = {'type': 'activity_type', 'device_type': 'device_type', 'campaign_id': 'campaign_id'}
+TIMESERIES_TABLES = ('activity_hourly', 'activity_daily', 'touchpoints', 'interactions')
+ACTIVITY_KEYS = ['source', 'hour', 'activity_type', 'device_type', 'campaign_id']
+
+# Dialects whose insert() supports on_conflict_do_update; elsewhere the
+# counters are left to the reconcile jobs
+UPSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}
+
+_job_lock = threading.Lock()
+
+def _stats_deltas(session):
+    """Work out how a flush changes the dashboard totals"""
+    totals = defaultdict(float)
+    daily = defaultdict(int)
+    
+    for obj, sign in [(o, 1) for o in session.new] + [(o, -1) for o in session.deleted]:
+        if isinstance(obj, Customer):
+            totals['total_customers'] += sign
+            daily[(obj.created_at or datetime.utcnow()).date()] += sign
+        elif isinstance(obj, Campaign):
+            totals['total_campaigns'] += sign
+        elif isinstance(obj, Interaction):
+            totals['total_interactions'] += sign
+        elif isinstance(obj, FinancialMetric):
+            totals['total_revenue'] += sign * (obj.revenue or 0)
+    
+    for obj in session.dirty:
+        if isinstance(obj, FinancialMetric):
+            history = inspect(obj).attrs.revenue.history
+            totals['total_revenue'] += sum(v or 0 for v in history.added) - sum(v or 0 for v in history.deleted)
+        elif isinstance(obj, Customer):
+            history = inspect(obj).attrs.created_at.history
+            for value in history.added:
+                if value:
+                    daily[value.date()] += 1
+            for value in history.deleted:
+                if value:
+                    daily[value.date()] -= 1
+    
+    return {k: v for k, v in totals.items() if v}, {k: v for k, v in daily.items() if v}
+
+def _old_and_new(obj, attribute):
+    """Return an attribute's value before and after this flush"""
+    history = inspect(obj).attrs[attribute].history
+    new = history.added[0] if history.added else (history.unchanged[0] if history.unchanged else None)
+    old = history.deleted[0] if history.deleted else new
+    return old, new
+
+def _sale_counters(won, deal_size):
+    return {'deals': 1, 'won_deals': 1 if won else 0, 'won_deal_size': (deal_size or 0) if won else 0}
+
+def _campaign_deltas(session):
+    """Work out how a flush changes the per-campaign counters.
+
+    Moving a row to a different campaign is not tracked here; the periodic
+    reconcile corrects it.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(CAMPAIGN_COUNTERS, 0))
+    
+    for obj, sign in [(o, 1) for o in session.new] + [(o, -1) for o in session.deleted]:
+        if isinstance(obj, Interaction):
+            deltas[obj.campaign_id]['interactions'] += sign
+        elif isinstance(obj, SalesMetric):
+            for name, value in _sale_counters(obj.won, obj.deal_size).items():
+                deltas[obj.campaign_id][name] += sign * value
+        elif isinstance(obj, FinancialMetric):
+            deltas[obj.campaign_id]['revenue'] += sign * (obj.revenue or 0)
+    
+    for obj in session.dirty:
+        if isinstance(obj, SalesMetric):
+            old_won, new_won = _old_and_new(obj, 'won')
+            old_size, new_size = _old_and_new(obj, 'deal_size')
+            old, new = _sale_counters(old_won, old_size), _sale_counters(new_won, new_size)
+            for name in old:
+                deltas[obj.campaign_id][name] += new[name] - old[name]
+        elif isinstance(obj, FinancialMetric):
+            old, new = _old_and_new(obj, 'revenue')
+            deltas[obj.campaign_id]['revenue'] += (new or 0) - (old or 0)
+    
+    return [
+        dict(campaign_id=campaign_id, **counters)
+        for campaign_id, counters in deltas.items()
+        if campaign_id is not None and any(counters.values())
+    ]
+
+def _add_to_counters(connection, table, keys, rows):
+    """Add each row's values onto the counter row with the same keys, creating it if needed"""
+    insert = UPSERTS.get(connection.dialect.name)
+    if insert is None:
+        return
+    statement = insert(table)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c[key] for key in keys],
+            set_={name: table.c[name] + statement.excluded[name] for name in rows[0] if name not in keys}
+        ),
+        rows
+    )
+
+@event.listens_for(Session, 'after_flush')
+def _apply_stats_deltas(session, flush_context):
+    """Fold inserted, updated and deleted rows into the rollups in the same transaction"""
+    totals, daily = _stats_deltas(session)
+    campaigns = _campaign_deltas(session)
+    if not totals and not daily and not campaigns:
+        return
+    
+    connection = session.connection()
+    if totals:
+        stats = DashboardStats.__table__
+        connection.execute(
+            stats.update()
+            .where(stats.c.id == STATS_ROW_ID)
+            .values({name: stats.c[name] + delta for name, delta in totals.items()})
+        )
+    if daily:
+        _add_to_counters(connection, CustomerDailyCount.__table__, ['day'],
+                         [{'day': day, 'customer_count': delta} for day, delta in daily.items()])
+    if campaigns:
+        _add_to_counters(connection, CampaignStats.__table__, ['campaign_id'], campaigns)
+
+def _touchpoint_key(values):
+    if values['interaction_date'] is None:
+        return None
+    return ('touchpoints', values['interaction_date'].replace(minute=0, second=0, microsecond=0),
+            values['touchpoint_type'] or '', values['device_type'] or '', 0)
+
+def _interaction_key(values, devices):
+    if values['interaction_date'] is None:
+        return None
+    return ('interactions', values['interaction_date'].replace(minute=0, second=0, microsecond=0),
+            values['interaction_type'] or '', devices.get(values['touchpoint_id']) or '', values['campaign_id'] or 0)
+
+def _before_and_after(obj, names):
+    """An object's values for ``names`` before and after this flush"""
+    before, after = {}, {}
+    for name in names:
+        before[name], after[name] = _old_and_new(obj, name)
+    return before, after
+
+def _interaction_devices(session, interactions):
+    """The device type of each interaction's touchpoint, looked up in one query at most"""
+    ids = {values['touchpoint_id'] for values in interactions}
+    devices, missing = {}, []
+    for touchpoint_id in ids:
+        touchpoint = session.identity_map.get(identity_key(Touchpoint, touchpoint_id))
+        if touchpoint is not None:
+            devices[touchpoint_id] = touchpoint.device_type
+        elif touchpoint_id is not None:
+            missing.append(touchpoint_id)
+    if missing:
+        devices.update(session.connection().execute(
+            db.select(Touchpoint.touchpoint_id, Touchpoint.device_type).where(Touchpoint.touchpoint_id.in_(missing))
+        ).all())
+    return devices
+
+def _activity_deltas(session):
+    """Work out how a flush changes the hourly activity counters.
+
+    An interaction is counted under its touchpoint's device type, so
+    changing a touchpoint's device type moves the counts of the
+    interactions it already has, read in one query per flush.
+    """
+    touchpoint_fields = ('interaction_date', 'touchpoint_type', 'device_type')
+    interaction_fields = ('interaction_date', 'interaction_type', 'touchpoint_id', 'campaign_id', 'interaction_value')
+    touchpoints, interactions = [], []  # (values, sign)
+    old_devices = {}  # touchpoint id -> device type before this flush, for those it changes
+    
+    for obj, sign in [(o, 1) for o in session.new] + [(o, -1) for o in session.deleted]:
+        if isinstance(obj, Touchpoint):
+            touchpoints.append(({name: getattr(obj, name) for name in touchpoint_fields}, sign))
+        elif isinstance(obj, Interaction):
+            interactions.append(({name: getattr(obj, name) for name in interaction_fields}, sign))
+    for obj in session.dirty:
+        if isinstance(obj, Touchpoint):
+            before, after = _before_and_after(obj, touchpoint_fields)
+            if before != after:
+                touchpoints += [(before, -1), (after, 1)]
+            if before['device_type'] != after['device_type']:
+                old_devices[obj.touchpoint_id] = before['device_type']
+        elif isinstance(obj, Interaction):
+            before, after = _before_and_after(obj, interaction_fields)
+            if before != after:
+                interactions += [(before, -1), (after, 1)]
+    if not touchpoints and not interactions:
+        return []
+    
+    deltas = defaultdict(lambda: [0, 0])
+    for values, sign in touchpoints:
+        key = _touchpoint_key(values)
+        if key is not None:
+            deltas[key][0] += sign
+    
+    if old_devices:
+        # Interactions this flush didn't touch were counted under the old device
+        flushed = [obj.interaction_id for obj in session.new | session.dirty | session.deleted
+                   if isinstance(obj, Interaction)]
+        unchanged = session.connection().execute(
+            db.select(*[getattr(Interaction, name) for name in interaction_fields])
+            .where(Interaction.touchpoint_id.in_(old_devices), Interaction.interaction_id.notin_(flushed))
+        ).all()
+        interactions += [(row._asdict(), -1) for row in unchanged] + [(row._asdict(), 1) for row in unchanged]
+    
+    devices = _interaction_devices(session, [values for values, _ in interactions]) if interactions else {}
+    # Whatever is being taken away was counted under the touchpoint's device before this flush
+    devices_before = {**devices, **old_devices}
+    for values, sign in interactions:
+        key = _interaction_key(values, devices_before if sign < 0 else devices)
+        if key is not None:
+            deltas[key][0] += sign
+            deltas[key][1] += sign * (values['interaction_value'] or 0)
+    
+    return [
+        dict(zip(ACTIVITY_KEYS, key), events=events, value=value)
+        for key, (events, value) in deltas.items()
+        if events or value
+    ]
+
+@event.listens_for(Session, 'after_flush')
+def _apply_activity_deltas(session, flush_context):
+    """Fold touchpoint and interaction changes into the hourly and daily activity rollups"""
+    hourly = _activity_deltas(session)
+    if not hourly:
+        return
+    
+    daily = defaultdict(lambda: [0, 0])
+    for row in hourly:
+        key = (row['source'], row['hour'].date(), row['activity_type'], row['device_type'], row['campaign_id'])
+        daily[key][0] += row['events']
+        daily[key][1] += row['value']
+    
+    connection = session.connection()
+    _add_to_counters(connection, ActivityHourly.__table__, ACTIVITY_KEYS, hourly)
+    _add_to_counters(connection, ActivityDaily.__table__, ['source', 'day'] + ACTIVITY_KEYS[2:], [
+        dict(source=key[0], day=key[1], activity_type=key[2], device_type=key[3], campaign_id=key[4],
+             events=events, value=value)
+        for key, (events, value) in daily.items()
+    ])
+
+def reconcile_dashboard_stats():
+    """Recompute the rollup from the base tables.
+
+    Corrects any drift from writes that bypass the ORM (bulk Core inserts,
+    ``Query.delete()``) and seeds the rollup on databases that predate it.
+    """
+    totals = {
+        'total_customers': Customer.query.count(),
+        'total_campaigns': Campaign.query.count(),
+        'total_interactions': Interaction.query.count(),
+        'total_revenue': float(db.session.query(db.func.sum(FinancialMetric.revenue)).scalar() or 0),
+        'reconciled_at': datetime.utcnow()
+    }
+    days = db.session.query(
+        db.func.date(Customer.created_at), db.func.count()
+    ).filter(Customer.created_at.isnot(None)).group_by(db.func.date(Customer.created_at)).all()
+    
+    stats = db.session.get(DashboardStats, STATS_ROW_ID)
+    if stats is None:
+        stats = DashboardStats(id=STATS_ROW_ID)
+        db.session.add(stats)
+    for name, value in totals.items():
+        setattr(stats, name, value)
+    
+    db.session.execute(CustomerDailyCount.__table__.delete())
+    if days:
+        db.session.execute(CustomerDailyCount.__table__.insert(), [
+            # SQLite's date() returns text; other backends return a date
+            {'day': day if isinstance(day, date) else datetime.strptime(day, '%Y-%m-%d').date(),
+             'customer_count': count}
+            for day, count in days
+        ])
+    db.session.commit()
+    return stats
+
+def reconcile_campaign_stats():
+    """Recompute the per-campaign counters in one grouped pass over pre-aggregated subqueries"""
+    sales = db.select(
+        SalesMetric.campaign_id,
+        db.func.count().label('deals'),
+        db.func.sum(db.case((SalesMetric.won == 1, 1), else_=0)).label('won_deals'),
+        db.func.sum(db.case((SalesMetric.won == 1, SalesMetric.deal_size), else_=0)).label('won_deal_size')
+    ).group_by(SalesMetric.campaign_id).subquery()
+    revenue = db.select(
+        FinancialMetric.campaign_id,
+        db.func.sum(FinancialMetric.revenue).label('revenue')
+    ).group_by(FinancialMetric.campaign_id).subquery()
+    interactions = db.select(
+        Interaction.campaign_id,
+        db.func.count().label('interactions')
+    ).group_by(Interaction.campaign_id).subquery()
+    
+    rows = (
+        db.select(
+            Campaign.campaign_id,
+            db.func.coalesce(revenue.c.revenue, 0),
+            db.func.coalesce(sales.c.deals, 0),
+            db.func.coalesce(sales.c.won_deals, 0),
+            db.func.coalesce(sales.c.won_deal_size, 0),
+            db.func.coalesce(interactions.c.interactions, 0)
+        )
+        .outerjoin(sales, sales.c.campaign_id == Campaign.campaign_id)
+        .outerjoin(revenue, revenue.c.campaign_id == Campaign.campaign_id)
+        .outerjoin(interactions, interactions.c.campaign_id == Campaign.campaign_id)
+    )
+    
+    table = CampaignStats.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(['campaign_id', *CAMPAIGN_COUNTERS], rows))
+    db.session.commit()
+
+def rebuild_activity_rollups():
+    """Recompute the hourly activity counters from the base tables, then the daily ones from those.
+
+    Corrects drift from writes that bypass the ORM, such as the Core
+    inserts in populate_customer_data.
+    """
+    # The same text SQLAlchemy stores for a datetime, so ORM upserts hit these rows
+    hour = lambda column: db.func.strftime('%Y-%m-%d %H:00:00.000000', column)
+    touchpoint_keys = [
+        hour(Touchpoint.interaction_date),
+        db.func.coalesce(Touchpoint.touchpoint_type, ''),
+        db.func.coalesce(Touchpoint.device_type, '')
+    ]
+    touchpoints = (
+        db.select(db.literal('touchpoints'), *touchpoint_keys, db.literal(0), db.func.count(), db.literal(0))
+        .where(Touchpoint.interaction_date.isnot(None))
+        .group_by(*touchpoint_keys)
+    )
+    interaction_keys = [
+        hour(Interaction.interaction_date),
+        db.func.coalesce(Interaction.interaction_type, ''),
+        db.func.coalesce(Touchpoint.device_type, ''),
+        db.func.coalesce(Interaction.campaign_id, 0)
+    ]
+    interactions = (
+        db.select(db.literal('interactions'), *interaction_keys, db.func.count(),
+                  db.func.coalesce(db.func.sum(Interaction.interaction_value), 0))
+        .outerjoin(Touchpoint, Touchpoint.touchpoint_id == Interaction.touchpoint_id)
+        .where(Interaction.interaction_date.isnot(None))
+        .group_by(*interaction_keys)
+    )
+    
+    hourly, daily = ActivityHourly.__table__, ActivityDaily.__table__
+    columns = ACTIVITY_KEYS + ['events', 'value']
+    db.session.execute(hourly.delete())
+    db.session.execute(daily.delete())
+    db.session.execute(hourly.insert().from_select(columns, db.union_all(touchpoints, interactions)))
+    daily_keys = [hourly.c.source, db.func.date(hourly.c.hour), hourly.c.activity_type, hourly.c.device_type,
+                  hourly.c.campaign_id]
+    db.session.execute(daily.insert().from_select(
+        ['source', 'day'] + columns[2:],
+        db.select(*daily_keys, db.func.sum(hourly.c.events), db.func.sum(hourly.c.value)).group_by(*daily_keys)
+    ))
+    db.session.commit()
+
+def reconcile_rollups():
+    """Recompute the dashboard and campaign rollups from the base tables.
+
+    The activity rollups are left out: rebuilding them groups every
+    touchpoint and interaction, which is too slow to repeat on a timer.
+    Call ``rebuild_activity_rollups`` after bulk loads instead.
+    """
+    reconcile_dashboard_stats()
+    reconcile_campaign_stats()
+
+def ensure_rollups_seeded():
+    """Build the rollups on first use; returns the dashboard stats row"""
+    stats = db.session.get(DashboardStats, STATS_ROW_ID)
+    if stats is None:
+        reconcile_rollups()
+        stats = db.session.get(DashboardStats, STATS_ROW_ID)
+    return stats
+
+def ensure_campaign_stats_seeded():
+    """Build the campaign rollup on databases that had campaigns before it, even if the dashboard rollup is seeded"""
+    # min() of a primary key reads one end of its b-tree
+    if db.session.query(db.func.min(CampaignStats.campaign_id)).scalar() is not None:
+        return
+    if db.session.query(db.func.min(Campaign.campaign_id)).scalar() is not None:
+        reconcile_campaign_stats()
+
+def _recent_customers_query(window_days):
+    since = (datetime.utcnow() - timedelta(days=window_days)).date()
+    return db.select(db.func.sum(CustomerDailyCount.customer_count)).where(CustomerDailyCount.day >= since)
+
+def _dashboard_stats(stats, recent_customers):
+    return {
+        'total_customers': stats.total_customers,
+        'total_campaigns': stats.total_campaigns,
+        'total_revenue': float(stats.total_revenue),
+        'total_interactions': stats.total_interactions,
+        'recent_customers': int(recent_customers or 0)
+    }
+
+def read_dashboard_stats(window_days=30):
+    """Read the dashboard totals from the rollup without scanning base tables.
+
+    ``recent_customers`` counts whole days, so it includes customers created
+    earlier on the day the window starts.
+    """
+    stats = ensure_rollups_seeded()
+    recent_customers = db.session.execute(_recent_customers_query(window_days)).scalar()
+    return _dashboard_stats(stats, recent_customers)
+
+async def read_dashboard_stats_async(async_db, window_days=30):
+    """``read_dashboard_stats`` with its queries run concurrently on ``async_db``.
+
+    Returns None while the rollup is unseeded; seeding writes, so that is
+    left to the sync path.
+    """
+    stats_rows, recent_rows = await async_db.gather(
+        db.select(DashboardStats.__table__).where(DashboardStats.id == STATS_ROW_ID),
+        _recent_customers_query(window_days)
+    )
+    if not stats_rows:
+        return None
+    return _dashboard_stats(stats_rows[0], recent_rows[0][0])
+
+def ensure_activity_seeded():
+    """Build the activity rollups on databases that had touchpoints or interactions before them"""
+    sources = {source for source, _ in TIMESERIES_METRICS.values()}
+    if db.session.query(ActivityDaily.source).filter(ActivityDaily.source.in_(sources)).limit(1).first() is not None:
+        return
+    if (db.session.query(Touchpoint.touchpoint_id).limit(1).first() is not None
+            or db.session.query(Interaction.interaction_id).limit(1).first() is not None):
+        rebuild_activity_rollups()
+
+def _period_label(bucket, value):
+    if bucket == 'hour':
+        return value.strftime('%Y-%m-%dT%H:00')
+    if bucket == 'week':
+        return (value - timedelta(days=value.weekday())).isoformat()  # the Monday
+    if bucket == 'month':
+        return value.strftime('%Y-%m')
+    return value.isoformat()
+
+def _bucket_count(bucket, since, until):
+    days = (until - since).days + 1
+    return {'hour': days * 24, 'day': days, 'week': days // 7 + 1, 'month': days // 28 + 1}[bucket]
+
+def read_activity_timeseries(metric, bucket, since, until, filters=None, group_by=None, max_buckets=None):
+    """Chart ``metric`` per ``bucket`` for the days ``since``..``until`` from the activity rollups.
+
+    Hourly buckets read the hourly table and everything else the daily
+    one, so the cost depends on the date range and the number of distinct
+    types, devices and campaigns, not on the size of the base tables.
+    ``filters`` maps dimensions (``type``, ``device_type``, ``campaign_id``)
+    to values. Periods without activity are left out.
+    """
+    if metric not in TIMESERIES_METRICS:
+        raise ValueError(f"Unknown metric '{metric}'; expected one of {', '.join(TIMESERIES_METRICS)}")
+    if bucket not in TIMESERIES_BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'; expected one of {', '.join(TIMESERIES_BUCKETS)}")
+    if group_by is not None and group_by not in TIMESERIES_DIMENSIONS:
+        raise ValueError(f"Cannot group by '{group_by}'; expected one of {', '.join(TIMESERIES_DIMENSIONS)}")
+    if since > until:
+        raise ValueError('from must not be after to')
+    if max_buckets and _bucket_count(bucket, since, until) > max_buckets:
+        raise ValueError(f'Too many {bucket} buckets between {since} and {until}; the limit is {max_buckets}')
+    
+    source, counter = TIMESERIES_METRICS[metric]
+    ensure_activity_seeded()
+    
+    if bucket == 'hour':
+        table, period = ActivityHourly, ActivityHourly.hour
+        start = datetime.combine(since, datetime.min.time())
+        end = datetime.combine(until + timedelta(days=1), datetime.min.time())
+    else:
+        table, period = ActivityDaily, ActivityDaily.day
+        start, end = since, until + timedelta(days=1)
+    column = lambda dimension: getattr(table, TIMESERIES_DIMENSIONS[dimension])
+    keys = [period] + ([column(group_by)] if group_by else [])
+    query = (
+        db.select(*keys, db.func.sum(getattr(table, counter)))
+        .where(table.source == source, period >= start, period < end)
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    for name, value in (filters or {}).items():
+        query = query.where(column(name) == value)
+    
+    totals = defaultdict(int)
+    for row in db.session.execute(query):
+        label = _period_label(bucket, row[0])
+        totals[(label, row[1]) if group_by else label] += row[-1]
+    
+    if group_by:
+        return [{'period': label, 'group': group, 'value': value}
+                for (label, group), value in sorted(totals.items())]
+    return [{'period': label, 'value': value} for label, value in sorted(totals.items())]
+
+def ensure_reconcile_job(app):
+    """Start the periodic reconcile job for ``app`` once, if it is enabled"""
+    interval = app.config.get('DASHBOARD_STATS_RECONCILE_INTERVAL', 0)
+    if not interval or 'rollup_reconcile' in app.extensions:
+        return
+    
+    with _job_lock:
+        if 'rollup_reconcile' in app.extensions:
+            return
+        
+        def run():
+            while True:
+                time.sleep(interval)
+                with app.app_context():
+                    try:
+                        reconcile_rollups()
+                    except Exception as e:
+                        db.session.rollback()
+                        app.logger.warning(f'Rollup reconcile failed: {e}')
+        
+        thread = threading.Thread(target=run, name='rollup-reconcile', daemon=True)
+        thread.start()
+        app.extensions['rollup_reconcile'] = thread
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Bring an existing database up to the current schema.
+
+db.create_all() only creates missing tables, so databases created before an
+index was declared never get it. Run this script (or call upgrade_database)
+after pulling model changes; it is idempotent.
+
+Usage:
+  python schema.py
+"""
+
+from sqlalchemy import inspect, text
+from models import db
+from search import ensure_search_index
+
+def create_missing_indexes(engine):
+    """Create every declared index that the database does not have yet"""
+    created = []
+    with engine.begin() as connection:
+        existing = {
+            table: {index['name'] for index in inspect(connection).get_indexes(table)}
+            for table in inspect(connection).get_table_names()
+        }
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing.get(table.name, set()):
+                    index.create(bind=connection)
+                    created.append(index.name)
+    return created
+
+def upgrade_database(engine):
+    """Create missing tables, indexes and the search index, then refresh planner statistics"""
+    db.metadata.create_all(bind=engine)
+    created = create_missing_indexes(engine)
+    ensure_search_index(engine)
+    if created and engine.dialect.name == 'sqlite':
+        with engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+    return created
+
+if __name__ == '__main__':
+    from app import create_app
+    
+    app = create_app()
+    with app.app_context():
+        created = upgrade_database(db.engine)
+        if created:
+            print(f"Created {len(created)} indexes:")
+            for name in created:
+                print(f"  {name}")
+        else:
+            print("Database schema is up to date")
@@ -0,0 +1,120 @@
+import re
+from sqlalchemy import event, text
+from models import db, Customer
+
+# SQLite FTS5 index over the searchable customer columns. It is an external
+# content table, so it stores only the index and reads rows from customers.
+# The triggers keep it in sync with every write, including Core bulk inserts.
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+        first_name, last_name, email,
+        content='customers', content_rowid='customer_id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts(rowid, first_name, last_name, email)
+        VALUES (new.customer_id, new.first_name, new.last_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.customer_id, old.first_name, old.last_name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE ON customers BEGIN
+        INSERT INTO customers_fts(customers_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.customer_id, old.first_name, old.last_name, old.email);
+        INSERT INTO customers_fts(rowid, first_name, last_name, email)
+        VALUES (new.customer_id, new.first_name, new.last_name, new.email);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Engines known to have the search index, so the check runs once per process
+_indexed_engines = set()
+
+@event.listens_for(Customer.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    """Create the search index alongside a freshly created customers table"""
+    if connection.dialect.name == 'sqlite':
+        for statement in SEARCH_INDEX_DDL:
+            connection.execute(text(statement))
+
+@event.listens_for(Customer.__table__, 'after_drop')
+def _drop_search_index(target, connection, **kw):
+    """Drop the search index with the customers table"""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS customers_fts'))
+
+def ensure_search_index(engine):
+    """Create and backfill the search index on an existing database.
+
+    Safe to call on every startup; returns True if the index is usable.
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+    
+    with engine.begin() as connection:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customers_fts'"
+        )).first()
+        if not exists:
+            for statement in SEARCH_INDEX_DDL:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO customers_fts(customers_fts) VALUES ('rebuild')"))
+    
+    _indexed_engines.add(engine)
+    return True
+
+def search_index_available(engine):
+    """Check (once per engine) whether the search index exists"""
+    if engine in _indexed_engines:
+        return True
+    if engine.dialect.name != 'sqlite':
+        return False
+    
+    with engine.connect() as connection:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customers_fts'"
+        )).first()
+    if exists:
+        _indexed_engines.add(engine)
+    return bool(exists)
+
+def build_match_query(term):
+    """Turn free text into an FTS5 query where every token is a prefix match"""
+    tokens = _TOKEN_RE.findall(term)
+    return ' AND '.join(f'"{token}"*' for token in tokens)
+
+def filter_customers(query, term):
+    """Filter a Customer query by a search term, best matches first.
+
+    Uses the FTS5 index when it is available and falls back to substring
+    matching otherwise (other databases, or a term without any word tokens).
+    """
+    match = build_match_query(term)
+    if not match or not search_index_available(db.engine):
+        return query.filter(
+            db.or_(
+                Customer.first_name.ilike(f'%{term}%'),
+                Customer.last_name.ilike(f'%{term}%'),
+                Customer.email.ilike(f'%{term}%')
+            )
+        )
+    
+    fts = db.table('customers_fts', db.column('rowid'), db.column('rank'))
+    matches = (
+        db.select(fts.c.rowid.label('customer_id'), fts.c.rank.label('rank'))
+        .where(text('customers_fts MATCH :match').bindparams(match=match))
+        .subquery()
+    )
+    return (
+        query.join(matches, matches.c.customer_id == Customer.customer_id)
+        .order_by(matches.c.rank, Customer.customer_id)
+    )
@@ -0,0 +1,148 @@
+"""
+Declarative JSON serializers for the models, plus a faster JSON provider
+and response compression.
+
+A ``Serializer`` names the fields a model exposes and is compiled once
+into functions that build the dict straight from an ORM object, or from a
+row of just those columns, which list endpoints select to skip building
+ORM objects at all. Dates and datetimes are left as they are; the JSON
+provider writes them as ISO 8601, with orjson when it is installed and the
+stdlib json module otherwise.
+"""
+
+import gzip
+import json
+from datetime import date, datetime
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from models import Customer, Campaign, Touchpoint, Interaction, SalesMetric, FinancialMetric, User
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BROTLI_QUALITY = 4  # about as fast as gzip level 6, and smaller
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain'}
+
+class Serializer:
+    """The JSON fields of one model.
+
+    ``fields`` are attribute names, or ``(name, converter)`` pairs for
+    values that need converting, such as ``('won', bool)``. Serialize ORM
+    objects with ``many`` and rows selected with ``columns``, in order,
+    with ``rows``.
+    """
+    
+    def __init__(self, model, *fields):
+        self.model = model
+        self.fields = [field if isinstance(field, tuple) else (field, None) for field in fields]
+        self.names = [name for name, _ in self.fields]
+        self.columns = [getattr(model, name) for name in self.names]
+        self._from_object, self._from_row = self._compile()
+    
+    def _compile(self):
+        """Generate functions returning a dict literal of the fields, read off an object or unpacked from a row"""
+        namespace = {}
+        values = []
+        for i, (name, converter) in enumerate(self.fields):
+            if converter is None:
+                values.append((name, '{}'))
+            else:
+                namespace[f'convert_{i}'] = converter
+                values.append((name, f'convert_{i}({{}})'))
+        from_object = ', '.join(f'{name!r}: ' + value.format(f'obj.{name}') for name, value in values)
+        from_row = ', '.join(f'{name!r}: ' + value.format(f'v{i}') for i, (name, value) in enumerate(values))
+        unpack = ''.join(f'v{i}, ' for i in range(len(values)))
+        source = (
+            f"def from_object(obj):\n    return {{{from_object}}}\n"
+            f"def from_row(row):\n    {unpack}= row\n    return {{{from_row}}}\n"
+        )
+        exec(compile(source, f'<{self.model.__name__} serializer>', 'exec'), namespace)
+        return namespace['from_object'], namespace['from_row']
+    
+    def only(self, *names):
+        """A serializer for a subset of these fields"""
+        return Serializer(self.model, *[field for field in self.fields if field[0] in names])
+    
+    def __call__(self, obj):
+        return self._from_object(obj)
+    
+    def many(self, objs):
+        from_object = self._from_object
+        return [from_object(obj) for obj in objs]
+    
+    def rows(self, rows):
+        """Serialize rows of ``self.columns``, which skips building ORM objects at all"""
+        from_row = self._from_row
+        return [from_row(row) for row in rows]
+
+CUSTOMER = Serializer(Customer, 'customer_id', 'first_name', 'last_name', 'email', 'device_type', 'created_at')
+CAMPAIGN = Serializer(Campaign, 'campaign_id', 'campaign_name', 'utm_source', 'utm_medium', 'utm_campaign',
+                      'ad_keyword', 'creative_asset', 'start_date', 'ad_spend')
+TOUCHPOINT = Serializer(Touchpoint, 'touchpoint_id', 'touchpoint_type', 'touchpoint_detail',
+                        'interaction_date', 'device_type')
+INTERACTION = Serializer(Interaction, 'interaction_id', 'interaction_type', 'interaction_value', 'interaction_date',
+                         'campaign_id', 'touchpoint_id')
+SALES_METRIC = Serializer(SalesMetric, 'sale_id', 'conversion_stage', 'deal_size', 'sale_date', ('won', bool))
+FINANCIAL_METRIC = Serializer(FinancialMetric, 'financial_id', 'revenue', 'cac', 'cltv', 'cpc', 'cpcv', 'acv')
+USER = Serializer(User, 'id', 'username', 'email', 'first_name', 'last_name', 'is_verified', 'is_approved',
+                  'is_admin', 'created_at', 'last_login')
+CURRENT_USER = USER.only('id', 'username', 'email', 'first_name', 'last_name', 'is_admin', 'is_verified', 'is_approved')
+LOGIN_USER = USER.only('id', 'username', 'email', 'first_name', 'last_name', 'is_admin')
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, on orjson when it is installed.
+
+    Unlike Flask's default, dates are written as ISO 8601 and keys are
+    left in the order the view built them.
+    """
+    
+    sort_keys = False
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        return json.dumps(obj, **kwargs)
+    
+    def response(self, *args, **kwargs):
+        if orjson is None or self._app.debug:
+            return super().response(*args, **kwargs)
+        # Serialize straight to bytes; orjson's output is already UTF-8
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def compress_response(response, min_size=1024, level=6):
+    """Brotli or gzip encode a response the client accepts, if it is big enough to be worth it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        encoding, compress = 'br', lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+    elif accepted['gzip']:
+        encoding, compress = 'gzip', lambda data: gzip.compress(data, compresslevel=level)
+    else:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) >= min_size:
+        response.set_data(compress(data))
+        response.headers['Content-Encoding'] = encoding
+    return response
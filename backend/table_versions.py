@@ -0,0 +1,106 @@
+"""
+Per-table version counters and conditional GET support.
+
+Every INSERT, UPDATE or DELETE that goes through SQLAlchemy is noted
+against its connection, and the tables it wrote get their version bumped
+when that connection commits (a rollback discards the notes). A response
+built from some tables carries an ETag made of their versions, so a
+client that sends it back in ``If-None-Match`` gets a 304 before the view
+runs a single query.
+
+Versions live in this process, and the ETag includes a random epoch so
+no other process can ever match it. A process only sees commits made
+through it, though, so with several workers a 304 can miss another
+worker's writes.
+
+``If-Modified-Since`` is not honoured: a whole-second timestamp can't tell
+two commits in the same second apart, and it can't cover the ``extra``
+inputs either, so only a matching ETag earns a 304.
+"""
+
+import hashlib
+import re
+import threading
+import uuid
+from functools import wraps
+from flask import make_response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# The table a write statement targets, for compiled and hand-written SQL alike
+WRITE_RE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`\[]?(\w+)',
+    re.IGNORECASE
+)
+
+class TableVersions:
+    """Version counters for every table written through SQLAlchemy"""
+    
+    def __init__(self, app=None):
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:8]
+        event.listen(Engine, 'after_cursor_execute', self._note_write)
+        event.listen(Engine, 'commit', self._bump_written)
+        event.listen(Engine, 'rollback', self._forget_written)
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        app.extensions['table_versions'] = self
+    
+    def version(self, table):
+        return self._versions.get(table, 0)
+    
+    def etag(self, tables, *extra):
+        """An ETag for a response built from ``tables`` (and any ``extra`` inputs)"""
+        parts = [self.epoch] + [f'{table}={self.version(table)}' for table in sorted(tables)]
+        parts += [str(value) for value in extra]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20]
+    
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+    
+    def conditional(self, *tables, extra=None):
+        """Decorate a GET view whose response depends only on ``tables``.
+
+        ``extra`` is an optional callable returning anything else the
+        response depends on (such as today's date). Requests whose
+        ``If-None-Match`` is still current get an empty 304 without the
+        view being called.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Taken before the view runs, so a write that lands mid-request
+                # leaves the client with an older tag that revalidates next time
+                etag = self.etag(tables, *(extra() if extra else ()))
+                
+                if request.if_none_match.contains_weak(etag):
+                    response = make_response('', 304)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                
+                # Weak, so the tag still matches once the body is compressed
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            return wrapper
+        return decorator
+    
+    def _note_write(self, conn, cursor, statement, parameters, context, executemany):
+        match = WRITE_RE.match(statement)
+        if match:
+            conn.info.setdefault('written_tables', set()).add(match.group(1).lower())
+    
+    def _bump_written(self, conn):
+        written = conn.info.pop('written_tables', None)
+        if written:
+            self.bump(*written)
+    
+    def _forget_written(self, conn):
+        conn.info.pop('written_tables', None)
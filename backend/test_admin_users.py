@@ -0,0 +1,105 @@
+"""
+Tests for the paged admin user queue and bulk approve/reject
+"""
+
+import json
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, User, OutboxEmail
+
+@pytest.fixture
+def applicants(admin_client):
+    """Twelve users: ids 2-5 unverified, 6-9 verified and waiting, 10-13 approved"""
+    users = []
+    for i in range(12):
+        user = User(username=f'user{i}', email=f'user{i}@example.com', first_name=f'User{i}', last_name='Test',
+                    password_hash='x', is_verified=i >= 4, is_approved=i >= 8)
+        users.append(user)
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+def test_pages_with_a_cursor(admin_client, applicants):
+    ids, cursor = [], None
+    while True:
+        url = '/api/admin/users?per_page=5' + (f'&cursor={cursor}' if cursor else '')
+        page = admin_client.get(url).get_json()
+        ids += [user['id'] for user in page['users']]
+        cursor = page['next_cursor']
+        assert page['has_more'] == (cursor is not None)
+        if cursor is None:
+            break
+    
+    assert ids == list(range(1, 14))
+
+def test_filters_the_queue(admin_client, applicants):
+    def user_ids(query):
+        return [user['id'] for user in admin_client.get(f'/api/admin/users?{query}').get_json()['users']]
+    
+    assert user_ids('is_verified=true&is_approved=false') == [6, 7, 8, 9]
+    assert user_ids('is_verified=false') == [2, 3, 4, 5]
+    assert user_ids('is_approved=1&per_page=3') == [1, 10, 11]
+
+@pytest.mark.parametrize('query', ['is_verified=maybe', 'cursor=not-a-cursor', 'cursor=WyJ4Il0'])
+def test_rejects_bad_arguments(admin_client, query):
+    response = admin_client.get(f'/api/admin/users?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_bulk_approve_is_one_transaction(admin_client, applicants):
+    commits = []
+    record = lambda session: commits.append(session)
+    event.listen(Session, 'after_commit', record)
+    try:
+        response = admin_client.post('/api/admin/users/bulk', json={'action': 'approve', 'ids': [6, 7, 7, 8, 999]})
+    finally:
+        event.remove(Session, 'after_commit', record)
+    
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == [6, 7, 8]
+    assert response.get_json()['missing'] == [999]
+    assert len(commits) == 1
+    assert {user.id for user in User.query.filter(User.id.in_([6, 7, 8, 9]), User.is_approved)} == {6, 7, 8}
+    
+    emails = OutboxEmail.query.all()
+    assert sorted(json.loads(email.recipients)[0] for email in emails) == [
+        'user4@example.com', 'user5@example.com', 'user6@example.com'
+    ]
+    assert all(email.subject.startswith('Account Approved') for email in emails)
+
+def test_bulk_reject(admin_client, applicants):
+    response = admin_client.post('/api/admin/users/bulk', json={'action': 'reject', 'ids': [10, 11]})
+    
+    assert response.status_code == 200
+    assert not any(user.is_approved for user in User.query.filter(User.id.in_([10, 11])))
+    assert OutboxEmail.query.count() == 2
+
+def test_bulk_with_only_unknown_ids(admin_client, applicants):
+    response = admin_client.post('/api/admin/users/bulk', json={'action': 'approve', 'ids': [998, 999]})
+    
+    assert response.get_json()['missing'] == [998, 999]
+    assert OutboxEmail.query.count() == 0
+
+@pytest.mark.parametrize('body', [
+    {'action': 'delete', 'ids': [2]},
+    {'action': 'approve', 'ids': []},
+    {'action': 'approve', 'ids': '2,3'},
+    {'action': 'approve', 'ids': [2, 'x']},
+    {'action': 'approve', 'ids': list(range(2000))},
+])
+def test_bulk_validates_its_input(admin_client, applicants, body):
+    response = admin_client.post('/api/admin/users/bulk', json=body)
+    assert response.status_code == 400
+    assert OutboxEmail.query.count() == 0
+
+def test_admin_only(app, client):
+    user = User(username='plain', email='plain@example.com', first_name='Plain', last_name='User',
+                is_verified=True, is_approved=True)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    client.post('/api/login', json={'username': 'plain', 'password': 'password123'})
+    
+    assert client.get('/api/admin/users').status_code == 403
+    assert client.post('/api/admin/users/bulk', json={'action': 'approve', 'ids': [1]}).status_code == 403
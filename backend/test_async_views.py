@@ -0,0 +1,99 @@
+"""
+Tests for the async customer detail and dashboard stats path
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from app import create_app, async_db, engine_router
+from conftest import TestConfig
+from models import db, User, Customer, Campaign, Touchpoint, SalesMetric, FinancialMetric, DashboardStats
+
+@pytest.fixture
+def async_client(tmp_path):
+    class AsyncConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'async.db'}"
+        ASYNC_VIEWS_ENABLED = True
+    
+    app = create_app(AsyncConfig)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', first_name='Admin', last_name='User',
+                     is_verified=True, is_approved=True, is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        now = datetime.utcnow()
+        db.session.add_all([Customer(first_name=f'First{i}', last_name='Last', email=f'user{i}@example.com',
+                                     created_at=now - timedelta(days=i * 20)) for i in range(3)])
+        db.session.add(Campaign(campaign_name='Spring'))
+        db.session.flush()
+        db.session.add_all([Touchpoint(customer_id=1, touchpoint_type=f'Type{i}') for i in range(12)])
+        db.session.add_all([SalesMetric(customer_id=1, campaign_id=1, deal_size=100.0 * i, won=i % 2) for i in range(3)])
+        db.session.add(FinancialMetric(customer_id=1, campaign_id=1, revenue=250.0))
+        db.session.commit()
+        
+        client = app.test_client()
+        assert client.post('/api/login', json={'username': 'admin', 'password': 'admin123'}).status_code == 200
+        db.session.remove()
+        yield client
+        db.session.remove()
+    async_db.engine.sync_engine.dispose()
+    engine_router.read_engine.dispose()
+    engine_router.write_engine.dispose()
+
+def record_statements(engine):
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+def sync_response(client, url):
+    """The response to ``url`` with the async path switched off"""
+    async_db.enabled = False
+    try:
+        return client.get(url)
+    finally:
+        async_db.enabled = True
+
+def test_customer_detail_matches_the_sync_path(async_client):
+    statements = record_statements(async_db.engine.sync_engine)
+    response = async_client.get('/api/customers/1')
+    
+    assert response.status_code == 200
+    assert len(statements) == 4
+    detail = response.get_json()
+    assert detail['customer']['email'] == 'user0@example.com'
+    assert len(detail['touchpoints']) == 10
+    assert detail == sync_response(async_client, '/api/customers/1').get_json()
+
+def test_missing_customer_is_a_404(async_client):
+    assert async_client.get('/api/customers/999').status_code == 404
+
+def test_dashboard_stats_match_the_sync_path(async_client):
+    # The first request seeds the rollup through the sync path
+    first = async_client.get('/api/dashboard/stats').get_json()
+    assert DashboardStats.query.count() == 1
+    db.session.remove()
+    
+    statements = record_statements(async_db.engine.sync_engine)
+    second = async_client.get('/api/dashboard/stats').get_json()
+    
+    assert len(statements) == 2
+    assert first == second == sync_response(async_client, '/api/dashboard/stats').get_json()
+    assert second['total_customers'] == 3
+    assert second['recent_customers'] == 2
+
+def test_async_connections_are_read_only(async_client):
+    async def delete_customers():
+        async with async_db.engine.connect() as connection:
+            await connection.execute(text('DELETE FROM customers'))
+    
+    with pytest.raises(OperationalError):
+        async_client.application.ensure_sync(delete_customers)()
+
+def test_needs_a_file_database():
+    class MemoryConfig(TestConfig):
+        ASYNC_VIEWS_ENABLED = True
+    
+    with pytest.raises(ValueError):
+        create_app(MemoryConfig)
@@ -0,0 +1,132 @@
+"""
+Tests for multi-touch revenue attribution
+"""
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import event
+from models import db, Campaign, Touchpoint, Interaction, SalesMetric
+from attribution import MODELS, attribute, credit_weights
+
+def reference_weights(model, days, half_life_days):
+    """Per-customer loop the vectorized weights must agree with"""
+    n = len(days)
+    if model == 'first_touch':
+        return [1.0] + [0.0] * (n - 1)
+    if model == 'last_touch':
+        return [0.0] * (n - 1) + [1.0]
+    if model == 'linear':
+        return [1.0 / n] * n
+    if model == 'time_decay':
+        raw = [2 ** ((day - days[-1]) / half_life_days) for day in days]
+        return [w / sum(raw) for w in raw]
+    if n <= 2:
+        return [1.0 / n] * n
+    return [0.4] + [0.2 / (n - 2)] * (n - 2) + [0.4]
+
+@pytest.mark.parametrize('model', MODELS)
+def test_weights_match_per_customer_loop(model):
+    rng = np.random.default_rng(3)
+    customer_ids = np.sort(rng.integers(1, 200, 2000))
+    days = rng.uniform(0, 90, len(customer_ids))
+    order = np.lexsort((days, customer_ids))
+    customer_ids, days = customer_ids[order], days[order]
+    
+    weights = credit_weights(model, customer_ids, days, 7.0)
+    
+    for customer_id in np.unique(customer_ids):
+        touches = customer_ids == customer_id
+        assert weights[touches] == pytest.approx(reference_weights(model, list(days[touches]), 7.0))
+
+def test_attribute_shares_revenue_along_paths():
+    paths = (np.array([1, 1, 1, 2, 3]), np.array([10, 11, 12, 11, 12]), np.array([0.0, 1.0, 2.0, 0.0, 5.0]))
+    revenue = (np.array([1, 3, 9]), np.array([300.0, 50.0, 1000.0]))
+    
+    campaign_ids, credit, conversions = attribute(paths, revenue, 'linear')
+    
+    # Customer 2 has no won revenue and customer 9 has no path
+    assert dict(zip(campaign_ids.tolist(), credit.tolist())) == {10: 100.0, 11: 100.0, 12: 150.0}
+    assert conversions == 2
+
+def test_unknown_model_rejected():
+    with pytest.raises(ValueError):
+        credit_weights('u_shaped', np.zeros(0), np.zeros(0))
+    with pytest.raises(ValueError):
+        credit_weights('time_decay', np.zeros(0), np.zeros(0), half_life_days=0)
+
+@pytest.fixture
+def journeys(customers):
+    now = datetime.utcnow()
+    search, social = Campaign(campaign_name='Search'), Campaign(campaign_name='Social')
+    db.session.add_all([search, social])
+    touchpoint = Touchpoint(customer_id=1, touchpoint_type='Ad Click')
+    db.session.add(touchpoint)
+    db.session.flush()
+    
+    def touch(customer_id, campaign, days_ago):
+        return Interaction(customer_id=customer_id, campaign_id=campaign.campaign_id,
+                           touchpoint_id=touchpoint.touchpoint_id, interaction_date=now - timedelta(days=days_ago))
+    
+    # Inserted out of date order; the loader sorts each path
+    db.session.add_all([
+        touch(1, social, 1), touch(1, search, 10), touch(1, social, 5),
+        touch(2, search, 3),
+        SalesMetric(customer_id=1, campaign_id=social.campaign_id, deal_size=900.0, won=1),
+        SalesMetric(customer_id=2, campaign_id=search.campaign_id, deal_size=100.0, won=1),
+        SalesMetric(customer_id=2, campaign_id=search.campaign_id, deal_size=5000.0, won=0),
+        SalesMetric(customer_id=3, campaign_id=search.campaign_id, deal_size=40.0, won=1),
+    ])
+    db.session.commit()
+    return search, social
+
+def attribution(client, query):
+    response = client.get(f'/api/analytics/attribution{query}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def test_first_and_last_touch(admin_client, journeys):
+    first = {c['campaign_name']: c['revenue'] for c in attribution(admin_client, '?model=first_touch')['campaigns']}
+    last = {c['campaign_name']: c['revenue'] for c in attribution(admin_client, '?model=last_touch')['campaigns']}
+    assert first == {'Search': 1000.0}
+    assert last == {'Social': 900.0, 'Search': 100.0}
+
+def test_position_based_totals(admin_client, journeys):
+    result = attribution(admin_client, '?model=position_based')
+    
+    assert result['conversions'] == 2
+    assert result['attributed_revenue'] == pytest.approx(1000.0)
+    assert result['unattributed_revenue'] == pytest.approx(40.0)  # customer 3 never interacted
+    assert [c['campaign_name'] for c in result['campaigns']] == ['Social', 'Search']
+    assert result['campaigns'][0]['revenue'] == pytest.approx(900 * 0.6)
+    assert sum(c['share'] for c in result['campaigns']) == pytest.approx(1.0)
+
+def test_time_decay_favours_recent_touches(admin_client, journeys):
+    slow = attribution(admin_client, '?model=time_decay&half_life=1000')
+    fast = attribution(admin_client, '?model=time_decay&half_life=1')
+    social = lambda result: next(c['revenue'] for c in result['campaigns'] if c['campaign_name'] == 'Social')
+    assert social(slow) == pytest.approx(600.0, rel=0.01)
+    assert social(fast) > 890.0
+    assert fast['half_life_days'] == 1.0
+
+def test_invalid_model(admin_client, journeys):
+    response = admin_client.get('/api/analytics/attribution?model=magic')
+    assert response.status_code == 400
+    assert 'Unknown attribution model' in response.get_json()['error']
+
+def test_loaded_arrays_are_reused_until_their_table_changes(admin_client, journeys):
+    search, social = journeys
+    attribution(admin_client, '?model=linear')
+    
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        attribution(admin_client, '?model=first_touch')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert not [s for s in statements if 'FROM interactions' in s or 'FROM sales_metrics' in s]
+    
+    db.session.add(SalesMetric(customer_id=2, campaign_id=search.campaign_id, deal_size=400.0, won=1))
+    db.session.commit()
+    assert attribution(admin_client, '?model=first_touch')['attributed_revenue'] == 1400.0
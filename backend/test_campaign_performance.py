@@ -0,0 +1,82 @@
+"""
+Tests for the campaign performance leaderboard
+"""
+
+import pytest
+from models import db, Campaign, CampaignStats, Touchpoint, Interaction, SalesMetric, FinancialMetric
+from rollups import reconcile_campaign_stats, reconcile_dashboard_stats
+
+@pytest.fixture
+def campaigns(customers):
+    rows = [Campaign(campaign_name=name, ad_spend=spend) for name, spend in
+            [('Search', 1000.0), ('Social', 4000.0), ('Display', 0.0)]]
+    db.session.add_all(rows)
+    touchpoint = Touchpoint(customer_id=1, touchpoint_type='Ad Click')
+    db.session.add(touchpoint)
+    db.session.flush()
+    search, social, display = [c.campaign_id for c in rows]
+    
+    db.session.add_all(
+        [Interaction(customer_id=1, campaign_id=search, touchpoint_id=touchpoint.touchpoint_id) for _ in range(3)] +
+        [Interaction(customer_id=1, campaign_id=social, touchpoint_id=touchpoint.touchpoint_id)] + [
+            SalesMetric(customer_id=1, campaign_id=search, deal_size=500.0, won=1),
+            SalesMetric(customer_id=2, campaign_id=search, deal_size=1500.0, won=1),
+            SalesMetric(customer_id=3, campaign_id=search, deal_size=9000.0, won=0),
+            SalesMetric(customer_id=1, campaign_id=social, deal_size=2000.0, won=0),
+            FinancialMetric(customer_id=1, campaign_id=search, revenue=3000.0),
+            FinancialMetric(customer_id=2, campaign_id=social, revenue=6000.0),
+        ]
+    )
+    db.session.commit()
+    return rows
+
+def leaderboard(client, query=''):
+    response = client.get(f'/api/campaigns/performance{query}')
+    assert response.status_code == 200
+    return response.get_json()['campaigns']
+
+def test_metrics_per_campaign(admin_client, campaigns):
+    rows = {c['campaign_name']: c for c in leaderboard(admin_client)}
+    assert rows['Search'] == {
+        'campaign_id': campaigns[0].campaign_id, 'campaign_name': 'Search', 'ad_spend': 1000.0,
+        'revenue': 3000.0, 'roas': 3.0, 'win_rate': pytest.approx(2 / 3), 'avg_deal_size': 1000.0,
+        'deals': 3, 'won_deals': 2, 'interactions': 3
+    }
+    assert rows['Social']['roas'] == 1.5
+    assert rows['Social']['avg_deal_size'] is None
+    assert rows['Display']['roas'] is None
+    assert rows['Display']['interactions'] == 0
+
+def test_sorting_and_top_n(admin_client, campaigns):
+    assert [c['campaign_name'] for c in leaderboard(admin_client)] == ['Social', 'Search', 'Display']
+    assert [c['campaign_name'] for c in leaderboard(admin_client, '?sort=roas&limit=2')] == ['Search', 'Social']
+    assert [c['campaign_name'] for c in leaderboard(admin_client, '?sort=interactions&order=asc')] == ['Display', 'Social', 'Search']
+    assert admin_client.get('/api/campaigns/performance?sort=bogus').status_code == 400
+
+@pytest.mark.parametrize('limit', ['0', '-1', 'abc', ''])
+def test_rejects_bad_limits(admin_client, campaigns, limit):
+    response = admin_client.get(f'/api/campaigns/performance?limit={limit}')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'limit must be a positive integer'
+
+def test_incremental_counters_match_reconcile(admin_client, campaigns):
+    leaderboard(admin_client)
+    sale = SalesMetric.query.filter_by(deal_size=9000.0).one()
+    sale.won = 1
+    db.session.delete(FinancialMetric.query.filter_by(revenue=6000.0).one())
+    db.session.commit()
+    
+    incremental = leaderboard(admin_client)
+    reconcile_campaign_stats()
+    assert leaderboard(admin_client) == incremental
+    assert incremental[0]['campaign_name'] == 'Search'
+    assert incremental[0]['won_deals'] == 3
+
+def test_seeds_campaign_stats_when_the_dashboard_rollup_exists(admin_client, campaigns):
+    reconcile_dashboard_stats()
+    db.session.execute(CampaignStats.__table__.delete())
+    db.session.commit()
+    
+    rows = {c['campaign_name']: c for c in leaderboard(admin_client)}
+    assert rows['Search']['revenue'] == 3000.0
+    assert rows['Social']['interactions'] == 1
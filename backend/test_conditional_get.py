@@ -0,0 +1,100 @@
+"""
+Tests for ETag / 304 responses driven by table version counters
+"""
+
+import time
+import pytest
+from sqlalchemy import event
+from werkzeug.http import http_date
+from models import db, Customer, Campaign, Touchpoint, Interaction
+
+@pytest.fixture
+def campaign(customers):
+    campaign = Campaign(campaign_name='Spring')
+    db.session.add(campaign)
+    db.session.commit()
+    return campaign
+
+def count_statements(client, url, **headers):
+    statements = []
+    record = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return response, statements
+
+@pytest.mark.parametrize('url', ['/api/campaigns', '/api/dashboard/stats', '/api/customers?page=1'])
+def test_matching_etag_returns_304_without_queries(admin_client, campaign, url):
+    admin_client.get(url)  # the first stats request seeds the rollup, which is itself a write
+    first = admin_client.get(url)
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    etag = first.headers['ETag']
+    
+    response, statements = count_statements(admin_client, url, **{'If-None-Match': etag})
+    
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+    assert statements == []
+
+def test_commit_changes_the_etag(admin_client, campaign):
+    etag = admin_client.get('/api/campaigns').headers['ETag']
+    
+    db.session.add(Campaign(campaign_name='Summer'))
+    db.session.commit()
+    
+    response = admin_client.get('/api/campaigns', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.get_json()['campaigns']) == 2
+
+def test_rollback_and_other_tables_keep_the_etag(admin_client, campaign):
+    etag = admin_client.get('/api/campaigns').headers['ETag']
+    
+    db.session.add(Campaign(campaign_name='Never'))
+    db.session.flush()
+    db.session.rollback()
+    db.session.add(Touchpoint(customer_id=1, touchpoint_type='Ad Click'))
+    db.session.commit()
+    
+    assert admin_client.get('/api/campaigns', headers={'If-None-Match': etag}).status_code == 304
+
+def test_core_writes_bump_versions(admin_client, customers):
+    etag = admin_client.get('/api/customers').headers['ETag']
+    
+    db.session.execute(Customer.__table__.update().where(Customer.customer_id == 1).values(first_name='Changed'))
+    db.session.commit()
+    
+    assert admin_client.get('/api/customers', headers={'If-None-Match': etag}).status_code == 200
+
+def test_dashboard_etag_follows_its_base_tables(admin_client, campaign):
+    etag = admin_client.get('/api/dashboard/stats').headers['ETag']
+    touchpoint = Touchpoint(customer_id=1, touchpoint_type='Ad Click')
+    db.session.add(touchpoint)
+    db.session.flush()
+    db.session.add(Interaction(customer_id=1, campaign_id=campaign.campaign_id, touchpoint_id=touchpoint.touchpoint_id))
+    db.session.commit()
+    
+    response = admin_client.get('/api/dashboard/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['total_interactions'] == 1
+
+def test_if_modified_since_is_not_trusted(admin_client, campaign):
+    # A commit in the same second as the first response must still be seen
+    first = admin_client.get('/api/campaigns')
+    assert 'Last-Modified' not in first.headers
+    since = http_date(time.time())
+    db.session.add(Campaign(campaign_name='Summer'))
+    db.session.commit()
+    
+    response = admin_client.get('/api/campaigns', headers={'If-Modified-Since': since})
+    assert response.status_code == 200
+    assert len(response.get_json()['campaigns']) == 2
+
+def test_errors_are_not_tagged(admin_client, customers):
+    response = admin_client.get('/api/customers?cursor=&order=name')
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
@@ -0,0 +1,55 @@
+"""
+Tests for the single and batched customer detail endpoints
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from models import db, Campaign, Touchpoint, SalesMetric, FinancialMetric
+
+def add_history(customer_id, campaign_id, count):
+    now = datetime.utcnow()
+    for i in range(count):
+        db.session.add_all([
+            Touchpoint(customer_id=customer_id, touchpoint_type='Ad Click',
+                       interaction_date=now - timedelta(days=i), device_type='Mobile'),
+            SalesMetric(customer_id=customer_id, campaign_id=campaign_id, conversion_stage='Lead',
+                        deal_size=1000 + i, sale_date=now - timedelta(days=i), won=i % 2),
+            FinancialMetric(customer_id=customer_id, campaign_id=campaign_id, revenue=100.0 * i),
+        ])
+    db.session.commit()
+
+def test_bulk_details_match_single_endpoint(admin_client, customers):
+    campaign = Campaign(campaign_name='Spring')
+    db.session.add(campaign)
+    db.session.commit()
+    add_history(1, campaign.campaign_id, 15)
+    add_history(2, campaign.campaign_id, 3)
+    
+    data = admin_client.get('/api/customers/details?ids=2,1,5').get_json()
+    assert [d['customer']['customer_id'] for d in data['customers']] == [2, 1, 5]
+    assert len(data['customers'][1]['touchpoints']) == 10
+    assert len(data['customers'][0]['sales_metrics']) == 3
+    assert data['customers'][2]['financial_metrics'] == []
+    for detail in data['customers']:
+        single = admin_client.get(f"/api/customers/{detail['customer']['customer_id']}").get_json()
+        assert detail == single
+
+def test_bulk_details_use_one_query_per_table(app, admin_client, customers):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        admin_client.get('/api/customers/details?ids=' + ','.join(str(i) for i in range(1, 21)))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    
+    data_queries = [s for s in statements if 'FROM user' not in s]
+    assert len(data_queries) == 4
+
+def test_bulk_details_reports_missing_and_invalid_ids(admin_client, customers):
+    data = admin_client.get('/api/customers/details?ids=3,999').get_json()
+    assert [d['customer']['customer_id'] for d in data['customers']] == [3]
+    assert data['missing'] == [999]
+    
+    assert admin_client.get('/api/customers/details?ids=a,b').status_code == 400
+    assert admin_client.get('/api/customers/details').status_code == 400
@@ -0,0 +1,60 @@
+"""
+Tests for keyset (cursor) pagination on /api/customers
+"""
+
+import pytest
+import pagination
+
+def collect_pages(client, url):
+    ids, pages, cursor = [], 0, ''
+    while True:
+        data = client.get(f'{url}&cursor={cursor}').get_json()
+        pages += 1
+        ids.extend(c['customer_id'] for c in data['customers'])
+        if not data['next_cursor']:
+            return ids, pages
+        cursor = data['next_cursor']
+
+def test_after_seeks_on_primary_key(admin_client, customers):
+    data = admin_client.get('/api/customers?after=10&per_page=5').get_json()
+    assert [c['customer_id'] for c in data['customers']] == [11, 12, 13, 14, 15]
+    assert data['has_more'] is True
+    assert 'total' not in data
+
+def test_cursor_walks_every_row_once(admin_client, customers):
+    ids, pages = collect_pages(admin_client, '/api/customers?per_page=10')
+    assert ids == list(range(1, 26))
+    assert pages == 3
+
+def test_created_at_order_is_newest_first(admin_client, customers):
+    ids, _ = collect_pages(admin_client, '/api/customers?order=created_at&per_page=7')
+    assert ids == list(range(1, 26))
+
+def test_cursor_mode_respects_search_and_total(admin_client, customers):
+    data = admin_client.get('/api/customers?after=0&search=Last1&include_total=true').get_json()
+    assert data['total'] == 11
+    assert data['next_cursor'] is None
+    assert all('Last1' in c['last_name'] for c in data['customers'])
+
+def test_invalid_cursor_is_rejected(admin_client, customers):
+    response = admin_client.get('/api/customers?cursor=not-a-cursor')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+
+def test_page_mode_is_unchanged(admin_client, customers):
+    data = admin_client.get('/api/customers?page=2&per_page=10').get_json()
+    assert data['total'] == 25
+    assert data['pages'] == 3
+    assert data['current_page'] == 2
+
+@pytest.mark.parametrize('per_page', [0, -1])
+def test_per_page_is_clamped(admin_client, customers, per_page):
+    data = admin_client.get(f'/api/customers?after=0&per_page={per_page}').get_json()
+    assert [c['customer_id'] for c in data['customers']] == [1]
+    assert data['per_page'] == 1
+
+def test_count_cache_is_bounded(admin_client, customers, monkeypatch):
+    monkeypatch.setattr(pagination, 'COUNT_CACHE_SIZE', 2)
+    for search in ['Last1', 'Last2', 'First', 'Last1']:
+        admin_client.get(f'/api/customers?after=0&search={search}&include_total=true')
+    assert list(pagination._count_cache) == [('customers', 'First', 'id'), ('customers', 'Last1', 'id')]
@@ -0,0 +1,44 @@
+"""
+Tests for the indexed customer search on /api/customers
+"""
+
+from models import db, Customer
+
+def search(client, term, extra=''):
+    response = client.get(f'/api/customers?search={term}{extra}')
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_prefix_match_keeps_response_shape(admin_client, customers):
+    data = search(admin_client, 'Last2')
+    assert {c['last_name'] for c in data['customers']} == {'Last2', 'Last20', 'Last21', 'Last22', 'Last23', 'Last24', 'Last25'}
+    assert data['total'] == 7
+    assert set(data) == {'customers', 'total', 'pages', 'current_page', 'per_page'}
+
+def test_token_match_on_email(admin_client, customers):
+    data = search(admin_client, 'user7@example')
+    assert [c['customer_id'] for c in data['customers']] == [7]
+
+def test_results_ordered_by_relevance(admin_client, customers):
+    db.session.add_all([
+        Customer(first_name='Ada', last_name='Smith', email='ada.smith@smith.io'),
+        Customer(first_name='Bob', last_name='Smithers', email='bob@example.com'),
+    ])
+    db.session.commit()
+    
+    data = search(admin_client, 'smith')
+    assert [c['first_name'] for c in data['customers']] == ['Ada', 'Bob']
+
+def test_index_follows_updates_and_deletes(admin_client, customers):
+    customer = db.session.get(Customer, 3)
+    customer.last_name = 'Renamed'
+    db.session.delete(db.session.get(Customer, 4))
+    db.session.commit()
+    
+    assert [c['customer_id'] for c in search(admin_client, 'renamed')['customers']] == [3]
+    assert search(admin_client, 'Last3')['total'] == 0
+    assert search(admin_client, 'First4')['total'] == 0
+
+def test_search_works_in_cursor_mode(admin_client, customers):
+    data = search(admin_client, 'Last1', '&after=0&per_page=5')
+    assert [c['customer_id'] for c in data['customers']] == [1, 10, 11, 12, 13]
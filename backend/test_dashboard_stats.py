@@ -0,0 +1,85 @@
+"""
+Tests for the incrementally maintained dashboard statistics rollup
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import mysql as mysql_dialect, postgresql
+from models import db, Customer, Campaign, Touchpoint, Interaction, FinancialMetric, CampaignStats
+from rollups import reconcile_dashboard_stats, _add_to_counters
+
+def stats(client):
+    response = client.get('/api/dashboard/stats')
+    assert response.status_code == 200
+    return response.get_json()
+
+def add_campaign_activity(customer, revenue):
+    campaign = Campaign(campaign_name='Spring', ad_spend=1000)
+    touchpoint = Touchpoint(customer_id=customer.customer_id, touchpoint_type='Ad Click')
+    db.session.add_all([campaign, touchpoint])
+    db.session.flush()
+    db.session.add_all([
+        Interaction(customer_id=customer.customer_id, campaign_id=campaign.campaign_id,
+                    touchpoint_id=touchpoint.touchpoint_id, interaction_type='Click'),
+        FinancialMetric(customer_id=customer.customer_id, campaign_id=campaign.campaign_id, revenue=revenue),
+    ])
+    db.session.commit()
+
+def test_stats_are_seeded_from_existing_rows(admin_client, customers):
+    assert stats(admin_client) == {
+        'total_customers': 25,
+        'total_campaigns': 0,
+        'total_revenue': 0.0,
+        'total_interactions': 0,
+        'recent_customers': 25
+    }
+
+def test_inserts_updates_and_deletes_are_folded_in(admin_client, customers):
+    stats(admin_client)
+    add_campaign_activity(customers[0], 1500.0)
+    
+    metric = FinancialMetric.query.one()
+    metric.revenue = 2000.0
+    db.session.add(Customer(first_name='New', last_name='Customer', email='new@example.com'))
+    db.session.delete(db.session.get(Customer, 20))
+    db.session.commit()
+    
+    data = stats(admin_client)
+    assert data['total_customers'] == 25
+    assert data['total_campaigns'] == 1
+    assert data['total_interactions'] == 1
+    assert data['total_revenue'] == 2000.0
+
+def test_recent_customers_uses_the_thirty_day_window(admin_client, customers):
+    stats(admin_client)
+    db.session.add(Customer(first_name='Old', created_at=datetime.utcnow() - timedelta(days=90)))
+    db.session.commit()
+    
+    data = stats(admin_client)
+    assert data['total_customers'] == 26
+    assert data['recent_customers'] == 25
+
+def test_reconcile_repairs_drift_from_bulk_writes(admin_client, customers):
+    stats(admin_client)
+    Customer.query.filter(Customer.customer_id > 20).delete()
+    db.session.commit()
+    assert stats(admin_client)['total_customers'] == 25
+    
+    reconcile_dashboard_stats()
+    assert stats(admin_client)['total_customers'] == 20
+
+class RecordingConnection:
+    def __init__(self, dialect):
+        self.dialect = dialect
+        self.statements = []
+    
+    def execute(self, statement, rows):
+        self.statements.append(str(statement.compile(dialect=self.dialect)))
+
+def test_counter_upserts_follow_the_dialect():
+    rows = [{'campaign_id': 1, 'deals': 1}]
+    postgres, mysql = RecordingConnection(postgresql.dialect()), RecordingConnection(mysql_dialect.dialect())
+    _add_to_counters(postgres, CampaignStats.__table__, ['campaign_id'], rows)
+    _add_to_counters(mysql, CampaignStats.__table__, ['campaign_id'], rows)
+    
+    assert 'ON CONFLICT (campaign_id) DO UPDATE' in postgres.statements[0]
+    assert mysql.statements == []  # left to reconcile_campaign_stats
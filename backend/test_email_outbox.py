@@ -0,0 +1,177 @@
+"""
+Tests for the persistent email outbox against a local SMTP stand-in
+"""
+
+import socketserver
+import threading
+import pytest
+from app import create_app
+from conftest import TestConfig
+from models import db, User, OutboxEmail
+from email_utils import send_email, send_approval_notification
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough of an SMTP server to accept mail and count connections"""
+    
+    allow_reuse_address = True
+    daemon_threads = True
+    
+    def __init__(self, reject=()):
+        self.connections = 0
+        self.messages = []
+        self.reject = set(reject)
+        self.drop_on_quit = False
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+    
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 localhost ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                if not server.drop_on_quit:
+                    self.reply('221 bye')
+                return
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 ok')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip('<> ')
+                if address in server.reject:
+                    self.reply('550 no such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 ok')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                while self.rfile.readline().rstrip(b'\r\n') != b'.':
+                    pass
+                server.messages.append(recipients)
+                self.reply('250 queued')
+            else:
+                self.reply('250 ok')
+
+@pytest.fixture
+def smtp(app):
+    server = SMTPStandIn(reject=['bounce@example.com'])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    mail = app.extensions['mail']
+    mail.server, mail.port, mail.use_tls, mail.suppress = '127.0.0.1', server.server_address[1], False, False
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_send_email_only_enqueues(app):
+    send_email('Hello', ['a@example.com'], 'Body')
+    email = OutboxEmail.query.one()
+    assert email.status == 'pending'
+    assert email.attempts == 0
+
+def test_batch_reuses_one_connection(app, smtp):
+    for i in range(5):
+        send_email(f'Hello {i}', [f'user{i}@example.com'], 'Body')
+    
+    assert app.extensions['email_outbox'].deliver_pending() == 5
+    assert smtp.connections == 1
+    assert smtp.messages == [[f'user{i}@example.com'] for i in range(5)]
+    assert {e.status for e in OutboxEmail.query} == {'sent'}
+
+def test_failed_message_is_retried_with_backoff(app, smtp):
+    send_email('Bounce', ['bounce@example.com'], 'Body')
+    send_email('Hello', ['ok@example.com'], 'Body')
+    outbox = app.extensions['email_outbox']
+    outbox.deliver_pending()
+    
+    bounced, delivered = OutboxEmail.query.order_by(OutboxEmail.id).all()
+    assert delivered.status == 'sent'
+    assert bounced.status == 'pending'
+    assert bounced.attempts == 1
+    assert bounced.next_attempt_at > bounced.created_at
+    assert smtp.messages == [['ok@example.com']]
+
+def test_message_fails_after_max_attempts(app, smtp):
+    outbox = app.extensions['email_outbox']
+    send_email('Bounce', ['bounce@example.com'], 'Body')
+    for _ in range(outbox.max_attempts):
+        OutboxEmail.query.update({'next_attempt_at': db.func.datetime('now', '-1 day')})
+        db.session.commit()
+        outbox.deliver_pending()
+    
+    email = OutboxEmail.query.one()
+    assert email.status == 'failed'
+    assert email.attempts == outbox.max_attempts
+    assert '550' in email.last_error
+
+def test_unreachable_server_backs_off_the_whole_batch(app, smtp):
+    for i in range(3):
+        send_email(f'Hello {i}', [f'user{i}@example.com'], 'Body')
+    port = smtp.server_address[1]
+    smtp.shutdown()
+    smtp.server_close()
+    app.extensions['mail'].port = port
+    
+    assert app.extensions['email_outbox'].deliver_pending() == 0
+    emails = OutboxEmail.query.all()
+    assert {(e.status, e.attempts) for e in emails} == {('pending', 1)}
+    assert all(e.next_attempt_at > e.created_at for e in emails)
+
+def test_failed_quit_after_sending_keeps_the_batch_sent(app, smtp):
+    outbox = app.extensions['email_outbox']
+    smtp.drop_on_quit = True
+    for i in range(3):
+        send_email(f'Hello {i}', [f'user{i}@example.com'], 'Body')
+    
+    assert outbox.deliver_batch() == 3
+    db.session.expire_all()
+    assert {(e.status, e.claim_token, e.attempts) for e in OutboxEmail.query} == {('sent', None, 1)}
+    
+    # Not claimed again, even once a stale claim would have timed out
+    OutboxEmail.query.update({'claimed_at': db.func.datetime('now', '-1 day')})
+    db.session.commit()
+    assert outbox.deliver_pending() == 0
+    assert len(smtp.messages) == 3
+
+def test_old_sent_messages_are_pruned(app, smtp):
+    outbox = app.extensions['email_outbox']
+    send_email('Old', ['old@example.com'], 'Body')
+    send_email('New', ['new@example.com'], 'Body')
+    outbox.deliver_pending()
+    OutboxEmail.query.filter_by(subject='Old').update({'sent_at': db.func.datetime('now', f'-{outbox.retention_days + 1} days')})
+    db.session.commit()
+    
+    assert outbox.prune_sent() == 1
+    assert [e.subject for e in OutboxEmail.query] == ['New']
+
+def test_workers_drain_on_shutdown(tmp_path, smtp):
+    # Worker threads need their own connections, so use a file database
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'outbox.db'}"
+        MAIL_SERVER = '127.0.0.1'
+        MAIL_PORT = smtp.server_address[1]
+        MAIL_USE_TLS = False
+        MAIL_SUPPRESS_SEND = False
+        MAIL_OUTBOX_WORKERS = 2
+    
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username='bob', email='bob@example.com', first_name='Bob', last_name='Doe', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        send_approval_notification(user, approved=True)
+        
+        app.extensions['email_outbox'].shutdown()
+        
+        db.session.expire_all()
+        assert OutboxEmail.query.one().status == 'sent'
+        assert smtp.messages == [['bob@example.com']]
+        db.session.remove()
@@ -0,0 +1,51 @@
+"""
+Tests for the streaming NDJSON/CSV export endpoints
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from models import db, Campaign, Touchpoint, Interaction
+
+def test_customers_ndjson_streams_every_row(app, admin_client, customers):
+    app.config['EXPORT_BATCH_SIZE'] = 7
+    response = admin_client.get('/api/export/customers')
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r['customer_id'] for r in rows] == list(range(1, 26))
+    assert rows[0]['email'] == 'user1@example.com'
+
+def test_customers_csv_with_search_and_dates(admin_client, customers):
+    today = datetime.utcnow().date()
+    response = admin_client.get(
+        f'/api/export/customers?format=csv&search=Last1&from={today - timedelta(days=12)}'
+    )
+    assert response.headers['Content-Disposition'] == 'attachment; filename=customers.csv'
+    
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [int(r['customer_id']) for r in rows] == [1, 10, 11, 12]
+
+def test_interactions_export_filters(admin_client, customers):
+    now = datetime.utcnow()
+    campaigns = [Campaign(campaign_name='A'), Campaign(campaign_name='B')]
+    db.session.add_all(campaigns)
+    touchpoint = Touchpoint(customer_id=1, touchpoint_type='Ad Click')
+    db.session.add(touchpoint)
+    db.session.flush()
+    for i in range(6):
+        db.session.add(Interaction(customer_id=1, campaign_id=campaigns[i % 2].campaign_id,
+                                   touchpoint_id=touchpoint.touchpoint_id, interaction_type='Click',
+                                   interaction_date=now - timedelta(days=i)))
+    db.session.commit()
+    
+    response = admin_client.get(f'/api/export/interactions?campaign_id={campaigns[0].campaign_id}&to={(now - timedelta(days=1)).date()}')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r['interaction_id'] for r in rows] == [3, 5]
+
+def test_export_rejects_bad_parameters(admin_client, customers):
+    assert admin_client.get('/api/export/customers?format=xml').status_code == 400
+    assert admin_client.get('/api/export/customers?from=yesterday').status_code == 400
+    assert admin_client.get('/api/export/interactions?customer_id=abc').status_code == 400
@@ -0,0 +1,147 @@
+"""
+Tests for the columnar metrics cache and /api/analytics/metrics
+"""
+
+from datetime import date, datetime, timedelta
+import threading
+import pytest
+import metrics_cache as metrics_cache_module
+from app import metrics_cache
+from models import db, Customer, Campaign, SalesMetric, FinancialMetric
+
+QUERIES = [
+    ('financial_metrics', 'revenue', 'sum', None, {}, None, None),
+    ('financial_metrics', 'revenue', 'sum', 'campaign_id', {}, None, None),
+    ('financial_metrics', 'cac', 'mean', 'device_type', {}, None, None),
+    ('financial_metrics', 'cltv', 'max', 'customer_id', {'device_type': ['Mobile']}, None, None),
+    ('financial_metrics', 'cpc', 'count', 'campaign_id', {}, None, None),
+    ('sales_metrics', 'deal_size', 'min', 'conversion_stage', {'won': [1]}, None, None),
+    ('sales_metrics', 'won', 'mean', 'campaign_id', {}, None, None),
+    ('sales_metrics', 'deal_size', 'sum', 'sale_date', {}, date.today() - timedelta(days=3), date.today()),
+    ('sales_metrics', None, 'count', 'device_type', {'campaign_id': [1, 3]}, None, None),
+]
+
+@pytest.fixture
+def metrics(customers):
+    now = datetime.utcnow()
+    db.session.add_all([Campaign(campaign_name=f'Campaign{i}') for i in range(1, 4)])
+    db.session.flush()
+    for i, customer in enumerate(customers[:12]):
+        campaign_id = i % 3 + 1
+        db.session.add_all([
+            FinancialMetric(customer_id=customer.customer_id, campaign_id=campaign_id, revenue=100.0 * i,
+                            cac=10.0 + i, cltv=1000.0 - i, cpc=None if i % 4 == 0 else 1.5),
+            SalesMetric(customer_id=customer.customer_id, campaign_id=campaign_id, deal_size=50.0 * i,
+                        conversion_stage=['Lead', 'Closed', None][i % 3], won=i % 2,
+                        sale_date=now - timedelta(days=i))
+        ])
+    db.session.commit()
+
+@pytest.fixture
+def cache(app, metrics):
+    metrics_cache.enabled = True
+    yield metrics_cache
+    metrics_cache.enabled = False
+    metrics_cache.clear()
+
+@pytest.fixture
+def orphans(metrics):
+    """Metric rows whose customer doesn't exist, which SQLite's unenforced foreign keys allow"""
+    db.session.add_all([
+        FinancialMetric(customer_id=999, campaign_id=1, revenue=5000.0, cac=1.0, cltv=1.0, cpc=2.0),
+        SalesMetric(customer_id=999, campaign_id=1, deal_size=75.0, conversion_stage='Lead', won=1,
+                    sale_date=datetime.utcnow())
+    ])
+    db.session.commit()
+
+@pytest.mark.parametrize('with_orphans', [False, True], ids=['', 'orphans'])
+@pytest.mark.parametrize('query', QUERIES, ids=lambda q: f'{q[0]}-{q[2]}-{q[1]}-by-{q[3]}')
+def test_cache_agrees_with_sql(request, app, metrics, query, with_orphans):
+    if with_orphans:
+        request.getfixturevalue('orphans')
+    from_sql = metrics_cache.aggregate(*query)
+    metrics_cache.enabled = True
+    try:
+        from_cache = metrics_cache.aggregate(*query)
+    finally:
+        metrics_cache.enabled = False
+        metrics_cache.clear()
+    
+    assert from_sql
+    assert from_cache == from_sql
+
+def test_new_rows_are_appended_by_watermark(cache):
+    assert cache.aggregate('financial_metrics', 'revenue') == [{'group': None, 'rows': 12, 'revenue': 6600.0}]
+    table = cache.tables['financial_metrics']
+    
+    db.session.add(FinancialMetric(customer_id=1, campaign_id=1, revenue=400.0))
+    db.session.commit()
+    cache.refresh(force=True)
+    
+    assert cache.tables['financial_metrics'] is table
+    assert table.watermark == 13
+    assert cache.aggregate('financial_metrics', 'revenue')[0]['revenue'] == 7000.0
+
+def test_updates_reload_the_table(cache):
+    cache.aggregate('financial_metrics', 'revenue', group_by='device_type')
+    table = cache.tables['financial_metrics']
+    
+    FinancialMetric.query.filter_by(financial_id=2).one().revenue = 5000.0
+    db.session.get(Customer, 1).device_type = 'Watch'
+    db.session.commit()
+    
+    # The old snapshot answers while the replacement loads in the background
+    cache.aggregate('financial_metrics', 'revenue', group_by='device_type')
+    cache.wait()
+    groups = cache.aggregate('financial_metrics', 'revenue', group_by='device_type')
+    assert cache.tables['financial_metrics'] is not table
+    assert sum(g['revenue'] for g in groups) == 6600.0 - 100.0 + 5000.0
+    assert {'device_type': 'Watch', 'rows': 1, 'revenue': 0.0} in groups
+
+def test_memory_usage(cache):
+    cache.refresh(force=True)
+    usage = cache.memory_usage()
+    # 2 id columns (int32), 6 floats and a device code (int16) per financial row
+    assert usage['financial_metrics']['bytes_per_million_rows'] == (2 * 4 + 6 * 8 + 2) * 1000000
+    assert usage['sales_metrics']['rows'] == 12
+
+def test_metrics_endpoint(admin_client, cache):
+    response = admin_client.get('/api/analytics/metrics?table=sales_metrics&metric=deal_size'
+                                '&group_by=campaign_id&won=1&campaign_id=1,2')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['groups'] == [
+        {'campaign_id': 1, 'rows': 2, 'deal_size': 50.0 * (3 + 9)},
+        {'campaign_id': 2, 'rows': 2, 'deal_size': 50.0 * (1 + 7)},
+    ]
+
+@pytest.mark.parametrize('query', [
+    'table=users', 'metric=password_hash', 'metric=revenue&agg=median',
+    'metric=revenue&group_by=revenue', 'metric=revenue&campaign_id=one', 'metric=revenue&from=2024-01-01',
+])
+def test_metrics_endpoint_rejects_bad_queries(admin_client, metrics, query):
+    response = admin_client.get(f'/api/analytics/metrics?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_periodic_reload_does_not_block_readers(cache, monkeypatch):
+    cache.aggregate('financial_metrics', 'revenue')
+    table = cache.tables['financial_metrics']
+    release, load = threading.Event(), metrics_cache_module.MetricsTable.load
+    
+    def slow_load(self, *args, **kwargs):
+        release.wait(5)
+        return load(self, *args, **kwargs)
+    
+    monkeypatch.setattr(metrics_cache_module.MetricsTable, 'load', slow_load)
+    cache.max_age = 0
+    cache.refresh_interval = 0
+    try:
+        # Answered from the old snapshot while the reload is still loading
+        assert cache.aggregate('financial_metrics', 'revenue')[0]['revenue'] == 6600.0
+        assert cache.tables['financial_metrics'] is table
+    finally:
+        cache.max_age, cache.refresh_interval = 3600, 5
+        release.set()
+    cache.wait()
+    assert cache.tables['financial_metrics'] is not table
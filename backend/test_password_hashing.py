@@ -0,0 +1,77 @@
+"""
+Tests for the configurable bcrypt work factor and the password pool
+"""
+
+import threading
+import pytest
+from models import db, User
+from passwords import PasswordPool, PasswordPoolFull, hash_rounds
+
+def make_user(password='password123', rounds=4, **kwargs):
+    user = User(username='alice', email='alice@example.com', first_name='Alice', last_name='Doe',
+                is_verified=True, is_approved=True, **kwargs)
+    user.set_password(password, rounds)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def login(client, password='password123'):
+    return client.post('/api/login', json={'username': 'alice', 'password': password})
+
+def test_set_password_uses_configured_rounds(app):
+    assert hash_rounds(make_user().password_hash) == app.config['BCRYPT_LOG_ROUNDS']
+
+@pytest.mark.parametrize('stored_rounds', [5, 6])
+def test_login_rehashes_to_configured_rounds(app, client, stored_rounds):
+    user = make_user(rounds=stored_rounds)
+    assert login(client).status_code == 200
+    
+    db.session.refresh(user)
+    assert hash_rounds(user.password_hash) == app.config['BCRYPT_LOG_ROUNDS']
+    assert user.check_password('password123')
+
+def test_failed_login_does_not_rehash(app, client):
+    user = make_user(rounds=5)
+    assert login(client, 'wrong-password').status_code == 401
+    
+    db.session.refresh(user)
+    assert hash_rounds(user.password_hash) == 5
+
+def test_full_pool_rejects_login_before_hashing(app, client):
+    make_user()
+    pool = app.extensions['password_pool']
+    release = threading.Event()
+    
+    # Occupy every worker and queue slot
+    capacity = app.config['PASSWORD_POOL_WORKERS'] + app.config['PASSWORD_POOL_QUEUE_DEPTH']
+    threads = [threading.Thread(target=pool.run, args=(release.wait,)) for _ in range(capacity)]
+    for thread in threads:
+        thread.start()
+    try:
+        while pool._slots._value:
+            release.wait(0.01)
+        response = login(client)
+        assert response.status_code == 503
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+    
+    assert login(client).status_code == 200
+
+def test_pool_limits_concurrency():
+    class App:
+        config = {'PASSWORD_POOL_WORKERS': 1, 'PASSWORD_POOL_QUEUE_DEPTH': 0}
+        extensions = {}
+    pool = PasswordPool(App())
+    release = threading.Event()
+    
+    worker = threading.Thread(target=pool.run, args=(release.wait,))
+    worker.start()
+    while pool._slots._value:
+        release.wait(0.01)
+    with pytest.raises(PasswordPoolFull):
+        pool.run(lambda: True)
+    release.set()
+    worker.join()
+    assert pool.run(lambda: True) is True
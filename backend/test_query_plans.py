@@ -0,0 +1,122 @@
+"""
+Query plan regression harness: runs EXPLAIN QUERY PLAN on every statement
+each endpoint issues and fails if any of them falls back to a full scan.
+"""
+
+import re
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from models import db, Campaign, Touchpoint, Interaction, SalesMetric, FinancialMetric
+from pagination import encode_cursor
+from rollups import reconcile_rollups
+
+TABLES = set(db.metadata.tables)
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)')  # SQLite before 3.36 says 'SCAN TABLE x'
+
+# (method, url, json body, tables allowed to be scanned because the endpoint returns all of them)
+ENDPOINTS = [
+    ('GET', '/api/customers?page=2&per_page=5', None, {'customers'}),
+    ('GET', '/api/customers?after=5&per_page=5', None, set()),
+    ('GET', '/api/customers?cursor=&order=created_at&per_page=5', None, set()),
+    ('GET', '/api/customers?search=Last1&per_page=5', None, set()),
+    ('GET', '/api/customers/3', None, set()),
+    ('GET', '/api/customers/details?ids=1,2,3', None, set()),
+    ('GET', '/api/campaigns', None, {'campaigns'}),
+    ('GET', '/api/campaigns/performance?sort=roas&limit=5', None, {'campaigns'}),
+    ('GET', '/api/export/customers?format=csv', None, {'customers'}),
+    ('GET', '/api/export/interactions?customer_id=1', None, set()),
+    ('GET', '/api/export/interactions?campaign_id=1&from=2020-01-01', None, set()),
+    ('GET', '/api/analytics/attribution?model=position_based', None, {'interactions', 'sales_metrics', 'campaigns'}),
+    ('GET', '/api/analytics/metrics?metric=revenue&group_by=campaign_id', None, {'financial_metrics'}),
+    ('GET', '/api/dashboard/stats', None, set()),
+    ('GET', '/api/customers/1/timeline', None, set()),
+    ('GET', '/api/customers/1/timeline?order=asc&cursor=' + encode_cursor(['2026-01-01T00:00:00', 'sale', 3]), None, set()),
+    ('GET', '/api/analytics/timeseries?metric=interactions&bucket=week', None, set()),
+    ('GET', '/api/analytics/timeseries?metric=touchpoints&bucket=hour&device_type=Mobile&group_by=type', None, set()),
+    ('GET', '/api/user', None, set()),
+    ('GET', '/api/admin/users', None, {'user'}),
+    ('GET', '/api/admin/users?is_verified=true&is_approved=false&per_page=5', None, set()),
+    ('GET', '/api/admin/users?is_verified=false', None, set()),
+    ('GET', '/api/admin/users?is_approved=true', None, set()),
+    ('GET', '/verify-email/unknown-token', None, set()),
+    ('POST', '/api/login', {'username': 'admin', 'password': 'admin123'}, set()),
+    ('POST', '/api/admin/users/1/approve', None, set()),
+    ('POST', '/api/admin/users/bulk', {'action': 'reject', 'ids': [1, 2]}, set()),
+]
+
+@pytest.fixture
+def analytics_data(customers):
+    now = datetime.utcnow()
+    campaign = Campaign(campaign_name='Spring', ad_spend=1000)
+    db.session.add(campaign)
+    db.session.flush()
+    for customer in customers[:5]:
+        touchpoint = Touchpoint(customer_id=customer.customer_id, touchpoint_type='Ad Click', interaction_date=now)
+        db.session.add(touchpoint)
+        db.session.flush()
+        db.session.add_all([
+            Interaction(customer_id=customer.customer_id, campaign_id=campaign.campaign_id,
+                        touchpoint_id=touchpoint.touchpoint_id, interaction_date=now),
+            SalesMetric(customer_id=customer.customer_id, campaign_id=campaign.campaign_id,
+                        deal_size=100, sale_date=now - timedelta(days=1), won=1),
+            FinancialMetric(customer_id=customer.customer_id, campaign_id=campaign.campaign_id, revenue=100),
+        ])
+    db.session.commit()
+    
+    # Seed the dashboard rollup so the stats endpoint is measured in steady state
+    reconcile_rollups()
+
+def capture_statements(client, method, url, body):
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+            statements.append((statement, parameters))
+    
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.open(url, method=method, json=body)
+        response.get_data()  # run streamed responses to completion
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code < 500, response.get_data(as_text=True)
+    return statements
+
+def full_scans(statement, parameters):
+    with db.engine.connect() as connection:
+        plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    scans = set()
+    for row in plan:
+        match = SCAN_RE.match(row[-1])
+        if match and match.group(1) in TABLES:
+            scans.add(match.group(1))
+    return scans
+
+@pytest.mark.parametrize('method,url,body,allowed', ENDPOINTS, ids=[f'{m} {u}' for m, u, _, _ in ENDPOINTS])
+def test_endpoint_queries_use_indexes(app, admin_client, analytics_data, method, url, body, allowed):
+    statements = capture_statements(admin_client, method, url, body)
+    assert statements
+    
+    regressions = []
+    for statement, parameters in statements:
+        scans = full_scans(statement, parameters) - allowed
+        if scans:
+            regressions.append(f'{sorted(scans)}: {statement}')
+    assert not regressions, 'Full table scans:\n' + '\n'.join(regressions)
+
+def test_outbox_claim_uses_index(app, admin_client):
+    admin_client.post('/api/admin/users/1/approve')
+    outbox = app.extensions['email_outbox']
+    statements = []
+    record = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        outbox.deliver_pending()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    
+    claims = [(s, p) for s, p in statements if s.startswith('UPDATE email_outbox SET status')]
+    assert claims
+    for statement, parameters in claims:
+        assert not full_scans(statement, parameters)
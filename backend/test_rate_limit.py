@@ -0,0 +1,101 @@
+"""
+Tests for the login and registration rate limiter
+"""
+
+import pytest
+from app import create_app, password_pool, rate_limiter
+from conftest import TestConfig
+from models import db, User
+from rate_limit import MemoryStorage, SQLiteStorage, parse_rate
+
+class LimitedConfig(TestConfig):
+    RATE_LIMIT_LOGIN_PER_IP = '5/minute'
+    RATE_LIMIT_LOGIN_PER_USERNAME = '2/minute'
+    RATE_LIMIT_REGISTER_PER_IP = '1/hour'
+
+@pytest.fixture
+def limited_client():
+    app = create_app(LimitedConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username='alice', email='alice@example.com', first_name='Alice', last_name='User',
+                    is_verified=True, is_approved=True)
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    return MemoryStorage() if request.param == 'memory' else SQLiteStorage(str(tmp_path / 'limits.db'))
+
+def test_parse_rate():
+    assert parse_rate('5/minute') == (5, 60)
+    assert parse_rate('100/hours') == (100, 3600)
+    assert parse_rate('') is None
+    for bad in ['5', 'five/minute', '5/fortnight', '0/minute']:
+        with pytest.raises(ValueError):
+            parse_rate(bad)
+
+def test_token_bucket(storage):
+    takes = [storage.take('key', 3, 60, now=1000.0) for _ in range(4)]
+    assert [allowed for allowed, _ in takes] == [True, True, True, False]
+    assert takes[-1][1] == pytest.approx(20.0)  # one token every 20 seconds
+    
+    assert storage.take('key', 3, 60, now=1019.0)[0] is False
+    assert storage.take('key', 3, 60, now=1021.0)[0] is True
+    assert storage.take('other', 3, 60, now=1021.0)[0] is True
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'limits.db')
+    first, second = SQLiteStorage(path), SQLiteStorage(path)
+    
+    assert first.take('login:ip:10.0.0.1', 2, 60, now=0.0)[0] is True
+    assert second.take('login:ip:10.0.0.1', 2, 60, now=0.0)[0] is True
+    assert first.take('login:ip:10.0.0.1', 2, 60, now=0.0)[0] is False
+
+def test_login_is_refused_before_bcrypt(limited_client, monkeypatch):
+    checks = []
+    run = password_pool.run
+    monkeypatch.setattr(password_pool, 'run', lambda fn, *args: checks.append(fn) or run(fn, *args))
+    
+    wrong = {'username': 'alice', 'password': 'wrong-password'}
+    assert [limited_client.post('/api/login', json=wrong).status_code for _ in range(2)] == [401, 401]
+    
+    # Usernames share a bucket whatever their case
+    response = limited_client.post('/api/login', json={'username': ' Alice', 'password': 'password123'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) == 30
+    assert 'Too many attempts' in response.get_json()['error']
+    assert len(checks) == 2
+
+def test_login_limit_per_ip_covers_every_username(limited_client):
+    statuses = [limited_client.post('/api/login', json={'username': f'user{i}', 'password': 'x'}).status_code
+                for i in range(6)]
+    assert statuses == [401] * 5 + [429]
+    
+    other_ip = limited_client.post('/api/login', json={'username': 'alice', 'password': 'password123'},
+                                   environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert other_ip.status_code == 200
+
+def test_register_limit(limited_client):
+    def register(name):
+        return limited_client.post('/api/register', json={
+            'username': name, 'email': f'{name}@example.com', 'password': 'password123',
+            'first_name': 'New', 'last_name': 'User'
+        })
+    
+    assert register('first').status_code == 201
+    assert register('second').status_code == 429
+    assert User.query.filter_by(username='second').first() is None
+
+def test_disabled_limiter_allows_everything(limited_client):
+    rate_limiter.enabled = False
+    try:
+        statuses = {limited_client.post('/api/login', json={'username': 'alice', 'password': 'x'}).status_code
+                    for _ in range(4)}
+    finally:
+        rate_limiter.enabled = True
+    assert statuses == {401}
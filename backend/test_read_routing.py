@@ -0,0 +1,101 @@
+"""
+Tests for the SQLite engine profile and routing GET requests to read-only connections
+"""
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from app import create_app, engine_router
+from conftest import TestConfig
+from models import db, User, Customer
+
+@pytest.fixture
+def file_app(tmp_path):
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'routing.db'}"
+    
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', email='admin@example.com', first_name='Admin', last_name='User',
+                     is_verified=True, is_approved=True, is_admin=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.add_all([Customer(first_name=f'First{i}', last_name='Last', email=f'user{i}@example.com')
+                            for i in range(5)])
+        db.session.commit()
+        yield app
+        db.session.remove()
+    engine_router.read_engine.dispose()
+    engine_router.write_engine.dispose()
+
+@pytest.fixture
+def file_client(file_app):
+    client = file_app.test_client()
+    assert client.post('/api/login', json={'username': 'admin', 'password': 'admin123'}).status_code == 200
+    db.session.remove()
+    return client
+
+def record_statements(engine):
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+def test_connections_use_the_profile(file_app):
+    with engine_router.write_engine.connect() as connection:
+        pragma = lambda name: connection.execute(text(f'PRAGMA {name}')).scalar()
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('busy_timeout') == 5000
+        assert pragma('cache_size') == -65536
+        assert pragma('query_only') == 0
+
+def test_reader_connections_are_read_only(file_app):
+    with engine_router.read_engine.connect() as connection:
+        assert connection.execute(text('PRAGMA query_only')).scalar() == 1
+        with pytest.raises(OperationalError):
+            connection.execute(text("DELETE FROM customers"))
+
+def test_get_requests_read_through_the_read_pool(file_client):
+    reads = record_statements(engine_router.read_engine)
+    writes = record_statements(engine_router.write_engine)
+    
+    response = file_client.get('/api/customers?per_page=5')
+    
+    assert response.status_code == 200
+    assert len(response.get_json()['customers']) == 5
+    assert any('FROM customers' in statement for statement in reads)
+    assert writes == []
+
+def test_other_requests_use_the_writer(file_client):
+    reads = record_statements(engine_router.read_engine)
+    writes = record_statements(engine_router.write_engine)
+    
+    assert file_client.post('/api/login', json={'username': 'admin', 'password': 'admin123'}).status_code == 200
+    
+    assert reads == []
+    assert any(statement.startswith('UPDATE user ') for statement in writes)
+
+def test_writes_inside_a_get_stay_on_the_writer(file_client):
+    reads = record_statements(engine_router.read_engine)
+    writes = record_statements(engine_router.write_engine)
+    
+    # The first stats request seeds the rollup tables from a GET
+    response = file_client.get('/api/dashboard/stats')
+    
+    assert response.status_code == 200
+    assert response.get_json()['total_customers'] == 5
+    assert any(statement.startswith('INSERT INTO dashboard_stats') for statement in writes)
+    assert not any(statement.startswith(('INSERT', 'UPDATE', 'DELETE')) for statement in reads)
+
+def test_reads_see_commits_from_earlier_requests(file_client):
+    assert len(file_client.get('/api/customers?per_page=10').get_json()['customers']) == 5
+    
+    db.session.add(Customer(first_name='New', last_name='Customer', email='new@example.com'))
+    db.session.commit()
+    db.session.remove()
+    
+    assert len(file_client.get('/api/customers?per_page=10').get_json()['customers']) == 6
+
+def test_memory_databases_have_no_read_pool(app):
+    assert engine_router.read_engine is None
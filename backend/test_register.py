@@ -0,0 +1,109 @@
+"""
+Tests for single-transaction registration and after-commit callbacks
+"""
+
+import logging
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import app as app_module
+from app import outbox
+from models import db, User, OutboxEmail
+from transactions import after_commit
+
+NEW_USER = {'username': 'new', 'email': 'new@example.com', 'password': 'password123',
+            'first_name': 'New', 'last_name': 'User'}
+
+@pytest.fixture
+def notified(monkeypatch):
+    """Each outbox wake-up, as the number of committed outbox rows it would find"""
+    calls = []
+    
+    def notify():
+        with db.engine.connect() as connection:
+            calls.append(connection.execute(db.select(db.func.count()).select_from(OutboxEmail)).scalar())
+    
+    monkeypatch.setattr(outbox, 'notify', notify)
+    return calls
+
+def test_registration_is_one_transaction_without_reads(app, client, notified):
+    commits, statements = [], []
+    record_commit = lambda session: commits.append(session)
+    record_statement = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(Session, 'after_commit', record_commit)
+    event.listen(db.engine, 'before_cursor_execute', record_statement)
+    try:
+        response = client.post('/api/register', json=NEW_USER)
+    finally:
+        event.remove(Session, 'after_commit', record_commit)
+        event.remove(db.engine, 'before_cursor_execute', record_statement)
+    
+    assert response.status_code == 201
+    assert len(commits) == 1
+    # No existence checks: the unique constraints do that job
+    assert not [s for s in statements if s.lstrip().startswith('SELECT') and 'FROM user' in s]
+    assert notified == [2]
+    
+    user = User.query.filter_by(username='new').one()
+    assert response.get_json()['user_id'] == user.id
+    verification = OutboxEmail.query.filter(OutboxEmail.recipients.contains('new@example.com')).one()
+    assert '/verify-email/' in verification.body
+
+@pytest.mark.parametrize('field,value,error', [
+    ('username', 'new', 'Username already taken'),
+    ('email', 'new@example.com', 'Email already registered'),
+])
+def test_duplicates_are_rejected_by_the_constraints(client, notified, field, value, error):
+    assert client.post('/api/register', json=NEW_USER).status_code == 201
+    
+    other = {**NEW_USER, 'username': 'other', 'email': 'other@example.com', field: value}
+    response = client.post('/api/register', json=other)
+    
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+    assert User.query.count() == 1
+    assert OutboxEmail.query.count() == 2
+    assert notified == [2]
+
+def test_callbacks_are_dropped_on_rollback(app):
+    calls = []
+    db.session.add(User(username='gone', email='gone@example.com', first_name='Gone', last_name='User',
+                        password_hash='x'))
+    db.session.flush()
+    after_commit(lambda: calls.append('rolled back'))
+    db.session.rollback()
+    after_commit(lambda: calls.append('first'))
+    after_commit(lambda: calls.append('second'))
+    db.session.commit()
+    db.session.commit()
+    
+    assert calls == ['first', 'second']
+
+def test_a_callback_registered_twice_runs_once(app):
+    calls = []
+    callback = lambda: calls.append('ran')
+    after_commit(callback)
+    after_commit(callback)
+    db.session.commit()
+    
+    assert calls == ['ran']
+
+def test_a_failing_callback_does_not_stop_the_others(app):
+    calls = []
+    after_commit(lambda: 1 / 0)
+    after_commit(lambda: calls.append('ran'))
+    db.session.commit()
+    
+    assert calls == ['ran']
+
+def test_unexpected_failures_are_logged(client, monkeypatch, caplog):
+    def broken(*args):
+        raise RuntimeError('outbox unavailable')
+    
+    monkeypatch.setattr(app_module, 'queue_email', broken)
+    with caplog.at_level(logging.ERROR):
+        response = client.post('/api/register', json=NEW_USER)
+    
+    assert response.status_code == 500
+    assert User.query.count() == 0
+    assert any(record.exc_info and 'outbox unavailable' in str(record.exc_info[1]) for record in caplog.records)
@@ -0,0 +1,104 @@
+"""
+Tests for per-request SQL instrumentation, Server-Timing and the admin metrics endpoint
+"""
+
+import logging
+import re
+import pytest
+from flask import jsonify
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from app import request_metrics
+from models import db, User, Customer
+from request_metrics import Histogram
+
+def server_timing(response):
+    header = response.headers['Server-Timing']
+    match = re.fullmatch(r'db;dur=([\d.]+);desc="(\d+) queries", app;dur=(-?[\d.]+)', header)
+    assert match, header
+    return float(match.group(1)), int(match.group(2))
+
+def test_histogram_quantiles():
+    histogram = Histogram((1, 10, 100))
+    for value in [0.5] * 50 + [5] * 45 + [50] * 4 + [500]:
+        histogram.observe(value)
+    
+    assert histogram.counts == [50, 45, 4, 1]
+    assert (histogram.quantile(0.5), histogram.quantile(0.95), histogram.quantile(0.99)) == (1, 10, 100)
+    assert histogram.quantile(1.0) == 500
+
+def test_server_timing_counts_queries(admin_client, customers):
+    statements = []
+    record = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = admin_client.get('/api/customers/1')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    
+    db_time, queries = server_timing(response)
+    assert response.status_code == 200
+    assert queries == len(statements) >= 4  # the customer and three detail tables
+    assert db_time >= 0
+
+def test_admin_metrics_aggregate_per_endpoint(admin_client, customers):
+    request_metrics.clear()
+    for page in (1, 2, 3):
+        admin_client.get(f'/api/customers?page={page}&per_page=5')
+    
+    endpoints = admin_client.get('/api/admin/metrics').get_json()['endpoints']
+    metrics = endpoints['GET /api/customers']
+    assert metrics['requests'] == 3
+    assert metrics['latency_ms']['count'] == 3
+    assert sum(bucket['count'] for bucket in metrics['queries']['buckets']) == 3
+    assert metrics['slowest_statement']['sql'].startswith('SELECT')
+    assert metrics['n_plus_one_requests'] == 0
+
+@pytest.fixture
+def lazy_route(app):
+    """A view with a textbook N+1: a lazy relationship loaded per customer"""
+    @app.route('/test/lazy-touchpoints')
+    def lazy_touchpoints():
+        return jsonify([len(customer.touchpoints) for customer in Customer.query.all()])
+
+def test_repeated_statements_are_flagged(lazy_route, admin_client, customers, caplog):
+    request_metrics.clear()
+    db.session.expunge_all()
+    with caplog.at_level(logging.WARNING):
+        response = admin_client.get('/test/lazy-touchpoints')
+    
+    assert server_timing(response)[1] == 26
+    assert any('Possible N+1 query in GET /test/lazy-touchpoints: ran 25 times' in message
+               for message in caplog.messages)
+    metrics = admin_client.get('/api/admin/metrics').get_json()['endpoints']['GET /test/lazy-touchpoints']
+    assert metrics['n_plus_one_requests'] == 1
+    assert metrics['last_n_plus_one']['count'] == 25
+    assert 'FROM touchpoints' in metrics['last_n_plus_one']['sql']
+
+def test_metrics_are_admin_only(app, client):
+    user = User(username='user', email='user@example.com', first_name='Plain', last_name='User',
+                is_verified=True, is_approved=True)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    client.post('/api/login', json={'username': 'user', 'password': 'password123'})
+    
+    assert client.get('/api/admin/metrics').status_code == 403
+
+@pytest.fixture
+def failing_route(app):
+    """A view that runs three statements that raise, on one connection"""
+    @app.route('/test/failing-query')
+    def failing_query():
+        connection = db.session.connection()
+        for _ in range(3):
+            try:
+                connection.execute(text('SELECT * FROM no_such_table'))
+            except OperationalError:
+                pass
+        return jsonify(connection.info.get('query_started'))
+
+def test_failed_statements_do_not_leave_start_times(failing_route, admin_client):
+    response = admin_client.get('/test/failing-query')
+    assert response.get_json() == []
+    assert server_timing(response)[1] == 3
@@ -0,0 +1,67 @@
+"""
+Tests for the model serializers, the JSON provider and response compression
+"""
+
+import gzip
+import json
+from datetime import datetime
+import pytest
+import serializers
+from models import Customer, SalesMetric
+from serializers import CUSTOMER, SALES_METRIC, LOGIN_USER, Serializer
+
+def test_serializer_reads_objects_and_rows(customers):
+    expected = {
+        'customer_id': 1, 'first_name': 'First1', 'last_name': 'Last1', 'email': 'user1@example.com',
+        'device_type': customers[0].device_type, 'created_at': customers[0].created_at
+    }
+    row = Customer.query.with_entities(*CUSTOMER.columns).filter(Customer.customer_id == 1).one()
+    
+    assert CUSTOMER(customers[0]) == expected
+    assert CUSTOMER.many([customers[0]]) == CUSTOMER.rows([row]) == [expected]
+
+def test_converters_and_subsets():
+    assert SALES_METRIC(SalesMetric(sale_id=1, deal_size=5.0, won=None))['won'] is False
+    assert list(LOGIN_USER.fields) == [(name, None) for name in
+                                       ['id', 'username', 'email', 'first_name', 'last_name', 'is_admin']]
+    with pytest.raises(AttributeError):
+        Serializer(Customer, 'no_such_column')
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_json_provider_writes_iso_dates(app, monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serializers, 'orjson', None)
+    elif serializers.orjson is None:
+        pytest.skip('orjson is not installed')
+    value = {'when': datetime(2024, 5, 6, 7, 8, 9, 10), 'id': 3}
+    
+    response = app.json.response(value)
+    assert json.loads(response.get_data()) == {'when': '2024-05-06T07:08:09.000010', 'id': 3}
+    assert json.loads(app.json.dumps(value))['when'] == '2024-05-06T07:08:09.000010'
+
+def test_large_responses_are_gzipped(admin_client, customers):
+    response = admin_client.get('/api/customers?per_page=25', headers={'Accept-Encoding': 'gzip'})
+    
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(json.loads(gzip.decompress(response.get_data()))['customers']) == 25
+
+def test_brotli_preferred_when_installed(admin_client, customers):
+    brotli = pytest.importorskip('brotli')
+    response = admin_client.get('/api/customers?per_page=25', headers={'Accept-Encoding': 'gzip, br'})
+    
+    assert response.headers['Content-Encoding'] == 'br'
+    assert len(json.loads(brotli.decompress(response.get_data()))['customers']) == 25
+
+def test_small_or_unaccepted_responses_are_not_compressed(admin_client, customers):
+    small = admin_client.get('/api/customers?per_page=1', headers={'Accept-Encoding': 'gzip'})
+    plain = admin_client.get('/api/customers?per_page=25')
+    
+    assert 'Content-Encoding' not in small.headers
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.get_json()['customers']) == 25
+
+def test_compressed_responses_keep_matching_their_etag(admin_client, customers):
+    first = admin_client.get('/api/customers?per_page=25', headers={'Accept-Encoding': 'gzip'})
+    response = admin_client.get('/api/customers?per_page=25', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
@@ -0,0 +1,85 @@
+"""
+Tests for the merged, cursor-paged customer timeline
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from models import db, Campaign, Customer, Touchpoint, Interaction, SalesMetric
+from pagination import encode_cursor
+
+START = datetime(2026, 1, 1, 12, 0)
+
+@pytest.fixture
+def history(admin_client):
+    """Customer 1's events, with ties on timestamp within and across sources; customer 2 is noise"""
+    db.session.add_all([Campaign(campaign_name='Spring'),
+                        Customer(first_name='Ada', last_name='Lovelace', email='ada@example.com'),
+                        Customer(first_name='Bob', last_name='Other', email='bob@example.com')])
+    db.session.flush()
+    for i in range(6):
+        when = START + timedelta(hours=i // 2)  # two touchpoints per timestamp
+        touchpoint = Touchpoint(customer_id=1, touchpoint_type='Ad Click', interaction_date=when)
+        db.session.add(Interaction(customer_id=1, campaign_id=1, touchpoint=touchpoint, interaction_type='Click',
+                                   interaction_date=when))
+    db.session.add_all([
+        SalesMetric(customer_id=1, campaign_id=1, deal_size=500.0, won=1, sale_date=START + timedelta(hours=1)),
+        SalesMetric(customer_id=1, campaign_id=1, deal_size=900.0, won=0, sale_date=START + timedelta(days=3)),
+        SalesMetric(customer_id=1, campaign_id=1, deal_size=100.0, won=0, sale_date=None),
+        Touchpoint(customer_id=2, touchpoint_type='Email', interaction_date=START),
+    ])
+    db.session.commit()
+
+def all_pages(client, per_page, order='desc'):
+    events, cursor, pages = [], None, 0
+    while True:
+        url = f'/api/customers/1/timeline?per_page={per_page}&order={order}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        events += [(event['timestamp'], event['source'], event['id']) for event in page['events']]
+        cursor, pages = page['next_cursor'], pages + 1
+        assert page['has_more'] == (cursor is not None)
+        if cursor is None:
+            return events, pages
+
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_pages_through_one_merged_stream(admin_client, history, order):
+    everything, pages = all_pages(admin_client, 100, order)
+    assert pages == 1
+    assert len(everything) == 14  # 6 touchpoints, 6 interactions, 2 dated sales
+    assert everything == sorted(everything, reverse=(order == 'desc'))
+    
+    for per_page in [1, 2, 3, 5]:
+        assert all_pages(admin_client, per_page, order)[0] == everything
+
+def test_events_carry_their_rows(admin_client, history):
+    first = admin_client.get('/api/customers/1/timeline?per_page=1').get_json()['events'][0]
+    assert first['source'] == 'sale'
+    assert first['data']['deal_size'] == 900.0
+    assert first['data']['won'] is False
+
+def test_each_source_reads_one_page(admin_client, history):
+    statements = []
+    record = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    cursor = encode_cursor([START + timedelta(hours=2), 'interaction', 5])
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = admin_client.get(f'/api/customers/1/timeline?per_page=2&cursor={cursor}')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    
+    assert response.status_code == 200
+    source_queries = [(s, p) for s, p in statements if 'ORDER BY' in s and '.customer_id = ?' in s]
+    assert len(source_queries) == 3
+    assert all(p[-2:] == (3, 0) for _, p in source_queries)  # per_page + 1 rows, no offset
+
+def test_unknown_customer(admin_client, history):
+    assert admin_client.get('/api/customers/999/timeline').status_code == 404
+
+@pytest.mark.parametrize('query', [
+    'order=sideways', 'cursor=not-a-cursor', f"cursor={encode_cursor(['2026-01-01T00:00:00', 'refund', 1])}",
+    f"cursor={encode_cursor(['yesterday', 'sale', 1])}", f"cursor={encode_cursor(['2026-01-01T00:00:00', 'sale', '1'])}",
+])
+def test_rejects_bad_arguments(admin_client, history, query):
+    response = admin_client.get(f'/api/customers/1/timeline?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
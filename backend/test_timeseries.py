@@ -0,0 +1,106 @@
+"""
+Tests for the touchpoint and interaction time-series rollups
+"""
+
+from datetime import date, datetime
+import pytest
+from models import db, Campaign, Customer, Touchpoint, Interaction, ActivityHourly, ActivityDaily
+from rollups import rebuild_activity_rollups
+
+# Monday 2026-03-02 through Wednesday 2026-04-01
+MONDAY = datetime(2026, 3, 2, 9, 30)
+
+@pytest.fixture
+def activity(admin_client):
+    db.session.add_all([Campaign(campaign_name='Spring'), Campaign(campaign_name='Summer'),
+                        Customer(first_name='Ada', last_name='Lovelace', email='ada@example.com')])
+    db.session.flush()
+    rows = [
+        # (when, touchpoint type, device, campaign, interaction type, value)
+        (MONDAY, 'Ad Click', 'Mobile', 1, 'Click', 10),
+        (MONDAY.replace(minute=45), 'Ad Click', 'Mobile', 1, 'Click', 5),
+        (MONDAY.replace(hour=14), 'Email', 'Desktop', 2, 'Open', 1),
+        (datetime(2026, 3, 8, 23, 59), 'Email', 'Desktop', 1, 'Click', 7),  # Sunday, same week
+        (datetime(2026, 3, 9, 0, 1), 'Ad Click', None, 2, 'Click', 3),      # next week
+        (datetime(2026, 4, 1, 12, 0), 'Ad Click', 'Tablet', 1, 'Purchase', 100),
+    ]
+    for when, touchpoint_type, device, campaign_id, interaction_type, value in rows:
+        touchpoint = Touchpoint(customer_id=1, touchpoint_type=touchpoint_type, device_type=device,
+                                interaction_date=when)
+        db.session.add(Interaction(customer_id=1, campaign_id=campaign_id, touchpoint=touchpoint,
+                                   interaction_type=interaction_type, interaction_value=value,
+                                   interaction_date=when))
+    db.session.commit()
+
+def series(client, **args):
+    response = client.get('/api/analytics/timeseries', query_string=args)
+    assert response.status_code == 200, response.get_json()
+    return [tuple(point.values()) for point in response.get_json()['points']]
+
+def rollup_rows():
+    return (sorted(tuple(row) for row in db.session.execute(db.select(ActivityHourly.__table__))),
+            sorted(tuple(row) for row in db.session.execute(db.select(ActivityDaily.__table__))))
+
+def test_buckets(admin_client, activity):
+    window = {'from': '2026-03-01', 'to': '2026-04-30'}
+    assert series(admin_client, metric='touchpoints', bucket='day', **window) == [
+        ('2026-03-02', 3), ('2026-03-08', 1), ('2026-03-09', 1), ('2026-04-01', 1)
+    ]
+    assert series(admin_client, metric='touchpoints', bucket='week', **window) == [
+        ('2026-03-02', 4), ('2026-03-09', 1), ('2026-03-30', 1)
+    ]
+    assert series(admin_client, metric='interaction_value', bucket='month', **window) == [
+        ('2026-03', 26), ('2026-04', 100)
+    ]
+    assert series(admin_client, metric='interactions', bucket='hour', **{'from': '2026-03-02', 'to': '2026-03-02'}) == [
+        ('2026-03-02T09:00', 2), ('2026-03-02T14:00', 1)
+    ]
+
+def test_filters_and_groups(admin_client, activity):
+    window = {'from': '2026-03-01', 'to': '2026-04-30', 'bucket': 'month'}
+    assert series(admin_client, metric='interactions', campaign_id=2, **window) == [('2026-03', 2)]
+    assert series(admin_client, metric='touchpoints', type='Email', device_type='Desktop', **window) == [('2026-03', 2)]
+    assert series(admin_client, metric='interactions', group_by='device_type', **window) == [
+        ('2026-03', '', 1), ('2026-03', 'Desktop', 2), ('2026-03', 'Mobile', 2), ('2026-04', 'Tablet', 1)
+    ]
+
+def test_defaults_to_the_last_30_days(admin_client, activity):
+    body = admin_client.get('/api/analytics/timeseries').get_json()
+    assert body['to'] == date.today().isoformat()
+    assert (date.today() - date.fromisoformat(body['from'])).days == 29
+    assert body['metric'] == 'touchpoints' and body['bucket'] == 'day'
+
+def test_incremental_maintenance_matches_a_rebuild(admin_client, activity):
+    moved = Interaction.query.filter_by(interaction_value=10).one()
+    moved.interaction_date = datetime(2026, 3, 20, 8, 0)
+    moved.campaign_id = 2
+    db.session.delete(Interaction.query.filter_by(interaction_value=100).one())
+    Touchpoint.query.filter_by(device_type='Tablet').one().touchpoint_type = 'Social'
+    # Device changes move the touchpoint's interactions, whether or not they change too
+    moved.touchpoint.device_type = 'Desktop'
+    Interaction.query.filter_by(interaction_value=5).one().touchpoint.device_type = None
+    db.session.commit()
+    
+    incremental = rollup_rows()
+    rebuild_activity_rollups()
+    # Counters that dropped to zero stay behind as zero rows until a rebuild
+    nonzero = lambda rows: [row for row in rows if row[-2] or row[-1]]
+    assert [nonzero(rows) for rows in incremental] == [nonzero(rows) for rows in rollup_rows()]
+
+def test_seeds_rollups_for_existing_rows(admin_client, activity):
+    db.session.execute(ActivityHourly.__table__.delete())
+    db.session.execute(ActivityDaily.__table__.delete())
+    db.session.commit()
+    
+    assert series(admin_client, metric='interactions', bucket='month', **{'from': '2026-03-01', 'to': '2026-04-30'}) == [
+        ('2026-03', 5), ('2026-04', 1)
+    ]
+
+@pytest.mark.parametrize('query', [
+    'metric=sales', 'bucket=year', 'group_by=customer_id', 'from=2026-13-01', 'campaign_id=abc',
+    'from=2026-03-02&to=2026-03-01', 'bucket=hour&from=2020-01-01&to=2026-01-01',
+])
+def test_rejects_bad_arguments(admin_client, query):
+    response = admin_client.get(f'/api/analytics/timeseries?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,57 @@
+"""
+Tests for the cached user identity behind Flask-Login's user_loader
+"""
+
+from sqlalchemy import event
+from models import db, User
+
+def count_user_queries(app, client, url):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return response, len([s for s in statements if 'FROM user' in s])
+
+def test_identity_is_loaded_once(app, admin_client):
+    response, queries = count_user_queries(app, admin_client, '/api/user')
+    assert response.get_json()['username'] == 'admin'
+    assert queries == 1
+    
+    response, queries = count_user_queries(app, admin_client, '/api/user')
+    assert response.status_code == 200
+    assert queries == 0
+
+def test_user_changes_evict_the_identity(app, admin_client):
+    admin_client.get('/api/user')
+    
+    admin = User.query.filter_by(username='admin').one()
+    admin.first_name = 'Renamed'
+    db.session.commit()
+    
+    assert admin_client.get('/api/user').get_json()['first_name'] == 'Renamed'
+
+def test_approve_evicts_the_identity(app, admin_client):
+    user = User(username='bob', email='bob@example.com', first_name='Bob', last_name='Doe',
+                is_verified=True, is_approved=True, is_admin=True)
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    
+    other = app.test_client()
+    other.post('/api/login', json={'username': 'bob', 'password': 'password123'})
+    assert other.get('/api/user').get_json()['is_approved'] is True
+    
+    admin_client.post(f'/api/admin/users/{user.id}/reject')
+    assert other.get('/api/user').get_json()['is_approved'] is False
+
+def test_deleted_user_is_evicted(app, admin_client):
+    admin_client.get('/api/user')
+    admin = User.query.filter_by(username='admin').one()
+    admin_id = admin.id
+    db.session.delete(admin)
+    db.session.commit()
+    
+    assert app.extensions['user_cache'].get(admin_id) is None
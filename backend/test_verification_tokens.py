@@ -0,0 +1,108 @@
+"""
+Tests for signed email verification tokens and the stored tokens they replace
+"""
+
+import re
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from models import db, User, OutboxEmail
+from verification_tokens import signed_verification_token
+
+@pytest.fixture
+def user(app):
+    user = User(username='pending', email='pending@example.com', first_name='Pending', last_name='User')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def verify(client, token):
+    response = client.get(f'/verify-email/{token}')
+    return response.status_code, response.get_json()
+
+def test_signed_token_verifies_with_one_lookup_and_one_write(client, user):
+    token, user_id = signed_verification_token(user), user.id
+    db.session.remove()
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        status, body = verify(client, token)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    
+    assert status == 200
+    assert 'verified' in body['message']
+    assert [s.split()[0] for s in statements] == ['SELECT', 'UPDATE']
+    assert 'WHERE user.id = ?' in statements[0]
+    assert db.session.get(User, user_id).is_verified
+
+def test_issuing_a_signed_token_writes_nothing(app, user):
+    signed_verification_token(user)
+    assert not db.session.dirty
+    assert user.email_verification_token is None
+
+def test_signed_token_works_once(client, user):
+    token = signed_verification_token(user)
+    assert verify(client, token)[0] == 200
+    assert verify(client, token) == (400, {'error': 'Invalid verification token'})
+
+def test_changing_the_password_invalidates_the_token(client, user):
+    token = signed_verification_token(user)
+    user.set_password('something-else')
+    db.session.commit()
+    
+    assert verify(client, token) == (400, {'error': 'Invalid verification token'})
+
+def test_expired_token(app, client, user):
+    token = signed_verification_token(user)
+    app.config['EMAIL_VERIFICATION_MAX_AGE'] = -1
+    
+    assert verify(client, token) == (400, {'error': 'Verification token has expired'})
+    assert not db.session.get(User, user.id).is_verified
+
+@pytest.mark.parametrize('mangle', [
+    lambda token: token[:-2] + ('AA' if not token.endswith('AA') else 'BB'),
+    lambda token: 'MTIzNDU.' + token.split('.', 1)[1],  # another user id
+    lambda token: 'not.a.token',
+])
+def test_tampered_tokens_are_rejected(client, user, mangle):
+    status, body = verify(client, mangle(signed_verification_token(user)))
+    assert status == 400
+    assert body['error'] == 'Invalid verification token'
+
+def test_stored_tokens_still_verify(client, user):
+    token = user.generate_email_verification_token()
+    db.session.commit()
+    
+    assert verify(client, token)[0] == 200
+    user = db.session.get(User, user.id)
+    assert user.is_verified
+    assert user.email_verification_token is None
+
+def test_expired_stored_token(client, user):
+    token = user.generate_email_verification_token()
+    user.email_verification_expires = datetime.utcnow() - timedelta(minutes=1)
+    db.session.commit()
+    
+    assert verify(client, token) == (400, {'error': 'Verification token has expired'})
+
+def test_registration_sends_a_signed_link(app, client):
+    client.post('/api/register', json={'username': 'new', 'email': 'new@example.com', 'password': 'password123',
+                                       'first_name': 'New', 'last_name': 'User'})
+    email = OutboxEmail.query.filter(OutboxEmail.recipients.contains('new@example.com')).one()
+    token = re.search(r'/verify-email/(\S+)', email.body).group(1)
+    
+    assert User.query.filter_by(username='new').one().email_verification_token is None
+    assert verify(client, token)[0] == 200
+
+def test_stored_tokens_when_signing_is_off(app, client):
+    app.config['EMAIL_VERIFICATION_SIGNED_TOKENS'] = False
+    client.post('/api/register', json={'username': 'new', 'email': 'new@example.com', 'password': 'password123',
+                                       'first_name': 'New', 'last_name': 'User'})
+    user = User.query.filter_by(username='new').one()
+    email = OutboxEmail.query.filter(OutboxEmail.recipients.contains('new@example.com')).one()
+    
+    assert user.email_verification_token in email.body
+    assert verify(client, user.email_verification_token)[0] == 200
@@ -0,0 +1,36 @@
+"""
+Callbacks that run once the current transaction has committed.
+
+Side effects that must not happen for work that is rolled back, such as
+waking the mail workers for a message that was never stored, register
+with ``after_commit`` instead of running inline. Callbacks run in order
+after a successful commit, once each however often they were registered,
+and are dropped on rollback. A failing callback is logged and does not
+affect the others: the data is already committed.
+"""
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+
+def after_commit(callback, session=None):
+    """Run ``callback()`` after ``session`` (the request's session by default) next commits"""
+    session = db.session() if session is None else session
+    callbacks = session.info.setdefault('after_commit', [])
+    if callback not in callbacks:
+        callbacks.append(callback)
+
+@event.listens_for(Session, 'after_commit')
+def _run_callbacks(session):
+    for callback in session.info.pop('after_commit', []):
+        try:
+            callback()
+        except Exception as e:
+            current_app.logger.warning(f'After-commit callback {callback!r} failed: {e}')
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_callbacks(session, previous_transaction):
+    # A savepoint rolling back leaves the outer transaction's callbacks due
+    if not previous_transaction.nested:
+        session.info.pop('after_commit', None)
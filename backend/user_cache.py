@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, User
+
+class CachedUser(UserMixin):
+    """The subset of a User row that authenticated requests need"""
+    
+    FIELDS = ('id', 'username', 'email', 'first_name', 'last_name',
+              'is_admin', 'is_verified', 'is_approved')
+    
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+    
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+class UserCache:
+    """A TTL + LRU cache of user identities for Flask-Login's user_loader.
+
+    Entries are evicted as soon as a transaction that changed the user
+    commits, and otherwise expire after ``USER_CACHE_TTL`` seconds so other
+    worker processes pick up changes too.
+    """
+    
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.ttl = 60
+        self.max_size = 1024
+        event.listen(Session, 'after_flush', self._collect_changed_users)
+        event.listen(Session, 'after_commit', self._evict_changed_users)
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        self.max_size = app.config.get('USER_CACHE_SIZE', 1024)
+        self.clear()
+        app.extensions['user_cache'] = self
+    
+    def get(self, user_id):
+        """Return the identity for ``user_id``, loading it on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        
+        columns = [getattr(User, name) for name in CachedUser.FIELDS]
+        row = db.session.query(*columns).filter(User.id == user_id).first()
+        if row is None:
+            self.invalidate(user_id)
+            return None
+        
+        identity = CachedUser(**row._asdict())
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return identity
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def _collect_changed_users(self, session, flush_context):
+        changed = session.info.setdefault('changed_user_ids', set())
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User) and obj.id is not None:
+                changed.add(obj.id)
+    
+    def _evict_changed_users(self, session):
+        for user_id in session.info.pop('changed_user_ids', ()):
+            self.invalidate(user_id)